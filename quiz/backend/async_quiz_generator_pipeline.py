@@ -0,0 +1,179 @@
+# backend/async_quiz_generator_pipeline.py
+
+import asyncio
+from typing import List, Optional, Tuple
+from quiz.backend.indic_quiz_generator_pipeline import (
+    MCQ_REPAIR_PASSES,
+    QUIZ_MODEL_ID,
+    STREAMING_ENABLED,
+    QuizParser,
+    agent_cache_params,
+    build_english_quiz_agent,
+    build_mcq_repair_prompt,
+    build_quiz_prompt,
+    collect_chunk_results,
+    evaluate_mcq_reply,
+    load_stored_chunks,
+    log_prompt_tokens,
+    merge_mcq_repair,
+    merge_quiz_results,
+    plan_chunks,
+    plan_mcq_repair,
+    reduce_chunk_results,
+    response_token_counts,
+    response_token_usage,
+    run_mcq_streaming,
+    should_chunk,
+    store_reply,
+    streamed_mcq_target,
+    validate_mcqs,
+)
+from quiz.backend.utils.concurrency import groq_slots
+from quiz.backend.utils.llm_cache import get_llm_cache
+from quiz.backend.utils.metrics import record_retry, record_tokens, span
+from quiz.backend.utils.rate_limiter import get_groq_rate_limiter
+from quiz.backend.utils.logging_utils import log_and_print, log_artifact
+
+
+def set_max_concurrent_llm_calls(limit: int):
+    """Change the process-wide cap on in-flight LLM calls (shared with the sync engine)."""
+    groq_slots.set_limit(limit)
+
+
+async def arun_quiz_agent(prompt: str, bypass_cache: bool = False, system_message: Optional[str] = None):
+    """
+    Async counterpart of run_quiz_agent, bounded by the process-wide Groq concurrency cap
+    and paced by the shared Groq rate limiter.
+    """
+    cache = get_llm_cache()
+    params = agent_cache_params(system_message)
+    if not bypass_cache:
+        cached = await asyncio.to_thread(cache.get, QUIZ_MODEL_ID, prompt, params)
+        if cached is not None:
+            return cached
+
+    agent = build_english_quiz_agent(QUIZ_MODEL_ID, system_message)
+    limiter = get_groq_rate_limiter()
+    billed_text = (system_message or "") + prompt
+
+    async def invoke():
+        async with groq_slots.aslot():
+            return await agent.arun(prompt)
+
+    response = await limiter.acall(invoke, billed_text)
+    limiter.record_usage(limiter.estimate(billed_text), response_token_usage(response))
+    record_tokens(*response_token_counts(response))
+    await asyncio.to_thread(store_reply, cache, prompt, response.content, params)
+    return response.content
+
+
+async def arun_scq_only(chapter_text: str, num_scq: int, bypass_cache: bool = False):
+    parser = QuizParser()
+    scq_prompt = build_quiz_prompt(chapter_text, num_scq, "SCQ")
+    log_and_print("🔍 Running async SCQ generation for %d questions.", num_scq)
+    log_artifact("SCQ prompt", scq_prompt.user)
+    log_prompt_tokens("SCQ", scq_prompt)
+    with span("scq_call", questions=num_scq):
+        scq_content = await arun_quiz_agent(scq_prompt.user, bypass_cache=bypass_cache, system_message=scq_prompt.system)
+    log_artifact("SCQ response", scq_content)
+    if scq_content is None:
+        raise ValueError("SCQ agent returned no content.")
+    return parser.run(scq_content)
+
+
+async def arepair_mcqs(chapter_text: str, mcq_data: dict, min_valid: int, bypass_cache: bool = False) -> dict:
+    valid, missing = plan_mcq_repair(mcq_data, min_valid)
+    log_and_print(f"🩹 Keeping {len(valid)} valid MCQs, requesting {missing} more.")
+    repair_prompt = build_mcq_repair_prompt(chapter_text, missing, [q["Question"] for q in valid])
+    log_prompt_tokens("MCQ repair", repair_prompt)
+    with span("mcq_repair", questions=missing):
+        record_retry("mcq_repair")
+        repair_content = await arun_quiz_agent(repair_prompt.user, bypass_cache=bypass_cache, system_message=repair_prompt.system)
+    log_artifact("MCQ repair response", repair_content)
+    return merge_mcq_repair(valid, repair_content)
+
+
+async def arun_mcq_with_retries(chapter_text: str, num_mcq: int, max_repairs: int = MCQ_REPAIR_PASSES, bypass_cache: bool = False):
+    mcq_prompt = build_quiz_prompt(chapter_text, num_mcq, "MCQ")
+    log_and_print("🔍 Running async MCQ generation for %d questions.", num_mcq)
+    log_artifact("MCQ prompt", mcq_prompt.user)
+    log_prompt_tokens("MCQ", mcq_prompt)
+
+    min_valid = max(1, num_mcq // 2)  # At least half (rounded down), but at least 1
+    log_and_print(f"🔍 Minimum valid MCQs required: {min_valid}")
+
+    with span("mcq_call", questions=num_mcq):
+        mcq_content = await arun_quiz_agent(mcq_prompt.user, bypass_cache=bypass_cache, system_message=mcq_prompt.system)
+    log_artifact("MCQ response", mcq_content)
+    mcq_data, has_enough = evaluate_mcq_reply(mcq_content, 0, min_valid)
+
+    for attempt in range(max_repairs):
+        if has_enough:
+            return mcq_data
+        log_and_print(f"Running async MCQ repair (Pass {attempt + 1}/{max_repairs})...")
+        mcq_data = await arepair_mcqs(chapter_text, mcq_data, min_valid, bypass_cache=bypass_cache)
+        has_enough = validate_mcqs(mcq_data["Questions"], min_valid)
+
+    if not has_enough:
+        log_and_print("⚠️ Max repairs reached. Returning last MCQ version.")
+    return mcq_data
+
+
+def arun_mcqs(chapter_text: str, num_questions: int, bypass_cache: bool = False):
+    """Awaitable MCQ generation in the configured mode (see run_mcqs)."""
+    if STREAMING_ENABLED:
+        # The streamed MCQ reply is consumed on a worker thread so it can be cancelled early
+        return asyncio.to_thread(run_mcq_streaming, chapter_text, num_questions, streamed_mcq_target(num_questions))
+    return arun_mcq_with_retries(chapter_text, num_questions, bypass_cache=bypass_cache)
+
+
+async def arun_chunked_quiz(chapter_text: str, num_questions: int, bypass_cache: bool = False) -> dict:
+    """Async counterpart of run_chunked_quiz."""
+    chunks, quotas = plan_chunks(chapter_text, num_questions)
+    stored = await asyncio.to_thread(load_stored_chunks, chunks, quotas, bypass_cache)
+    pending = [i for i, entry in enumerate(stored) if entry is None]
+    results = await asyncio.gather(
+        *(arun_scq_only(chunks[i], quotas[i], bypass_cache=bypass_cache) for i in pending),
+        *(arun_mcqs(chunks[i], quotas[i], bypass_cache=bypass_cache) for i in pending),
+    )
+    fresh_scq = dict(zip(pending, results[:len(pending)]))
+    fresh_mcq = dict(zip(pending, results[len(pending):]))
+    scq_results, mcq_results = await asyncio.to_thread(collect_chunk_results, chunks, quotas, stored, fresh_scq, fresh_mcq)
+    return reduce_chunk_results(scq_results, mcq_results, quotas, num_questions)
+
+
+async def arun_parallel_quiz_with_mcq_retry(chapter_text: str, num_questions: int, bypass_cache: bool = False) -> dict:
+    """Async counterpart of run_parallel_quiz_with_mcq_retry: SCQ and MCQ run concurrently."""
+    if should_chunk(chapter_text):
+        return await arun_chunked_quiz(chapter_text, num_questions, bypass_cache=bypass_cache)
+
+    scq_data, mcq_data = await asyncio.gather(
+        arun_scq_only(chapter_text, num_questions, bypass_cache=bypass_cache),
+        arun_mcqs(chapter_text, num_questions, bypass_cache=bypass_cache),
+    )
+    return merge_quiz_results(scq_data, mcq_data, num_questions)
+
+
+async def agenerate_quiz_json(chapter_text: str, num_questions: int = 15, bypass_cache: bool = False) -> dict:
+    """Generate one chapter's quiz, flattened to {'Topic': ..., 'Questions': [...]}."""
+    quiz = await arun_parallel_quiz_with_mcq_retry(chapter_text, num_questions, bypass_cache=bypass_cache)
+    return {
+        "Topic": quiz["Quiz"]["Topic"],
+        "Questions": quiz["Quiz"]["Questions"]
+    }
+
+
+async def agenerate_quizzes(chapters: List[Tuple[str, int]], bypass_cache: bool = False) -> list:
+    """
+    Generate quizzes for many chapters on one event loop.
+
+    Args:
+        chapters: List of (chapter_text, num_questions) pairs
+
+    Returns:
+        List in input order holding each chapter's quiz dict, or the exception it raised
+    """
+    return await asyncio.gather(
+        *(agenerate_quiz_json(text, n, bypass_cache=bypass_cache) for text, n in chapters),
+        return_exceptions=True,
+    )
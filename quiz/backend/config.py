@@ -6,6 +6,9 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Project root (three levels up from quiz/backend/config.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 def load_env_vars():
     return {
         "SERVICE_ACCOUNT_FILE": os.getenv("GOOGLE_APPLICATION_CREDENTIALS"),
@@ -16,5 +19,40 @@ def load_app_config(path="quiz/backend/config/app_config.yaml"):
     with open(path, "r") as f:
         return yaml.safe_load(f)
 
+def resolve_cache_dir(config: dict) -> str:
+    """Resolve the local cache directory from app config, relative to the project root."""
+    cache_dir = config.get("cache", {}).get("dir", ".cache")
+    return cache_dir if os.path.isabs(cache_dir) else os.path.join(ROOT_DIR, cache_dir)
+
+def resolve_fake_backend_url(config: dict):
+    """
+    Base URL of the local fake Google/Groq server (quiz/backend/dev/fake_backends.py),
+    or None to talk to the real APIs. QUIZ_FAKE_BACKENDS_URL overrides the config.
+    """
+    url = os.getenv("QUIZ_FAKE_BACKENDS_URL")
+    if url:
+        return url.rstrip("/")
+    fake = config.get("fake_backends", {})
+    if not fake.get("enabled"):
+        return None
+    return fake.get("url", "http://127.0.0.1:8765").rstrip("/")
+
+# Set by quiz/backend/job_worker.py in each worker process it starts
+WORKER_INDEX_ENV = "QUIZ_WORKER_INDEX"
+
+def process_file_path(path: str) -> str:
+    """
+    The log or metrics file this process writes. Job workers get their own copy
+    (pipeline.worker-0-4242.log), as files cannot be appended to and rotated by
+    several processes at once.
+    """
+    worker_index = os.getenv(WORKER_INDEX_ENV)
+    if worker_index is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.worker-{worker_index}-{os.getpid()}{ext}"
+
 env_config = load_env_vars()
-app_config = load_app_config()  
+app_config = load_app_config()
+CACHE_DIR = resolve_cache_dir(app_config)
+FAKE_BACKEND_URL = resolve_fake_backend_url(app_config)
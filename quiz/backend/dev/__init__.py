@@ -0,0 +1 @@
+# This file makes 'backend/dev' a package
\ No newline at end of file
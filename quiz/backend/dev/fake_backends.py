@@ -0,0 +1,584 @@
+# backend/dev/fake_backends.py
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the Google Docs / Sheets / Drive APIs and the Groq chat API.
+
+One HTTP server answers all of them, keeps documents and spreadsheets in memory and
+replies to chat completions with canned, well-formed quiz JSON, so the pipeline can be
+run and timed end to end with no network. Latency, 5xx errors and 429s can be injected
+per backend.
+
+Start it, then point the pipeline at it with `fake_backends` in app_config.yaml
+(or QUIZ_FAKE_BACKENDS_URL):
+
+    python -m quiz.backend.dev.fake_backends --port 8765 --groq-latency-ms 800 --groq-rate-limit-rate 0.05
+
+Any document ID or spreadsheet ID is accepted: unknown documents get a generated
+chapter and unknown spreadsheets start with a single empty "Sheet1" tab. Request
+counts per endpoint are served at GET /_stats (and reset by POST /_reset).
+"""
+
+import re
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+_WORDS = (
+    "river forest king sage village cow flute mountain festival arrow chariot temple "
+    "lotus peacock moon monsoon palace friend demon butter cradle serpent garland "
+    "teacher student bow drum lamp harvest elephant banyan journey promise courage "
+    "kindness wisdom rain storm boat bridge garden parrot deer tiger lion charioteer"
+).split()
+
+
+class FaultInjector:
+    """Decides, per request, how long to stall and whether to fail instead of answering."""
+
+    def __init__(
+        self,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after_seconds: float = 1.0,
+        seed: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_seconds = retry_after_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def decide(self):
+        """
+        Returns:
+            (delay_seconds, status) where status is None (answer normally), 429 or 500
+        """
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            roll = self._rng.random()
+        delay = max(self.latency_ms + jitter, 0.0) / 1000
+        if roll < self.rate_limit_rate:
+            return delay, 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return delay, 500
+        return delay, None
+
+
+def generate_chapter(seed_text: str, paragraphs: int = 6, words_per_paragraph: int = 90) -> str:
+    """Deterministic filler chapter for a document or tab the fake has not seen before."""
+    rng = random.Random(zlib.crc32(seed_text.encode("utf-8")))
+    out = []
+    for _ in range(paragraphs):
+        words = [rng.choice(_WORDS) for _ in range(words_per_paragraph)]
+        sentences = [" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12)]
+        out.append(" ".join(sentences))
+    return "\n\n".join(out)
+
+
+def canned_quiz_reply(prompt_text: str, mcq_invalid_rate: float = 0.0) -> str:
+    """
+    A well-formed quiz reply for a generation or MCQ repair prompt. The question
+    count and type are read from the prompt; stems are drawn from the passage so
+    they survive deduplication.
+    """
+    count_match = re.search(r"exactly (\d+) (?:more )?(Single Choice|Multiple Choice|MCQs)", prompt_text)
+    count = int(count_match.group(1)) if count_match else 5
+    question_type = "SCQ" if count_match and count_match.group(2) == "Single Choice" else "MCQ"
+
+    passage_match = re.search(r'"""(.*?)"""', prompt_text, flags=re.DOTALL)
+    passage_words = re.findall(r"[A-Za-z]{4,}", passage_match.group(1) if passage_match else prompt_text) or _WORDS
+    rng = random.Random(zlib.crc32(prompt_text.encode("utf-8")))
+
+    questions = []
+    for _ in range(count):
+        stem = " ".join(rng.sample(passage_words, min(6, len(passage_words))))
+        options = [f"{letter}. {' '.join(rng.sample(passage_words, min(3, len(passage_words))))}" for letter in "abcd"]
+        if question_type == "SCQ" or rng.random() < mcq_invalid_rate:
+            right = rng.choice("abcd")
+        else:
+            right = "".join(sorted(rng.sample("abcd", rng.choice((2, 3)))))
+        questions.append({
+            "Question": f"What does the story tell us about {stem.lower()}?",
+            "Question_type": question_type,
+            "Options": options,
+            "Right_Option": right,
+            "Number_Of_Points_Earned": "15" if question_type == "MCQ" else "10",
+            "Timer": rng.choice((10, 15, 20, 25, 30)),
+        })
+    return json.dumps({"Quiz": {"Topic": "Generated Quiz", "Questions": questions}}, ensure_ascii=False)
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for ch in letters.upper():
+        index = index * 26 + (ord(ch) - ord("A") + 1)
+    return index - 1
+
+
+def parse_a1_range(a1: str):
+    """'Title'!A1:B2 -> (title, row0, col0, row1, col1); open ends are None."""
+    title, _, cells = a1.rpartition("!") if "!" in a1 else (a1, "", "")
+    title = title.strip("'").replace("''", "'")
+    if not cells:
+        return title, 0, 0, None, None
+    bounds = []
+    for part in cells.split(":"):
+        m = re.fullmatch(r"([A-Za-z]*)(\d*)", part)
+        col = _column_index(m.group(1)) if m.group(1) else None
+        row = int(m.group(2)) - 1 if m.group(2) else None
+        bounds.append((row, col))
+    (r0, c0), (r1, c1) = bounds[0], bounds[-1]
+    return title, r0 or 0, c0 or 0, r1, c1
+
+
+class FakeGoogleState:
+    """In-memory documents and spreadsheets."""
+
+    def __init__(self, doc_paragraphs: int = 6):
+        self.lock = threading.Lock()
+        self.doc_paragraphs = doc_paragraphs
+        self.documents = {}
+        self.spreadsheets = {}
+
+    def document(self, document_id: str) -> dict:
+        with self.lock:
+            if document_id not in self.documents:
+                self.documents[document_id] = {
+                    "title": f"Chapter {zlib.crc32(document_id.encode('utf-8')) % 100}",
+                    "revisionId": "rev-1",
+                    "text": generate_chapter(document_id, self.doc_paragraphs),
+                }
+            return self.documents[document_id]
+
+    def set_document(self, document_id: str, title: str, text: str):
+        with self.lock:
+            previous = self.documents.get(document_id)
+            revision = int(previous["revisionId"].split("-")[1]) + 1 if previous else 1
+            self.documents[document_id] = {"title": title, "revisionId": f"rev-{revision}", "text": text}
+
+    def spreadsheet(self, spreadsheet_id: str, title: Optional[str] = None) -> dict:
+        with self.lock:
+            if spreadsheet_id not in self.spreadsheets:
+                self.spreadsheets[spreadsheet_id] = {
+                    "title": title or spreadsheet_id,
+                    "sheets": {"Sheet1": self._new_tab(0, "Sheet1")},
+                }
+            return self.spreadsheets[spreadsheet_id]
+
+    @staticmethod
+    def _new_tab(sheet_id: int, title: str, rows: int = 1000, cols: int = 26) -> dict:
+        return {"sheetId": sheet_id, "title": title, "rowCount": rows, "columnCount": cols, "cells": {}, "formats": 0, "rules": []}
+
+    def spreadsheet_by_name(self, name: str) -> dict:
+        with self.lock:
+            for spreadsheet_id, spreadsheet in self.spreadsheets.items():
+                if spreadsheet["title"] == name:
+                    return {"id": spreadsheet_id, "name": name}
+        spreadsheet_id = f"fake-{zlib.crc32(name.encode('utf-8')):08x}"
+        self.spreadsheet(spreadsheet_id, title=name)
+        return {"id": spreadsheet_id, "name": name}
+
+    def add_input_spreadsheet(self, name: str, chapters: int, num_questions: int):
+        """A story spreadsheet in the input format: A1/B1 NumQuestions, A2/B2 Content."""
+        spreadsheet_id = self.spreadsheet_by_name(name)["id"]
+        with self.lock:
+            tabs = self.spreadsheets[spreadsheet_id]["sheets"]
+            tabs.clear()
+            for i in range(chapters):
+                title = f"chapter{i + 1}"
+                tab = self._new_tab(i, title)
+                tab["cells"] = {(0, 0): "NumQuestions", (0, 1): num_questions, (1, 0): "Content", (1, 1): generate_chapter(title, self.doc_paragraphs)}
+                tabs[title] = tab
+        return spreadsheet_id
+
+    @staticmethod
+    def tab_resource(tab: dict) -> dict:
+        return {
+            "properties": {
+                "sheetId": tab["sheetId"],
+                "title": tab["title"],
+                "index": 0,
+                "sheetType": "GRID",
+                "gridProperties": {"rowCount": tab["rowCount"], "columnCount": tab["columnCount"]},
+            },
+            "conditionalFormats": list(tab["rules"]),
+        }
+
+    def values(self, tab: dict, r0: int, c0: int, r1: Optional[int], c1: Optional[int], by_columns: bool = False) -> list:
+        cells = tab["cells"]
+        if not cells:
+            return []
+        r1 = max(r for r, _ in cells) if r1 is None else r1
+        c1 = max(c for _, c in cells) if c1 is None else c1
+        grid = [[cells.get((r, c), "") for c in range(c0, c1 + 1)] for r in range(r0, r1 + 1)]
+        if by_columns:
+            grid = [list(col) for col in zip(*grid)] if grid else []
+        # The API leaves out trailing empty cells and rows
+        trimmed = []
+        for line in grid:
+            while line and line[-1] == "":
+                line.pop()
+            trimmed.append(line)
+        while trimmed and not trimmed[-1]:
+            trimmed.pop()
+        return trimmed
+
+    def batch_update(self, spreadsheet_id: str, requests: list) -> list:
+        """Apply batchUpdate requests atomically; raises ValueError (answered as 400) on a bad request."""
+        spreadsheet = self.spreadsheet(spreadsheet_id)
+        with self.lock:
+            tabs = {title: dict(tab, cells=dict(tab["cells"]), rules=list(tab["rules"])) for title, tab in spreadsheet["sheets"].items()}
+            by_id = {tab["sheetId"]: tab for tab in tabs.values()}
+            replies = []
+
+            def tab_for(sheet_id):
+                if sheet_id not in by_id:
+                    raise ValueError(f"No grid with id: {sheet_id}")
+                return by_id[sheet_id]
+
+            for request in requests:
+                kind, body = next(iter(request.items()))
+                reply = {}
+                if kind == "addSheet":
+                    props = body.get("properties", {})
+                    title = props.get("title") or f"Sheet{len(tabs) + 1}"
+                    sheet_id = props.get("sheetId", max(by_id, default=0) + 1)
+                    if title in tabs:
+                        raise ValueError(f'A sheet with the name "{title}" already exists.')
+                    if sheet_id in by_id:
+                        raise ValueError(f"A sheet with the id {sheet_id} already exists.")
+                    grid = props.get("gridProperties", {})
+                    tab = self._new_tab(sheet_id, title, grid.get("rowCount", 1000), grid.get("columnCount", 26))
+                    tabs[title] = by_id[sheet_id] = tab
+                    reply = {"addSheet": self.tab_resource(tab)}
+                elif kind == "deleteSheet":
+                    tab = tab_for(body["sheetId"])
+                    del tabs[tab["title"]], by_id[tab["sheetId"]]
+                elif kind == "updateSheetProperties":
+                    tab = tab_for(body["properties"]["sheetId"])
+                    grid = body["properties"].get("gridProperties", {})
+                    tab["rowCount"] = grid.get("rowCount", tab["rowCount"])
+                    tab["columnCount"] = grid.get("columnCount", tab["columnCount"])
+                elif kind == "updateCells":
+                    if "rows" in body:
+                        start = body["start"]
+                        tab = tab_for(start["sheetId"])
+                        for r, row in enumerate(body["rows"], start.get("rowIndex", 0)):
+                            for c, cell in enumerate(row.get("values", []), start.get("columnIndex", 0)):
+                                if r >= tab["rowCount"] or c >= tab["columnCount"]:
+                                    raise ValueError(f"Range ({r},{c}) exceeds grid limits of sheet {tab['sheetId']}")
+                                value = cell.get("userEnteredValue")
+                                if value:
+                                    tab["cells"][(r, c)] = next(iter(value.values()))
+                                elif "userEnteredValue" in body.get("fields", ""):
+                                    tab["cells"].pop((r, c), None)
+                    else:
+                        tab = tab_for(body["range"]["sheetId"])
+                        if "userEnteredValue" in body.get("fields", ""):
+                            tab["cells"] = {}
+                        if "userEnteredFormat" in body.get("fields", ""):
+                            tab["formats"] = 0
+                elif kind == "repeatCell":
+                    tab_for(body["range"]["sheetId"])["formats"] += 1
+                elif kind == "addConditionalFormatRule":
+                    rule = body["rule"]
+                    tab = tab_for(rule["ranges"][0]["sheetId"])
+                    tab["rules"].insert(body.get("index", len(tab["rules"])), rule)
+                elif kind == "deleteConditionalFormatRule":
+                    tab = tab_for(body["sheetId"])
+                    del tab["rules"][body["index"]]
+                replies.append(reply)
+
+            spreadsheet["sheets"] = tabs
+            return replies
+
+
+class FakeBackendServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        google_faults: Optional[FaultInjector] = None,
+        groq_faults: Optional[FaultInjector] = None,
+        mcq_invalid_rate: float = 0.0,
+        doc_paragraphs: int = 6,
+    ):
+        super().__init__((host, port), _Handler)
+        self.state = FakeGoogleState(doc_paragraphs)
+        self.google_faults = google_faults or FaultInjector()
+        self.groq_faults = groq_faults or FaultInjector()
+        self.mcq_invalid_rate = mcq_invalid_rate
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint: str):
+        with self.stats_lock:
+            self.stats[endpoint] += 1
+
+    def start(self) -> "FakeBackendServer":
+        """Serve from a daemon thread; returns self."""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-backends", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeBackendServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # ----- plumbing -----
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _send_json(self, status: int, body, headers: Optional[dict] = None):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error(self, status: int, message: str, headers: Optional[dict] = None):
+        reason = {400: "INVALID_ARGUMENT", 404: "NOT_FOUND", 429: "RESOURCE_EXHAUSTED", 500: "INTERNAL"}.get(status, "UNKNOWN")
+        self._send_json(status, {"error": {"code": status, "message": message, "status": reason}}, headers)
+
+    def _inject(self, faults: FaultInjector) -> bool:
+        """Apply latency and maybe answer with an injected error; True if the request was answered."""
+        delay, status = faults.decide()
+        if delay:
+            time.sleep(delay)
+        if status == 429:
+            self.server.count("injected_429")
+            self._send_error(429, "Rate limit reached (injected).", {"retry-after": f"{faults.retry_after_seconds:g}"})
+            return True
+        if status == 500:
+            self.server.count("injected_500")
+            self._send_error(500, "Internal error (injected).")
+            return True
+        return False
+
+    def _route(self, method: str):
+        parsed = urlparse(self.path)
+        path, query = parsed.path, parse_qs(parsed.query)
+        body = self._read_json() if method in ("POST", "PUT") else {}
+
+        if path == "/_stats":
+            with self.server.stats_lock:
+                return self._send_json(200, dict(self.server.stats))
+        if path == "/_reset" and method == "POST":
+            with self.server.stats_lock:
+                self.server.stats.clear()
+            return self._send_json(200, {})
+
+        if path.startswith("/openai/v1/chat/completions"):
+            self.server.count("groq.chat")
+            if self._inject(self.server.groq_faults):
+                return
+            return self._chat(body)
+
+        google_routes = (
+            (r"/v1/documents/([^/:]+)", "GET", "docs.get", self._docs_get),
+            (r"/v4/spreadsheets/([^/:]+)", "GET", "sheets.get", self._sheets_get),
+            (r"/v4/spreadsheets/([^/:]+):batchUpdate", "POST", "sheets.batchUpdate", self._sheets_batch_update),
+            (r"/v4/spreadsheets/([^/:]+)/values:batchGet", "GET", "sheets.values.batchGet", self._values_batch_get),
+            (r"/v4/spreadsheets/([^/:]+)/values/(.+)", "GET", "sheets.values.get", self._values_get),
+            (r"/drive/v3/files", "GET", "drive.list", self._drive_list),
+        )
+        for pattern, route_method, name, handler in google_routes:
+            m = re.fullmatch(pattern, path)
+            if m and method == route_method:
+                self.server.count(name)
+                if self._inject(self.server.google_faults):
+                    return
+                return handler(*[unquote(g) for g in m.groups()], query=query, body=body)
+
+        self._send_error(404, f"No fake endpoint for {method} {path}")
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+    # ----- Google -----
+    def _docs_get(self, document_id, query, body):
+        doc = self.server.state.document(document_id)
+        fields = query.get("fields", [""])[0]
+        resource = {"documentId": document_id, "title": doc["title"], "revisionId": doc["revisionId"]}
+        if not fields or "body" in fields:
+            resource["body"] = {"content": [
+                {"paragraph": {"elements": [{"textRun": {"content": paragraph + "\n"}}]}}
+                for paragraph in doc["text"].split("\n")
+            ]}
+        self._send_json(200, resource)
+
+    def _sheets_get(self, spreadsheet_id, query, body):
+        state = self.server.state
+        spreadsheet = state.spreadsheet(spreadsheet_id)
+        with state.lock:
+            sheets = [state.tab_resource(tab) for tab in spreadsheet["sheets"].values()]
+        self._send_json(200, {
+            "spreadsheetId": spreadsheet_id,
+            "properties": {"title": spreadsheet["title"], "locale": "en_US", "timeZone": "Etc/GMT"},
+            "sheets": sheets,
+        })
+
+    def _sheets_batch_update(self, spreadsheet_id, query, body):
+        try:
+            replies = self.server.state.batch_update(spreadsheet_id, body.get("requests", []))
+        except ValueError as e:
+            return self._send_error(400, f"Invalid requests: {e}")
+        self._send_json(200, {"spreadsheetId": spreadsheet_id, "replies": replies})
+
+    def _read_range(self, spreadsheet_id, a1, by_columns):
+        state = self.server.state
+        spreadsheet = state.spreadsheet(spreadsheet_id)
+        title, r0, c0, r1, c1 = parse_a1_range(a1)
+        with state.lock:
+            tab = spreadsheet["sheets"].get(title)
+            if tab is None:
+                return None
+            values = state.values(tab, r0, c0, r1, c1, by_columns)
+        result = {"range": a1, "majorDimension": "COLUMNS" if by_columns else "ROWS"}
+        if values:
+            result["values"] = values
+        return result
+
+    def _values_get(self, spreadsheet_id, a1, query, body):
+        result = self._read_range(spreadsheet_id, a1, query.get("majorDimension", ["ROWS"])[0] == "COLUMNS")
+        if result is None:
+            return self._send_error(400, f"Unable to parse range: {a1}")
+        self._send_json(200, result)
+
+    def _values_batch_get(self, spreadsheet_id, query, body):
+        by_columns = query.get("majorDimension", ["ROWS"])[0] == "COLUMNS"
+        ranges = []
+        for a1 in query.get("ranges", []):
+            result = self._read_range(spreadsheet_id, a1, by_columns)
+            if result is None:
+                return self._send_error(400, f"Unable to parse range: {a1}")
+            ranges.append(result)
+        self._send_json(200, {"spreadsheetId": spreadsheet_id, "valueRanges": ranges})
+
+    def _drive_list(self, query, body):
+        q = query.get("q", [""])[0]
+        # The pipeline quotes names with ', gspread with "
+        name = re.search(r"""name\s*=\s*(['"])((?:(?!\1)[^\\]|\\.)*)\1""", q)
+        files = [self.server.state.spreadsheet_by_name(re.sub(r"\\(.)", r"\1", name.group(2)))] if name else []
+        self._send_json(200, {"kind": "drive#fileList", "files": [
+            dict(f, mimeType="application/vnd.google-apps.spreadsheet", createdTime="2024-01-01T00:00:00.000Z", modifiedTime="2024-01-01T00:00:00.000Z")
+            for f in files
+        ]})
+
+    # ----- Groq -----
+    def _chat(self, body):
+        prompt_text = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        content = canned_quiz_reply(prompt_text, self.server.mcq_invalid_rate)
+        usage = {
+            "prompt_tokens": max(len(prompt_text) // 4, 1),
+            "completion_tokens": max(len(content) // 4, 1),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        base = {"id": f"chatcmpl-fake-{zlib.crc32(content.encode('utf-8')):08x}", "created": int(time.time()), "model": body.get("model", "fake")}
+
+        if not body.get("stream"):
+            return self._send_json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        pieces = [content[i:i + 64] for i in range(0, len(content), 64)]
+        for i, piece in enumerate(pieces):
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            if i == len(pieces) - 1:
+                chunk["choices"][0]["finish_reason"] = "stop"
+                chunk["x_groq"] = {"usage": usage}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake Google Docs/Sheets/Drive and Groq backends")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--seed", type=int, default=0, help="Seed for injected latency jitter and errors")
+    for backend in ("google", "groq"):
+        parser.add_argument(f"--{backend}-latency-ms", type=float, default=0)
+        parser.add_argument(f"--{backend}-jitter-ms", type=float, default=0)
+        parser.add_argument(f"--{backend}-error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+        parser.add_argument(f"--{backend}-rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+        parser.add_argument(f"--{backend}-retry-after", type=float, default=1.0, help="retry-after seconds sent with 429s")
+    parser.add_argument("--mcq-invalid-rate", type=float, default=0.0, help="Fraction of MCQs returned with a single-letter answer")
+    parser.add_argument("--doc-paragraphs", type=int, default=6, help="Paragraphs in generated chapters")
+    parser.add_argument("--input-spreadsheet", default=None, help="Also create a story spreadsheet with this name")
+    parser.add_argument("--input-chapters", type=int, default=3)
+    parser.add_argument("--input-questions", type=int, default=5)
+    args = parser.parse_args()
+
+    def faults(backend: str) -> FaultInjector:
+        opts = vars(args)
+        return FaultInjector(
+            latency_ms=opts[f"{backend}_latency_ms"],
+            jitter_ms=opts[f"{backend}_jitter_ms"],
+            error_rate=opts[f"{backend}_error_rate"],
+            rate_limit_rate=opts[f"{backend}_rate_limit_rate"],
+            retry_after_seconds=opts[f"{backend}_retry_after"],
+            seed=args.seed,
+        )
+
+    server = FakeBackendServer(args.host, args.port, faults("google"), faults("groq"), args.mcq_invalid_rate, args.doc_paragraphs)
+    if args.input_spreadsheet:
+        server.state.add_input_spreadsheet(args.input_spreadsheet, args.input_chapters, args.input_questions)
+    print(f"🧪 Fake backends listening on {server.url} (set fake_backends.url or QUIZ_FAKE_BACKENDS_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
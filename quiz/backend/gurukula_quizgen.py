@@ -2,20 +2,32 @@
 # -*- coding: utf-8 -*-
 
 import os
+import asyncio
 import argparse
 import re
-from typing import Tuple
+from typing import Callable, Tuple
 import pandas as pd
 import gspread
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
 from typing import Optional
 from dotenv import load_dotenv; load_dotenv()
 from quiz.backend.config import env_config, app_config
-from quiz.backend.indic_quiz_generator_pipeline import (
-    run_parallel_quiz_with_mcq_retry,
+from quiz.backend.async_quiz_generator_pipeline import agenerate_quiz_json
+from quiz.backend.indic_quiz_generator_pipeline import PROMPT_VERSION, QUIZ_MODEL_ID
+from quiz.backend.utils.gsheets import (
+    extract_gdoc_file_id,
+    fetch_gdoc,
+    fetch_gdoc_metadata,
+    get_google_credentials,
+    get_gspread_client,
+    get_sheets_service,
+    read_chapter_text_from_gdoc,
 )
-from quiz.backend.utils.gsheets import get_gdoc_title, get_google_credentials, clear_all_sheet_formatting_only, read_chapter_text_from_gdoc
+from quiz.backend.utils.sheet_writer import get_sheet_metadata_cache, get_sheet_write_coordinator
+from quiz.backend.utils.concurrency import google_slots, run_bounded
+from quiz.backend.utils.metrics import bind_chapter, job_context, span
+from quiz.backend.utils.llm_cache import get_llm_cache
+from quiz.backend.utils.job_queue import describe_job, get_job_queue, submit_gdoc_job
+from quiz.backend.utils.run_manifest import get_run_manifest, text_version
 from quiz.backend.utils.logging_utils import log_and_print
 
 
@@ -63,77 +75,40 @@ def extract_spreadsheet_id(spreadsheet_link: str) -> str:
 
     return match.group(1)
 
-def validate_spreadsheet_by_id(spreadsheet_id: str, creds) -> bool:
-    """
-    Validate if a spreadsheet ID is accessible.
-    Uses direct ID lookup instead of name search (more efficient and scalable).
-
-    Args:
-        spreadsheet_id: The Google Sheets spreadsheet ID
-        creds: Google credentials
-
-    Returns:
-        True if accessible, raises ValueError if not
-    """
-    try:
-        client = gspread.authorize(creds)
-        spreadsheet = client.open_by_key(spreadsheet_id)
-        print(f"✅ Output spreadsheet validated and accessible (ID: {spreadsheet_id}).")
-        return True
-    except gspread.exceptions.SpreadsheetNotFound:
-        raise ValueError(
-            f"❌ Spreadsheet with ID '{spreadsheet_id}' not found or is NOT accessible.\n"
-            f"   Reason: The spreadsheet is either:\n"
-            f"   1. Not shared with the service account\n"
-            f"   2. Does not exist\n"
-            f"   Solution: Please ensure the spreadsheet exists and is shared with the service account."
-        )
-    except gspread.exceptions.APIError as e:
-        raise ValueError(
-            f"❌ API Error accessing spreadsheet (ID: {spreadsheet_id}):\n"
-            f"   {str(e)}\n"
-            f"   Please verify the spreadsheet is shared with the service account."
-        )
-    except Exception as e:
-        raise ValueError(
-            f"❌ Unexpected error validating spreadsheet (ID: {spreadsheet_id}):\n"
-            f"   {str(e)}\n"
-            f"   Please verify the spreadsheet is shared with the service account."
-        )
-
 # ======== STEP 1: Run Agent and Get JSON ========
 def generate_quiz_json(chapter_text: str, num_questions: int = 15) -> dict:
-    quiz = run_parallel_quiz_with_mcq_retry(chapter_text, num_questions)
-
-    # Flatten to match old format: {'Questions': [...]}
-    return {
-        "Topic": quiz["Quiz"]["Topic"],
-        "Questions": quiz["Quiz"]["Questions"]
-    }
+    # Thin sync wrapper over the asyncio engine; returns {'Topic': ..., 'Questions': [...]}
+    return asyncio.run(agenerate_quiz_json(chapter_text, num_questions))
 
 # ======== STEP 2: Convert to DataFrame ========
+# "a. " / "B.  " style labels in front of an option's text
+OPTION_PREFIX_PATTERN = re.compile(r'^[a-d]\.\s*', re.IGNORECASE)
+OPTION_HEADERS = ["Option A", "Option B", "Option C", "Option D"]
+
 def clean_option(opt: str) -> str:
-    return re.sub(r'^[a-d]\.\s*', '', opt.strip(), flags=re.IGNORECASE)
+    return OPTION_PREFIX_PATTERN.sub('', opt.strip())
 
 def quiz_json_to_dataframe(chapter_title: str, quiz_json: dict, num_questions: int) -> pd.DataFrame:
     questions = quiz_json['Questions']
-
-    # Create full DataFrame (no shuffling yet)
-    full_df = pd.DataFrame(
-        {
-            "Chapter": re.sub(r'chapter(\d+)', r'Chapter \1', chapter_title, flags=re.IGNORECASE),
-            "Timer": q.get("Timer", 15 if q.get("Question_type", "").upper() == "SCQ" else 20),
-            "Points": q.get("Number_Of_Points_Earned", 10 if q.get("Question_type", "").upper() == "SCQ" else 15),
-            "Type": "SCQ" if (q["Question_type"] == "MCQ" and len(q["Right_Option"].replace(" ", "")) == 1) else q["Question_type"],
-            "Question": q["Question"].strip() + "?" if not q["Question"].strip().endswith("?") else q["Question"].strip(),
-            "Option A": clean_option(q["Options"][0]) if len(q["Options"]) > 0 else "",
-            "Option B": clean_option(q["Options"][1]) if len(q["Options"]) > 1 else "",
-            "Option C": clean_option(q["Options"][2]) if len(q["Options"]) > 2 else "",
-            "Option D": clean_option(q["Options"][3]) if len(q["Options"]) > 3 else "",
-            "Right Answer": q["Right_Option"].replace(" ", "").lower()
-        }
-        for q in questions
-    )
+    chapter = re.sub(r'chapter(\d+)', r'Chapter \1', chapter_title, flags=re.IGNORECASE)
+
+    # Build each column as a list, then create the full DataFrame in one go (no shuffling yet)
+    is_scq = [q.get("Question_type", "").upper() == "SCQ" for q in questions]
+    types = [q["Question_type"] for q in questions]
+    rights = [q["Right_Option"].replace(" ", "") for q in questions]
+    stems = [q["Question"].strip() for q in questions]
+    # Every question's four options (missing ones "") in one flat list, cleaned in a single pass
+    options = [clean_option(opt) for q in questions for opt in (list(q["Options"][:4]) + [""] * 4)[:4]]
+
+    full_df = pd.DataFrame({
+        "Chapter": [chapter] * len(questions),
+        "Timer": [q.get("Timer", 15 if scq else 20) for q, scq in zip(questions, is_scq)],
+        "Points": [q.get("Number_Of_Points_Earned", 10 if scq else 15) for q, scq in zip(questions, is_scq)],
+        "Type": ["SCQ" if (qtype == "MCQ" and len(right) == 1) else qtype for qtype, right in zip(types, rights)],
+        "Question": [stem if stem.endswith("?") else stem + "?" for stem in stems],
+        **{header: options[i::4] for i, header in enumerate(OPTION_HEADERS)},
+        "Right Answer": [right.lower() for right in rights],
+    })
 
     # Separate main and backup questions
     if len(full_df) > num_questions:
@@ -162,219 +137,50 @@ def quiz_json_to_dataframe(chapter_title: str, quiz_json: dict, num_questions: i
     
 
 # ======== STEP 3: Upload to Google Sheet ========
-def check_spreadsheet_exists_in_drive(spreadsheet_name: str, creds) -> bool:
-    """
-    Check if a spreadsheet exists in Google Drive (without requiring access).
-    Uses Google Drive API to search for the spreadsheet by name.
-    Returns True if found, False otherwise.
+def write_quiz_to_sheet(df: pd.DataFrame, chapter_title: str, output_spreadsheet_link: Optional[str] = None) -> str:
     """
-    try:
-        drive_service = build('drive', 'v3', credentials=creds)
-        results = drive_service.files().list(
-            q=f"name='{spreadsheet_name}' and mimeType='application/vnd.google-apps.spreadsheet' and trashed=false",
-            spaces='drive',
-            pageSize=1,
-            fields='files(id, name)'
-        ).execute()
-        files = results.get('files', [])
-        return len(files) > 0
-    except Exception:
-        # If Drive API call fails, we can't determine, so return None
-        return None
+    Write quiz data to a Google Sheet tab and highlight the correct options.
 
-def validate_output_spreadsheet(spreadsheet_name: str, creds) -> bool:
-    """
-    Validate if the output spreadsheet exists and is accessible.
-    Provides specific error messages for different failure scenarios.
-    Returns True if valid, raises ValueError if not.
-    """
-    try:
-        client = gspread.authorize(creds)
-        client.open(spreadsheet_name)
-        print(f"✅ Output spreadsheet '{spreadsheet_name}' validated and accessible.")
-        return True
-    except gspread.exceptions.SpreadsheetNotFound:
-        # Check if spreadsheet exists but is just not shared
-        spreadsheet_exists = check_spreadsheet_exists_in_drive(spreadsheet_name, creds)
-        
-        if spreadsheet_exists:
-            # Spreadsheet exists but not shared with service account
-            raise ValueError(
-                f"❌ Output spreadsheet '{spreadsheet_name}' exists but is NOT accessible.\n"
-                f"   Reason: The spreadsheet is NOT shared with the service account.\n"
-                f"   Solution: Please share the spreadsheet with the service account email address."
-            )
-        elif spreadsheet_exists is False:
-            # Spreadsheet doesn't exist
-            raise ValueError(
-                f"❌ Output spreadsheet '{spreadsheet_name}' does not exist.\n"
-                f"   Reason: A spreadsheet with this name could not be found in Google Drive.\n"
-                f"   Solution: Please create the spreadsheet first, then try again."
-            )
-        else:
-            # Can't determine, fall back to generic message
-            raise ValueError(
-                f"❌ Output spreadsheet '{spreadsheet_name}' is not accessible.\n"
-                f"   Reason: The spreadsheet is either:\n"
-                f"   1. Not shared with the service account\n"
-                f"   2. Does not exist\n"
-                f"   Please ensure the spreadsheet exists and is shared with the service account."
-            )
-    except gspread.exceptions.APIError as e:
-        raise ValueError(
-            f"❌ API Error accessing spreadsheet '{spreadsheet_name}':\n"
-            f"   {str(e)}\n"
-            f"   Please verify the spreadsheet is shared with the service account."
-        )
-    except Exception as e:
-        raise ValueError(
-            f"❌ Unexpected error validating spreadsheet '{spreadsheet_name}':\n"
-            f"   {str(e)}\n"
-            f"   Please verify the spreadsheet is shared with the service account."
-        )
-    
-def upload_to_sheet(df: pd.DataFrame, chapter_title: str, output_spreadsheet_link: Optional[str] = None):
-    """
-    Upload quiz data to a Google Sheet.
+    The tab is created or resized, filled, cleared of old formatting and highlighted in
+    a single batchUpdate. Tab IDs come from a cached, fields-masked metadata fetch, which
+    also serves as the access check for the spreadsheet. Chapters finishing at about the
+    same time for the same spreadsheet are coalesced into one batchUpdate
+    (spreadsheets.write_coalesce_seconds).
 
     Args:
         df: DataFrame with quiz data
         chapter_title: Title of the chapter/worksheet
         output_spreadsheet_link: Google Sheets link or ID (optional)
                                 If not provided, uses default from config
+
+    Returns:
+        spreadsheet_id: The ID of the spreadsheet written to
     """
     print("Uploading to Google Sheet...")
 
-    creds = get_google_credentials()
-    if not creds or not creds.valid:
-        raise ValueError("Invalid Google service account credentials.")
-
-    try:
-        client = gspread.authorize(creds)
-    except Exception as e:
-        raise ValueError(f"Failed to authorize with Google Sheets API: {str(e)}")
-
-    print("Google sheets authorized...")
-
     # Determine which spreadsheet to use
     if output_spreadsheet_link:
         spreadsheet_id = extract_spreadsheet_id(output_spreadsheet_link)
         print(f"📊 Using custom output spreadsheet (ID: {spreadsheet_id})")
-        validate_spreadsheet_by_id(spreadsheet_id, creds)
-        try:
-            spreadsheet = client.open_by_key(spreadsheet_id)
-        except gspread.exceptions.SpreadsheetNotFound:
-            raise ValueError(f"❌ Spreadsheet with ID '{spreadsheet_id}' not found or not accessible.")
     else:
         # Legacy: use name-based lookup for backward compatibility
-        spreadsheet_name = OUTPUT_SPREADSHEET_NAME
-        print(f"📊 Using default output spreadsheet: '{spreadsheet_name}'")
-        spreadsheet = client.open(spreadsheet_name)
-
-    print("Spreadsheet opened for update...")
-
-    try:
-        worksheet = spreadsheet.worksheet(chapter_title)
-    except gspread.exceptions.WorksheetNotFound:
-        worksheet = spreadsheet.add_worksheet(title=chapter_title, rows=100, cols=20)
-
-    worksheet.clear()
-    worksheet.update([df.columns.values.tolist()] + df.values.tolist())
-
-    print("✅ Google Sheet updated.")
-
-    return spreadsheet.id, creds
-
-# ======== STEP 4: Conditional Formatting ========
-def apply_conditional_formatting(spreadsheet_id: str, chapter_title: str, df: pd.DataFrame, creds):
-    sheets_api = build('sheets', 'v4', credentials=creds)
-
-    # Get the sheet ID based on chapter_title
-    sheet_metadata = sheets_api.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-    sheet_id = None
-    for s in sheet_metadata['sheets']:
-        if s['properties']['title'] == chapter_title:
-            sheet_id = s['properties']['sheetId']
-            break
-    if sheet_id is None:
-        raise ValueError(f"Sheet ID not found for worksheet '{chapter_title}'")
-
-    # Clear only formatting (keep contents intact)
-    clear_all_sheet_formatting_only(sheets_api, spreadsheet_id, sheet_id)
-
-    # Mapping: Option A–D -> Columns F–I (5–8)
-    option_columns = {'a': 5, 'b': 6, 'c': 7, 'd': 8}
-    highlight_color = {"red": 0.78, "green": 0.90, "blue": 0.79}
-    requests = []
-
-    # Iterate through each question row (skipping header)
-    for i, row in enumerate(df.itertuples(index=False), start=1):
-        # SCQ: 'c', MCQ: 'bd', etc.
-        correct_options = str(row[-1]).strip().lower()
-
-        for letter, col_idx in option_columns.items():
-            is_correct = letter in correct_options
-
-            # Only apply formatting if correct; otherwise, skip to avoid clearing other formatting
-            if is_correct:
-                requests.append({
-                    "repeatCell": {
-                        "range": {
-                            "sheetId": sheet_id,
-                            "startRowIndex": i,
-                            "endRowIndex": i + 1,
-                            "startColumnIndex": col_idx,
-                            "endColumnIndex": col_idx + 1
-                        },
-                        "cell": {
-                            "userEnteredFormat": {
-                                "backgroundColor": highlight_color
-                            }
-                        },
-                        "fields": "userEnteredFormat.backgroundColor"
-                    }
-                })
-    
-    # Highlight the backup note row (The following...) in red background across columns A–F
-    for i, row in enumerate(df.itertuples(index=False), start=1):
-        if isinstance(row[0], str) and row[0].strip().startswith("The following"):
-            requests.append({
-                "repeatCell": {
-                    "range": {
-                        "sheetId": sheet_id,
-                        "startRowIndex": i,
-                        "endRowIndex": i + 1,
-                        "startColumnIndex": 0,  # Column A
-                        "endColumnIndex": 6     # Column F (non-inclusive index)
-                    },
-                    "cell": {
-                        "userEnteredFormat": {
-                            "backgroundColor": {
-                                "red": 1.0,
-                                "green": 0.8,
-                                "blue": 0.8
-                            }
-                        }
-                    },
-                    "fields": "userEnteredFormat.backgroundColor"
-                }
-            })
+        print(f"📊 Using default output spreadsheet: '{OUTPUT_SPREADSHEET_NAME}'")
+        with google_slots.slot():
+            spreadsheet_id = get_sheet_metadata_cache().id_for_name(OUTPUT_SPREADSHEET_NAME)
 
-    # Send all formatting updates in one batch
-    if requests:
-        sheets_api.spreadsheets().batchUpdate(
-            spreadsheetId=spreadsheet_id,
-            body={"requests": requests}
-        ).execute()
+    # Takes a Google slot only for the flush, so chapters waiting to be coalesced don't hold one
+    get_sheet_write_coordinator().write(spreadsheet_id, chapter_title, df)
 
-    print("✅ Correct options highlighted in green.")
+    print("✅ Google Sheet updated and correct options highlighted in green.")
+    return spreadsheet_id
 
 # ======== SRead Chapter Text from Spreadsheet ========
+# Tab ranges per values.batchGet request, keeping the request URL well below its length limit
+BATCH_GET_MAX_RANGES = 100
+
 def read_chapter_text_from_sheet(chapter_title: str) -> Tuple[str, int]:
     print(f"Reading chapter text from spreadsheet: {chapter_title}")
-    creds = get_google_credentials()
-
-    client = gspread.authorize(creds)
+    client = get_gspread_client()
     spreadsheet = client.open(INPUT_SPREADSHEET_NAME)
 
     try:
@@ -382,32 +188,65 @@ def read_chapter_text_from_sheet(chapter_title: str) -> Tuple[str, int]:
 
         key_row = worksheet.col_values(1)[:2]  # A1, A2
         val_row = worksheet.col_values(2)[:2]  # B1, B2
+    except gspread.exceptions.WorksheetNotFound:
+        raise ValueError(f"❌ Chapter tab '{chapter_title}' not found in input spreadsheet.")
 
-        metadata = dict(zip(key_row, val_row))
-
-        if "Content" not in metadata:
-            raise ValueError(f"❌ Missing 'Content' key (A2) in sheet '{chapter_title}'.")
-
-        content_val = metadata.get("Content")
-        if content_val is None:
-            raise ValueError(f"❌ 'Content' value is missing in sheet '{chapter_title}'.")
-        
-        chapter_text = str(content_val).strip()
-        try:
-            num_questions_val = metadata.get("NumQuestions")
-            if num_questions_val is None:
-                num_questions = 15
-                print(f"⚠️ Warning: 'NumQuestions' was not provided in sheet '{chapter_title}', defaulting to 15.")
-            else:
-                num_questions = int(num_questions_val)
-        except ValueError:
-            print(f"⚠️ Warning: 'NumQuestions' is not a valid number in sheet '{chapter_title}', defaulting to 15.")
-            num_questions = 15
+    return parse_chapter_tab(chapter_title, key_row, val_row)
 
-        return chapter_text, num_questions
+def read_chapter_tabs_from_sheet() -> dict:
+    """
+    Read the A1:B2 key/value cells of every tab in the input spreadsheet: one Drive
+    lookup for its ID (cached), one fields-masked metadata fetch for the tab titles
+    and one values.batchGet (per BATCH_GET_MAX_RANGES tabs).
 
-    except gspread.exceptions.WorksheetNotFound:
-        raise ValueError(f"❌ Chapter tab '{chapter_title}' not found in input spreadsheet.")
+    Returns:
+        dict: chapter_title -> (key_row, val_row), the A and B columns, in tab order;
+              parse each with parse_chapter_tab
+    """
+    print(f"📘 Reading chapters from spreadsheet: {INPUT_SPREADSHEET_NAME}")
+    spreadsheet_id = get_sheet_metadata_cache().id_for_name(INPUT_SPREADSHEET_NAME)
+    sheets_api = get_sheets_service()
+    meta = sheets_api.spreadsheets().get(spreadsheetId=spreadsheet_id, fields="sheets.properties.title").execute()
+    titles = [sheet["properties"]["title"] for sheet in meta.get("sheets", [])]
+
+    tabs = {}
+    for start in range(0, len(titles), BATCH_GET_MAX_RANGES):
+        chunk = titles[start:start + BATCH_GET_MAX_RANGES]
+        ranges = ["'{}'!A1:B2".format(title.replace("'", "''")) for title in chunk]
+        # Column-major, so each column's trailing blanks are dropped as col_values does
+        response = sheets_api.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id, ranges=ranges, majorDimension="COLUMNS"
+        ).execute()
+        for title, value_range in zip(chunk, response.get("valueRanges", [])):
+            columns = value_range.get("values", [])
+            tabs[title] = (columns[0] if columns else [], columns[1] if len(columns) > 1 else [])
+    print(f"✅ Read {len(tabs)} chapter tabs")
+    return tabs
+
+def parse_chapter_tab(chapter_title: str, key_row: list, val_row: list) -> Tuple[str, int]:
+    """Chapter text and question count from a tab's A1:A2 keys and B1:B2 values."""
+    metadata = dict(zip(key_row, val_row))
+
+    if "Content" not in metadata:
+        raise ValueError(f"❌ Missing 'Content' key (A2) in sheet '{chapter_title}'.")
+
+    content_val = metadata.get("Content")
+    if content_val is None:
+        raise ValueError(f"❌ 'Content' value is missing in sheet '{chapter_title}'.")
+    
+    chapter_text = str(content_val).strip()
+    try:
+        num_questions_val = metadata.get("NumQuestions")
+        if num_questions_val is None:
+            num_questions = 15
+            print(f"⚠️ Warning: 'NumQuestions' was not provided in sheet '{chapter_title}', defaulting to 15.")
+        else:
+            num_questions = int(num_questions_val)
+    except ValueError:
+        print(f"⚠️ Warning: 'NumQuestions' is not a valid number in sheet '{chapter_title}', defaulting to 15.")
+        num_questions = 15
+
+    return chapter_text, num_questions
 
 
 # ======== MAIN PIPELINE FUNCTION ========
@@ -425,29 +264,45 @@ def process_chapter_to_sheet(
     output_spreadsheet_link: Optional[str] = None,
     quiz_generator_fn=generate_quiz_json,
 ):
+    with job_context(chapter=chapter_title):
+        return _process_chapter_to_sheet(
+            chapter_path, chapter_title, num_questions, input_source, output_spreadsheet_link, quiz_generator_fn
+        )
+
+def _process_chapter_to_sheet(chapter_path, chapter_title, num_questions, input_source, output_spreadsheet_link, quiz_generator_fn):
+    chapter_text, num_questions = read_chapter(chapter_path, chapter_title, num_questions, input_source)
+    return generate_chapter_to_sheet(chapter_title, chapter_text, num_questions, output_spreadsheet_link, quiz_generator_fn)
+
+def read_chapter(chapter_path: Optional[str], chapter_title: str, num_questions: Optional[int], input_source: str) -> Tuple[str, Optional[int]]:
+    """Read a chapter's text; spreadsheet tabs also supply their own num_questions."""
     if input_source == "spreadsheet":
         print(f"📘 Reading from spreadsheet: {chapter_title}")
-        (chapter_text, num_questions) = read_chapter_text_from_sheet(chapter_title)
+        with google_slots.slot(), span("read", source="spreadsheet"):
+            (chapter_text, num_questions) = read_chapter_text_from_sheet(chapter_title)
     elif input_source == "file":
         print(f"📘 Reading from file: {chapter_path}")
         assert chapter_path is not None, "chapter_path must not be None when input_source is 'file'"
-        with open(chapter_path, "r", encoding="utf-8") as f:
+        with span("read", source="file"), open(chapter_path, "r", encoding="utf-8") as f:
             chapter_text = f.read()
     elif input_source == "gdoc":
         doc_link = app_config['documents']['link']
         print(f"📘 Reading from Google Doc: {doc_link}")
-        chapter_text = read_chapter_text_from_gdoc(doc_link)
+        with google_slots.slot(), span("read", source="gdoc"):
+            chapter_text = read_chapter_text_from_gdoc(doc_link)
     else:
         raise ValueError("Invalid input source. Use 'spreadsheet', 'file' or 'gdoc'.")
+    return chapter_text, num_questions
 
+def generate_chapter_to_sheet(chapter_title, chapter_text, num_questions, output_spreadsheet_link, quiz_generator_fn=generate_quiz_json):
     print(f"📘 Processing: {chapter_title} with {num_questions} questions...")
-    quiz_json = quiz_generator_fn(chapter_text, num_questions)
+    with span("generate", questions=num_questions):
+        quiz_json = quiz_generator_fn(chapter_text, num_questions)
     print(f"✅ Quiz Generated: {chapter_title}")
 
     df = quiz_json_to_dataframe(chapter_title, quiz_json, num_questions if num_questions is not None else 15)
 
-    spreadsheet_id, creds = upload_to_sheet(df, chapter_title, output_spreadsheet_link)
-    apply_conditional_formatting(spreadsheet_id, chapter_title, df, creds)
+    with span("upload"):
+        spreadsheet_id = write_quiz_to_sheet(df, chapter_title, output_spreadsheet_link)
     print(f"✅ Done: {chapter_title}\n")
 
     return spreadsheet_id  # Optional return
@@ -478,59 +333,142 @@ def run_single_quiz_pipeline(chapter_title: str, input_source: str, output_sprea
     else:  # spreadsheet
         process_chapter_to_sheet(None, chapter_title, None, input_source, output_spreadsheet_link)
 
+# ======== Skip-Unchanged Manifest ========
+def manifest_settings(source_version: str, num_questions: int, output: str) -> dict:
+    """Everything a batch item's quiz depends on; the item is regenerated when any of it changes."""
+    return {
+        "source_version": source_version,
+        "num_questions": num_questions,
+        "model": QUIZ_MODEL_ID,
+        "prompt_version": PROMPT_VERSION,
+        "output": output,
+    }
+
+def generate_unless_current(key: str, settings: dict, label: str, force: bool, generate: Callable[[], str]) -> dict:
+    """
+    Run `generate` (returning the spreadsheet ID) unless the manifest shows the item
+    was already generated with the same settings. The manifest is updated after each
+    successful run.
+
+    Returns:
+        dict with "spreadsheet_id" and "skipped"
+    """
+    manifest = get_run_manifest()
+    if not force and manifest.is_current(key, settings):
+        print(f"⏭️ Skipping {label}: unchanged since the last run")
+        return {"spreadsheet_id": manifest.get(key)["spreadsheet_id"], "skipped": True}
+    spreadsheet_id = generate()
+    manifest.record(key, settings, spreadsheet_id)
+    return {"spreadsheet_id": spreadsheet_id, "skipped": False}
+
 # ======== Processing Chapters in Batch ========
-def run_batch_quiz_pipeline(input_source: str, output_spreadsheet_link: Optional[str] = None):        
+def run_batch_quiz_pipeline(input_source: str, output_spreadsheet_link: Optional[str] = None, jobs: int = 1, force: bool = False):
+    """
+    Process every chapter from the data directory or the input spreadsheet.
+    Chapters whose text, question count, model and prompts are unchanged since
+    their last run to the same output are skipped unless `force` is set.
+
+    Args:
+        input_source: 'file' or 'spreadsheet'
+        output_spreadsheet_link: Google Sheets link or ID (optional)
+        jobs: Number of chapters to process concurrently
+        force: Regenerate every chapter even if it is unchanged
+
+    Returns:
+        results: List of dicts with processing results (success/skipped/failed), in input order
+    """
     if input_source == "file":
         quiz_counts = app_config.get("chapter_question_counts", {})
+        items = []
         for filename in os.listdir(DATA_DIR):
             if filename.endswith(".txt"):
                 chapter_path = os.path.join(DATA_DIR, filename)
                 chapter_title = filename.replace(".txt", "").strip()
                 num_questions = quiz_counts.get(chapter_title.lower(), 15)
-                process_chapter_to_sheet(chapter_path, chapter_title, num_questions, input_source, output_spreadsheet_link)
+                items.append((chapter_path, chapter_title, num_questions))
     elif input_source == "spreadsheet":  # spreadsheet
-        # ===== Get all sheet/tab names from input spreadsheet =====
-        print(f"📘 Reading chapters from spreadsheet: {INPUT_SPREADSHEET_NAME}")
         creds = get_google_credentials()
 
         print("Authorizing Google Sheets API...")  
         if not creds or not creds.valid:
             raise ValueError("Invalid Google service account credentials.")
-        
-        client = gspread.authorize(creds)
-        spreadsheet = client.open(INPUT_SPREADSHEET_NAME)
-
-        print("Spreadsheet opened successfully...")
-        sheet_list = spreadsheet.worksheets()
-        chapter_titles = [sheet.title for sheet in sheet_list]
-        
-        for chapter_title in chapter_titles:
-            process_chapter_to_sheet(None, chapter_title, None, input_source, output_spreadsheet_link)
+
+        # ===== Read every chapter tab of the input spreadsheet up front =====
+        with span("read", source="spreadsheet"):
+            chapter_tabs = read_chapter_tabs_from_sheet()
+        items = [(None, chapter_title, None) for chapter_title in chapter_tabs]
     else:
         raise ValueError("Invalid input source. Use 'spreadsheet' or 'file'.")
 
+    print("=" * 60)
+    print(f"🔄 Batch Processing: {len(items)} chapters ({jobs} concurrent)")
+    print("=" * 60)
+
+    output = extract_spreadsheet_id(output_spreadsheet_link) if output_spreadsheet_link else OUTPUT_SPREADSHEET_NAME
+
+    def process_item(item):
+        chapter_path, chapter_title, num_questions = item
+        with job_context(chapter=chapter_title):
+            if input_source == "spreadsheet":
+                chapter_text, num_questions = parse_chapter_tab(chapter_title, *chapter_tabs[chapter_title])
+            else:
+                chapter_text, num_questions = read_chapter(chapter_path, chapter_title, num_questions, input_source)
+            return generate_unless_current(
+                f"{input_source}:{chapter_title} -> {output}",
+                manifest_settings(text_version(chapter_text), num_questions, output),
+                chapter_title,
+                force,
+                lambda: generate_chapter_to_sheet(chapter_title, chapter_text, num_questions, output_spreadsheet_link),
+            )
+
+    outcomes = run_bounded(process_item, items, jobs)
+
+    results = []
+    for idx, ((_, chapter_title, _), outcome) in enumerate(zip(items, outcomes), 1):
+        result = {'index': idx, 'chapter': chapter_title, 'elapsed_seconds': round(outcome['elapsed_seconds'], 2)}
+        if outcome['error'] is None:
+            result.update({
+                'status': 'skipped' if outcome['result']['skipped'] else 'success',
+                'spreadsheet_id': outcome['result']['spreadsheet_id'],
+            })
+        else:
+            print(f"❌ Error processing chapter '{chapter_title}': {str(outcome['error'])}")
+            result.update({'status': 'failed', 'error': str(outcome['error'])})
+        results.append(result)
+
+    print_batch_summary(results, len(items))
+    return results
+
 # ======== Google Doc Processing ========
 def process_chapter_to_sheet_gdoc(doc_link: str, num_questions: int, output_spreadsheet_link: Optional[str] = None, quiz_generator_fn=generate_quiz_json):
     """
     Process a chapter from a Google Doc link and number of questions.
     Uses the doc title as the chapter_title for the spreadsheet tab.
     """
-    creds = get_google_credentials()
-    chapter_title = get_gdoc_title(doc_link, creds)
-    chapter_text = read_chapter_text_from_gdoc(doc_link)
-    quiz_json = quiz_generator_fn(chapter_text, num_questions)
-    df = quiz_json_to_dataframe(chapter_title, quiz_json, num_questions)
-    spreadsheet_id, creds = upload_to_sheet(df, chapter_title, output_spreadsheet_link)
-    apply_conditional_formatting(spreadsheet_id, chapter_title, df, creds)
-    print(f"✅ Done: {chapter_title}\n")
-    return spreadsheet_id
+    with job_context():
+        with google_slots.slot(), span("read", source="gdoc"):
+            gdoc = fetch_gdoc(doc_link)
+        chapter_title, chapter_text = gdoc["title"], gdoc["text"]
+        bind_chapter(chapter_title)
+        with span("generate", questions=num_questions):
+            quiz_json = quiz_generator_fn(chapter_text, num_questions)
+        df = quiz_json_to_dataframe(chapter_title, quiz_json, num_questions)
+        with span("upload"):
+            spreadsheet_id = write_quiz_to_sheet(df, chapter_title, output_spreadsheet_link)
+        print(f"✅ Done: {chapter_title}\n")
+        return spreadsheet_id
 
 # ======== Google Doc to Spreadsheet Workflow ========
+# Stages reported to `on_stage` by run_gdoc_to_spreadsheet_workflow, in order
+WORKFLOW_STAGES = ("read", "generate", "write")
+
 def run_gdoc_to_spreadsheet_workflow(
     input_doc_link: str,
     output_spreadsheet_link: str,
     num_questions: int = 15,
-    quiz_generator_fn=generate_quiz_json
+    quiz_generator_fn=generate_quiz_json,
+    on_stage: Optional[Callable[[str, str], None]] = None,
+    prefetched_gdoc: Optional[dict] = None
 ):
     """
     Read content from a Google Doc and write quiz to a Google Spreadsheet.
@@ -541,48 +479,92 @@ def run_gdoc_to_spreadsheet_workflow(
         output_spreadsheet_link: Google Sheets link to write quiz to
         num_questions: Number of questions to generate
         quiz_generator_fn: Function to generate quiz (default: generate_quiz_json)
+        on_stage: Optional callback invoked as on_stage(stage, message) when each of
+                  WORKFLOW_STAGES completes
+        prefetched_gdoc: What the caller already fetched for the doc (see fetch_gdoc)
 
     Returns:
         spreadsheet_id: The ID of the spreadsheet where quiz was written
     """
+    def stage_done(stage: str, message: str):
+        print(message)
+        if on_stage is not None:
+            on_stage(stage, message)
+
     print("=" * 60)
     print("🔄 Google Doc → Quiz → Google Spreadsheet Workflow")
     print("=" * 60)
 
-    creds = get_google_credentials()
+    with job_context():
+        print(f"📖 Reading from Google Doc: {input_doc_link}")
+        with google_slots.slot(), span("read", source="gdoc"):
+            gdoc = fetch_gdoc(input_doc_link, prefetched=prefetched_gdoc)
+        chapter_title, chapter_text = gdoc["title"], gdoc["text"]
+        bind_chapter(chapter_title)
+        stage_done("read", f"✅ Retrieved chapter: {chapter_title}")
 
-    print(f"📖 Reading from Google Doc: {input_doc_link}")
-    chapter_title = get_gdoc_title(input_doc_link, creds)
-    chapter_text = read_chapter_text_from_gdoc(input_doc_link)
-    print(f"✅ Retrieved chapter: {chapter_title}")
+        print(f"📘 Generating quiz with {num_questions} questions...")
+        with span("generate", questions=num_questions):
+            quiz_json = quiz_generator_fn(chapter_text, num_questions)
+        stage_done("generate", f"✅ Quiz generated: {quiz_json['Topic']}")
 
-    print(f"📘 Generating quiz with {num_questions} questions...")
-    quiz_json = quiz_generator_fn(chapter_text, num_questions)
-    print(f"✅ Quiz generated: {quiz_json['Topic']}")
+        df = quiz_json_to_dataframe(chapter_title, quiz_json, num_questions)
 
-    df = quiz_json_to_dataframe(chapter_title, quiz_json, num_questions)
+        with span("upload"):
+            spreadsheet_id = write_quiz_to_sheet(df, chapter_title, output_spreadsheet_link)
 
-    spreadsheet_id, creds = upload_to_sheet(df, chapter_title, output_spreadsheet_link)
-    apply_conditional_formatting(spreadsheet_id, chapter_title, df, creds)
+        stage_done("write", f"✅ Done: {chapter_title}\n")
+        return spreadsheet_id
 
-    print(f"✅ Done: {chapter_title}\n")
-    return spreadsheet_id
-
-def run_batch_gdoc_to_spreadsheet_workflow(batch_config: list):
+def print_batch_summary(results: list, total: int):
+    print("\n" + "=" * 60)
+    print("📊 Batch Processing Summary")
+    print("=" * 60)
+    successful = sum(1 for r in results if r['status'] == 'success')
+    skipped = sum(1 for r in results if r['status'] == 'skipped')
+    failed = sum(1 for r in results if r['status'] == 'failed')
+    print(f"✅ Successful: {successful}/{total}")
+    if skipped:
+        print(f"⏭️ Skipped (unchanged): {skipped}/{total}")
+    print(f"❌ Failed: {failed}/{total}")
+    for r in results:
+        if 'elapsed_seconds' in r:
+            print(f"   [{r['index']}] {r['status']} in {r['elapsed_seconds']:.1f}s")
+
+def gdoc_version(doc_link: str) -> Tuple[str, dict]:
+    """
+    The doc's revisionId, or a hash of its text when Docs does not report one.
+    Also returns what was fetched to find it, so reading the doc can reuse it
+    (pass it to fetch_gdoc as `prefetched`).
+    """
+    with google_slots.slot():
+        meta = fetch_gdoc_metadata(doc_link)
+        if meta["revision_id"]:
+            return f"revision:{meta['revision_id']}", meta
+        gdoc = fetch_gdoc(doc_link, prefetched=meta)
+        return text_version(gdoc["text"]), gdoc
+
+def run_batch_gdoc_to_spreadsheet_workflow(batch_config: list, jobs: int = 1, force: bool = False):
     """
     Process multiple Google Doc to Spreadsheet pairs in batch.
+    Pairs whose doc revision, question count, model and prompts are unchanged since
+    their last run are skipped unless `force` is set.
 
     Args:
         batch_config: List of dicts with input_link, output_link, and num_questions
+        jobs: Number of documents to process concurrently. LLM and Google API calls
+              are additionally capped by the `concurrency` section of app_config.yaml.
+        force: Regenerate every pair even if it is unchanged
 
     Returns:
-        results: List of dicts with processing results (success/failed)
+        results: List of dicts with processing results (success/skipped/failed), in input order,
+                 each with its elapsed_seconds
     """
     print("=" * 60)
-    print(f"🔄 Batch Processing: {len(batch_config)} documents")
+    print(f"🔄 Batch Processing: {len(batch_config)} documents ({jobs} concurrent)")
     print("=" * 60)
 
-    results = []
+    items = []
     for idx, config in enumerate(batch_config, 1):
         input_link = config.get('input_link')
         output_link = config.get('output_link')
@@ -591,37 +573,81 @@ def run_batch_gdoc_to_spreadsheet_workflow(batch_config: list):
         if not input_link or not output_link:
             print(f"❌ Skipping batch item {idx}: missing input_link or output_link")
             continue
+        items.append((idx, input_link, output_link, num_questions))
 
+    def process_item(item):
+        idx, input_link, output_link, num_questions = item
         print(f"\n[{idx}/{len(batch_config)}] Processing...")
-        try:
-            spreadsheet_id = run_gdoc_to_spreadsheet_workflow(
-                input_link,
-                output_link,
-                num_questions
-            )
+        output = extract_spreadsheet_id(output_link)
+        version, prefetched = gdoc_version(input_link)
+        return generate_unless_current(
+            f"gdoc:{extract_gdoc_file_id(input_link)} -> {output}",
+            manifest_settings(version, num_questions, output),
+            f"batch item {idx}",
+            force,
+            lambda: run_gdoc_to_spreadsheet_workflow(input_link, output_link, num_questions, prefetched_gdoc=prefetched),
+        )
+
+    outcomes = run_bounded(process_item, items, jobs)
+
+    results = []
+    for (idx, *_), outcome in zip(items, outcomes):
+        if outcome['error'] is None:
             results.append({
                 'index': idx,
-                'status': 'success',
-                'spreadsheet_id': spreadsheet_id
+                'status': 'skipped' if outcome['result']['skipped'] else 'success',
+                'spreadsheet_id': outcome['result']['spreadsheet_id'],
+                'elapsed_seconds': round(outcome['elapsed_seconds'], 2)
             })
-        except Exception as e:
-            print(f"❌ Error processing batch item {idx}: {str(e)}")
+        else:
+            print(f"❌ Error processing batch item {idx}: {str(outcome['error'])}")
             results.append({
                 'index': idx,
                 'status': 'failed',
-                'error': str(e)
+                'error': str(outcome['error']),
+                'elapsed_seconds': round(outcome['elapsed_seconds'], 2)
             })
 
-    print("\n" + "=" * 60)
-    print("📊 Batch Processing Summary")
-    print("=" * 60)
-    successful = sum(1 for r in results if r['status'] == 'success')
-    failed = sum(1 for r in results if r['status'] == 'failed')
-    print(f"✅ Successful: {successful}/{len(batch_config)}")
-    print(f"❌ Failed: {failed}/{len(batch_config)}")
-
+    print_batch_summary(results, len(batch_config))
     return results
 
+# ======== Queued Jobs ========
+def submit_and_follow_jobs(pairs: list) -> list:
+    """
+    Queue one job per (input_doc_link, output_spreadsheet_link, num_questions) for the
+    job workers and print their progress until every job has finished.
+
+    Returns:
+        list: The finished jobs
+    """
+    job_ids = [submit_gdoc_job(*pair) for pair in pairs]
+    for job_id, (input_doc_link, _, num_questions) in zip(job_ids, pairs):
+        print(f"📥 Queued job {job_id}: {input_doc_link} ({num_questions} questions)")
+    print("   Workers run them: python -m quiz.backend.job_worker")
+
+    printed = dict.fromkeys(job_ids, 0)
+    statuses = dict.fromkeys(job_ids, "queued")
+    jobs = []
+    for jobs in get_job_queue().follow(job_ids, poll_seconds=app_config.get("jobs", {}).get("poll_seconds", 1.0)):
+        for job_id, job in zip(job_ids, jobs):
+            for line in job["progress"][printed[job_id]:]:
+                print(f"[Job {job_id}] {line}")
+            printed[job_id] = len(job["progress"])
+            if job["status"] != statuses[job_id]:
+                statuses[job_id] = job["status"]
+                print(describe_job(job_id, job))
+    succeeded = sum(job["status"] == "succeeded" for job in jobs)
+    print(f"\n{'✅' if succeeded == len(jobs) else '⚠️'} {succeeded}/{len(jobs)} queued job(s) succeeded.")
+    return jobs
+
+
+def print_job_status(job_id: str):
+    job = get_job_queue().get(job_id)
+    print(describe_job(job_id, job))
+    for line in job["progress"] if job else []:
+        print(f"   {line}")
+
+
 # ======== Main ========
 def main():
     parser = argparse.ArgumentParser(
@@ -657,9 +683,44 @@ def main():
         action='store_true',
         help='Use batch mode for default_quiz_gen (processes multiple doc/sheet pairs from config)'
     )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        help='Number of chapters to process concurrently in batch runs (default: 1)'
+    )
+    parser.add_argument(
+        '--bypass_llm_cache',
+        action='store_true',
+        help='Always call the LLM instead of serving cached responses (fresh responses are still cached)'
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Regenerate every batch item, including ones unchanged since their last run'
+    )
+    parser.add_argument(
+        '--submit',
+        action='store_true',
+        help='Queue default_quiz_gen runs for the job workers and follow their progress instead of running them here'
+    )
+    parser.add_argument(
+        '--job_status',
+        type=str,
+        default=None,
+        metavar='JOB_ID',
+        help='Print the status and progress of a queued job and exit'
+    )
 
     args = parser.parse_args()
 
+    if args.bypass_llm_cache:
+        get_llm_cache().bypass = True
+
+    if args.job_status:
+        print_job_status(args.job_status)
+        return
+
     # ===== Default Quiz Generation Mode =====
     if args.mode == 'default_quiz_gen':
         doc_config = app_config.get('source_documents', {})
@@ -677,7 +738,13 @@ def main():
                     "         output_link: ...\n"
                     "         num_questions: 15"
                 )
-            run_batch_gdoc_to_spreadsheet_workflow(batch_config)
+            if args.submit:
+                submit_and_follow_jobs([
+                    (item['input_link'], item['output_link'], item.get('num_questions', 15))
+                    for item in batch_config if item.get('input_link') and item.get('output_link')
+                ])
+                return
+            run_batch_gdoc_to_spreadsheet_workflow(batch_config, jobs=args.jobs, force=args.force)
             return
 
         # Single pair mode
@@ -705,6 +772,9 @@ def main():
         output_spreadsheet_link = doc_config['output_link']
         num_questions = args.num_questions or doc_config.get('num_questions', 15)
 
+        if args.submit:
+            submit_and_follow_jobs([(input_doc_link, output_spreadsheet_link, num_questions)])
+            return
         run_gdoc_to_spreadsheet_workflow(input_doc_link, output_spreadsheet_link, num_questions)
         return
 
@@ -716,7 +786,7 @@ def main():
     if input_source == "file":
         run_single_quiz_pipeline(chapter, input_source=input_source, output_spreadsheet_link=output_spreadsheet_link)
     else:
-        run_batch_quiz_pipeline(input_source=input_source, output_spreadsheet_link=output_spreadsheet_link)
+        run_batch_quiz_pipeline(input_source=input_source, output_spreadsheet_link=output_spreadsheet_link, jobs=args.jobs, force=args.force)
 
     log_and_print("Quiz generation pipeline started.")
 
@@ -1,35 +1,152 @@
 # backend/indic_quiz_generator_pipeline.py
 
 import difflib
+import hashlib
 import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
 from concurrent.futures import ThreadPoolExecutor
 import json
 import json_repair
+import orjson
 from agno.agent import Agent
+from agno.exceptions import ModelProviderError
 from agno.models.groq import Groq
-from quiz.backend.utils.logging_utils import log_and_print
+from agno.run.response import RunEvent
+from quiz.backend.config import app_config, FAKE_BACKEND_URL
+from quiz.backend.utils.chunking import allocate_quotas, interleave_by_quota, split_into_chunks
+from quiz.backend.utils.chunk_store import get_chunk_store
+from quiz.backend.utils.concurrency import groq_slots, submit_in_context
+from quiz.backend.utils.dedupe import normalize_text, build_index, dedupe_question_pool
+from quiz.backend.utils.llm_cache import get_llm_cache, make_cache_key
+from quiz.backend.utils.metrics import record_retry, record_tokens, span
+from quiz.backend.utils.rate_limiter import estimate_tokens, get_groq_rate_limiter
+from quiz.backend.utils.logging_utils import log_and_print, log_artifact, log_debug
+
+QUIZ_MODEL_ID = "openai/gpt-oss-120b"
+# Agent settings that affect the completion; part of the response cache key
+QUIZ_AGENT_PARAMS = {"markdown": True}
+
+GENERATION_CONFIG = app_config.get("generation", {})
+# Stream MCQ replies and stop once enough valid questions have arrived
+STREAMING_ENABLED = GENERATION_CONFIG.get("streaming", False)
+# Valid MCQs to collect beyond the number the merge picks, to absorb deduplication losses
+STREAM_MCQ_SURPLUS = GENERATION_CONFIG.get("stream_mcq_surplus", 2)
+# Follow-up calls asking only for the missing MCQs when a reply has too few valid ones
+MCQ_REPAIR_PASSES = GENERATION_CONFIG.get("mcq_repair_passes", 1)
+# Chapters longer than this are generated chunk by chunk and reduced (0 disables chunking)
+CHUNK_ABOVE_CHARS = GENERATION_CONFIG.get("chunk_above_chars", 12000)
+# Target size of one chunk; chunks are built from whole paragraphs
+CHUNK_CHARS = GENERATION_CONFIG.get("chunk_chars", 6000)
+
+
+# Option prefixes such as "a. " that are stripped before options are relabelled
+OPTION_LABEL_PATTERN = re.compile(r"^[a-dA-D]\.\s+(.*)")
+# Opening of the questions array; broken replies are split into question objects from here
+QUESTIONS_ARRAY_PATTERN = re.compile(r"""(["'])([Qq]uestions)\1\s*:\s*\[""")
+# A complete JSON string
+JSON_STRING_PATTERN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+# An object with no nested objects, the usual shape of a question
+FLAT_OBJECT_PATTERN = re.compile(r'\{(?:[^{}"]|' + JSON_STRING_PATTERN.pattern + r')*+\}')
+# Braces outside JSON strings, used to find where a nested object ends
+OBJECT_STRUCTURE_PATTERN = re.compile(JSON_STRING_PATTERN.pattern + r'|[{}]')
+# Everything up to the next trailing comma before } or ] (or to the end), skipping over strings
+# so commas inside them are kept; one match per comma keeps the substitution in C
+TRAILING_COMMA_PATTERN = re.compile(
+    r'((?:[^",]++|' + JSON_STRING_PATTERN.pattern + r'|,(?!\s*[}\]]))*+)(?:,(\s*[}\]])|\Z)'
+)
+# Start of a question object's "Question" key
+QUESTION_KEY_PATTERN = re.compile(r'"Question"\s*:')
+# Question keys that are never read as flattened options
+QUESTION_FIELD_KEYS = frozenset(("question", "right_option", "options", "question_type", "number_of_points_earned", "timer"))
+
+
+def _loads_strict(text: str):
+    """orjson, then json (which also takes NaN/Infinity); raises json.JSONDecodeError if neither can."""
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return json.loads(text)
+
+
+def _loads_lenient(text: str):
+    """Like _loads_strict, but also accepts trailing commas."""
+    try:
+        return _loads_strict(text)
+    except json.JSONDecodeError:
+        return orjson.loads(TRAILING_COMMA_PATTERN.sub(r"\1\2", text))
+
+
+def _loads_fragment(text: str):
+    """Decode a small piece of a reply, trying cheap fixes before json_repair."""
+    try:
+        return _loads_lenient(text)
+    except json.JSONDecodeError:
+        return json_repair.loads(text)
+
+
+def _object_end(text: str, start: int) -> int:
+    """Index just past the object opening at `start`, or len(text) if the reply stops inside it."""
+    flat = FLAT_OBJECT_PATTERN.match(text, start)
+    if flat:
+        return flat.end()
+    depth = 0
+    for m in OBJECT_STRUCTURE_PATTERN.finditer(text, start):
+        token = m.group(0)
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth == 0:
+                return m.end()
+    return len(text)
+
+
+def _split_question_objects(text: str, start: int):
+    """
+    Split the array body starting at `start` into its object fragments.
+    Returns (fragments, end) with `end` just past the closing "]" (len(text) if the
+    reply was cut off), or (None, None) if an element is not an object.
+    """
+    fragments = []
+    i, size = start, len(text)
+    while True:
+        while i < size and text[i] in " \t\r\n,":
+            i += 1
+        if i == size:
+            return fragments, size
+        if text[i] == "]":
+            return fragments, i + 1
+        if text[i] != "{":
+            return None, None
+        end = _object_end(text, i)
+        fragments.append(text[i:end])
+        i = end
 
 
 class QuizParser:
     """Parses the quiz JSON out of the LLM's response."""
 
+    @span("parse")
     def run(self, reply_text: str):
-        import re
+        return self.parse(reply_text)
 
+    def parse(self, reply_text: str):
+        """run() without the metrics span, for checks that are not a pipeline stage."""
         # Extract JSON-ish content
         first_index = min(reply_text.find("{"), reply_text.find("["))
         last_index = max(reply_text.rfind("}"), reply_text.rfind("]")) + 1
         json_portion = reply_text[first_index:last_index]
 
         try:
-            quiz = json.loads(json_portion)
+            quiz = _loads_strict(json_portion)
         except json.JSONDecodeError:
-            quiz = json_repair.loads(json_portion)
+            quiz = self.repair(json_portion)
 
         # 🔽 Handle case where JSON loader returns a string (e.g., double-encoded JSON)
         if isinstance(quiz, str):
             try:
-                quiz = json.loads(quiz)
+                quiz = _loads_strict(quiz)
             except json.JSONDecodeError:
                 try:
                     quiz = json_repair.loads(quiz)
@@ -52,57 +169,290 @@ class QuizParser:
             return {"Questions": []}
 
         for q in questions:
-            raw_options = q.get("Options") or q.get("options")
-
-            # Handle if options is a dictionary (malformed)
-            if isinstance(raw_options, dict):
-                raw_options = list(raw_options.values())
-            elif not isinstance(raw_options, list):
-                # Try reconstructing from str fields
-                raw_options = []
-                for key, value in q.items():
-                    if key.lower() not in ("question", "right_option", "options", "question_type", "number_of_points_earned",  "timer"):
-                        if isinstance(value, str):
-                            raw_options.append(key.strip())
-                            raw_options.append(value.strip())
-                for key in list(q.keys()):
-                    if key.lower() not in ("question", "right_option", "options", "question_type", "number_of_points_earned",  "timer"):
-                        q.pop(key)
-
-            if not isinstance(raw_options, list):
-                raw_options = []
-
-            # Normalize options
-            normalized = []
-            seen = set()
-            for opt in raw_options:
-                if not isinstance(opt, str):
-                    continue
-                match = re.match(r"^[a-dA-D]\.\s+(.*)", opt.strip())
-                text = match.group(1).strip() if match else opt.strip()
-                if text not in seen:
-                    seen.add(text)
-                    normalized.append(text)
-
-            while len(normalized) < 4:
-                normalized.append("(missing option)")
-
-            normalized = normalized[:4]
-            labeled = [f"{label}. {text}" for label, text in zip("abcd", normalized)]
-            q["Options"] = labeled
+            self.normalize_question(q)
 
         # Final safeguard: return normalized quiz
         return {"Questions": questions}
 
+    @staticmethod
+    def repair(json_portion: str):
+        """
+        Decode a reply that isn't valid JSON, repairing only the broken parts.
 
-def build_english_quiz_agent(model_id: str) -> Agent:
+        Each object in the questions array is decoded on its own and the rest of the
+        reply with an empty array in its place, so trailing commas or a reply cut off
+        mid-question don't send the whole reply through json_repair. Anything else
+        (e.g. an unescaped quote, which throws off where objects end) is repaired whole.
+        """
+        m = QUESTIONS_ARRAY_PATTERN.search(json_portion)
+        if m is None:
+            return json_repair.loads(json_portion)
+        fragments, end = _split_question_objects(json_portion, m.end())
+        if fragments is None:
+            return json_repair.loads(json_portion)
+
+        envelope = _loads_fragment(json_portion[:m.end()] + "]" + json_portion[end:])
+        key = m.group(2)
+        holder = envelope
+        if isinstance(envelope, dict) and envelope.get(key) != [] and isinstance(envelope.get("Quiz"), dict):
+            holder = envelope["Quiz"]
+        if not isinstance(holder, dict) or holder.get(key) != []:
+            return json_repair.loads(json_portion)
+        # Only a question the reply stops inside is left to json_repair, and only if it
+        # stops between strings; a tail holding more than one question means the split went wrong
+        cut_off = end == len(json_portion) and bool(fragments)
+        if cut_off and (
+            len(QUESTION_KEY_PATTERN.findall(fragments[-1])) > 1 or '"' in JSON_STRING_PATTERN.sub("", fragments[-1])
+        ):
+            return json_repair.loads(json_portion)
+        try:
+            questions = [_loads_lenient(fragment) for fragment in fragments[:-1 if cut_off else None]]
+        except json.JSONDecodeError:
+            return json_repair.loads(json_portion)
+        if cut_off:
+            last = _loads_fragment(fragments[-1])
+            if not isinstance(last, dict):
+                return json_repair.loads(json_portion)
+            questions.append(last)
+        holder[key] = questions
+        return envelope
+
+    def normalize_question(self, q: dict) -> dict:
+        """Normalize one question's options in place to four 'a. ...' to 'd. ...' entries."""
+        raw_options = q.get("Options") or q.get("options")
+
+        # Handle if options is a dictionary (malformed)
+        if isinstance(raw_options, dict):
+            raw_options = list(raw_options.values())
+        elif not isinstance(raw_options, list):
+            # Reconstruct from str fields, dropping every non-question key in the same pass
+            raw_options = []
+            for key, value in list(q.items()):
+                if key.lower() not in QUESTION_FIELD_KEYS:
+                    if isinstance(value, str):
+                        raw_options.append(key.strip())
+                        raw_options.append(value.strip())
+                    del q[key]
+
+        # Normalize options; only the first four distinct ones are kept
+        normalized = []
+        seen = set()
+        for opt in raw_options:
+            if not isinstance(opt, str):
+                continue
+            opt = opt.strip()
+            match = OPTION_LABEL_PATTERN.match(opt)
+            text = match.group(1).strip() if match else opt
+            if text not in seen:
+                seen.add(text)
+                normalized.append(text)
+                if len(normalized) == 4:
+                    break
+
+        while len(normalized) < 4:
+            normalized.append("(missing option)")
+
+        q["Options"] = [f"{label}. {text}" for label, text in zip("abcd", normalized)]
+        return q
+
+
+class IncrementalQuestionParser:
+    """
+    Pulls question objects out of a JSON reply as it is streamed.
+
+    Tracks string/escape state and the stack of open braces across chunks; whenever
+    an object closes, it is decoded and returned if it looks like a question
+    (has a "Question" key). Enclosing objects such as {"Quiz": ...} never qualify.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._open = []
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> list:
+        """Consume the next chunk and return the question dicts it completed."""
+        self._text += chunk
+        text = self._text
+        completed = []
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._open.append(i)
+            elif ch == "}" and self._open:
+                question = self._decode_question(text[self._open.pop():i + 1])
+                if question is not None:
+                    completed.append(question)
+        self._pos = len(text)
+        return completed
+
+    @staticmethod
+    def _decode_question(fragment: str):
+        obj = _loads_fragment(fragment)
+        if isinstance(obj, dict) and isinstance(obj.get("Question"), str):
+            return obj
+        return None
+
+
+# Point the Groq client at the local fake server (see quiz/backend/dev/fake_backends.py)
+GROQ_CLIENT_PARAMS = {"base_url": FAKE_BACKEND_URL, "api_key": "fake"} if FAKE_BACKEND_URL else {}
+
+
+def build_english_quiz_agent(model_id: str, system_message: Optional[str] = None) -> Agent:
     agent = Agent(
-        model=Groq(id=model_id),
-        markdown=True
+        model=Groq(id=model_id, **GROQ_CLIENT_PARAMS),
+        system_message=system_message,
+        **QUIZ_AGENT_PARAMS
     )
     return agent
 
 
+def agent_cache_params(system_message: Optional[str] = None) -> dict:
+    """Response-cache parameters for a call; the system prefix is part of the key."""
+    params = QUIZ_AGENT_PARAMS if system_message is None else {**QUIZ_AGENT_PARAMS, "system_message": system_message}
+    # Fake-server replies must never be served for real calls, or the other way round
+    return {**params, "base_url": FAKE_BACKEND_URL} if FAKE_BACKEND_URL else params
+
+
+def response_token_counts(response):
+    """(prompt, completion) tokens reported for an agent run; 0 where unknown."""
+    metrics = getattr(response, "metrics", None) or {}
+    return tuple(sum(metrics.get(key) or []) for key in ("input_tokens", "output_tokens"))
+
+
+def response_token_usage(response):
+    """Total prompt + completion tokens reported for an agent run, or None if unknown."""
+    return sum(response_token_counts(response)) or None
+
+
+def has_questions(quiz) -> bool:
+    """True for a parsed quiz with at least one question, the bar for anything we cache."""
+    return isinstance(quiz, dict) and bool(quiz.get("Questions"))
+
+
+def is_cacheable_reply(reply_text: str) -> bool:
+    """Only replies that parse into at least one question are worth replaying from the cache."""
+    try:
+        return has_questions(QuizParser().parse(reply_text))
+    except Exception:
+        return False
+
+
+def store_reply(cache, prompt: str, reply_text: Optional[str], params: dict):
+    """Cache a fresh reply unless it is empty or malformed, so a bad reply is not replayed on later runs."""
+    if reply_text is None or not cache.enabled:
+        return
+    if not is_cacheable_reply(reply_text):
+        log_and_print("⚠️ Reply has no parseable questions; not caching it.")
+        return
+    cache.put(QUIZ_MODEL_ID, prompt, reply_text, params)
+
+
+def run_quiz_agent(prompt: str, bypass_cache: bool = False, system_message: Optional[str] = None):
+    """
+    Run the quiz model on a prompt and return the raw reply text (or None).
+    `system_message`, when given, is sent as the system prompt ahead of `prompt`.
+    Replies are served from / stored in the LLM response cache when it is enabled
+    (only those that parse into a non-empty quiz are stored);
+    live calls are paced by the shared Groq rate limiter and retried on 429/5xx.
+    """
+    cache = get_llm_cache()
+    params = agent_cache_params(system_message)
+    if not bypass_cache:
+        cached = cache.get(QUIZ_MODEL_ID, prompt, params)
+        if cached is not None:
+            return cached
+
+    agent = build_english_quiz_agent(QUIZ_MODEL_ID, system_message)
+    limiter = get_groq_rate_limiter()
+    billed_text = (system_message or "") + prompt
+
+    def invoke():
+        with groq_slots.slot():
+            return agent.run(prompt)
+
+    response = limiter.call(invoke, billed_text)
+    limiter.record_usage(limiter.estimate(billed_text), response_token_usage(response))
+    record_tokens(*response_token_counts(response))
+    store_reply(cache, prompt, response.content, params)
+    return response.content
+
+
+def record_stream_usage(billed_text: str, response, streamed_text: str):
+    """
+    Report a streamed call's tokens to the rate limiter and metrics: the provider's
+    counts when the stream completed, or estimates from the text received when the
+    stream was cancelled before the provider sent its usage.
+    """
+    limiter = get_groq_rate_limiter()
+    counts = response_token_counts(response) if response is not None else (0, 0)
+    if not any(counts):
+        counts = (estimate_tokens(billed_text), estimate_tokens(streamed_text))
+    limiter.record_usage(limiter.estimate(billed_text), sum(counts))
+    record_tokens(*counts)
+
+
+def stream_questions(prompt: str, system_message: Optional[str] = None):
+    """
+    Run the quiz model with streaming and yield each normalized question dict as soon
+    as its closing brace arrives. Closing the generator abandons the completion.
+    Provider failures surface as ModelProviderError so the rate limiter can retry them.
+    """
+    agent = build_english_quiz_agent(QUIZ_MODEL_ID, system_message)
+    parser = IncrementalQuestionParser()
+    normalizer = QuizParser()
+    streamed = []
+    try:
+        for event in agent.run(prompt, stream=True):
+            if event.event == RunEvent.run_error:
+                # agno turns a provider error it caught into an event; raise it as one again
+                raise ModelProviderError(f"Streaming quiz generation failed: {event.content}", model_id=QUIZ_MODEL_ID)
+            if event.event != RunEvent.run_response_content or not isinstance(event.content, str):
+                continue
+            streamed.append(event.content)
+            for question in parser.feed(event.content):
+                yield normalizer.normalize_question(question)
+    except GeneratorExit:
+        record_stream_usage((system_message or "") + prompt, None, "".join(streamed))
+        raise
+    record_stream_usage((system_message or "") + prompt, agent.run_response, "".join(streamed))
+
+
+def collect_streamed_mcqs(prompt: str, enough_valid: int, system_message: Optional[str] = None) -> list:
+    """
+    Stream an MCQ reply, checking every question as it arrives, and cancel the stream
+    once `enough_valid` MCQs with a valid multi-letter answer have been received.
+    Returns every question received (valid or not).
+    """
+    received = []
+    valid_count = 0
+    with groq_slots.slot():
+        stream = stream_questions(prompt, system_message)
+        try:
+            for question in stream:
+                received.append(question)
+                answer = str(question.get("Right_Option", "")).replace(" ", "").lower()
+                if is_valid_mcq_option(answer):
+                    valid_count += 1
+                if valid_count >= enough_valid:
+                    log_and_print("⏹️ %d valid MCQs received after %d question(s); cancelling stream.", valid_count, len(received))
+                    break
+        finally:
+            stream.close()
+    return received
+
+
 def get_example_block(question_type: str) -> str:
     if question_type.upper() == "SCQ":
         return '''\
@@ -157,7 +507,19 @@ def get_example_block(question_type: str) -> str:
         raise ValueError(f"Unsupported question_type: {question_type}")
 
 
-def build_prompt(chapter_text: str, count: int, question_type: str) -> str:
+class QuizPrompt(NamedTuple):
+    """A prompt split into a static system prefix and the call-specific user message."""
+    system: str
+    user: str
+
+
+@lru_cache(maxsize=None)
+def build_system_prompt(question_type: str) -> str:
+    """
+    Instructions, rules and examples for one question type. Contains nothing
+    chapter- or count-specific, so it is byte-identical across calls and can be
+    served from the provider's prompt-prefix cache.
+    """
     type_label = "Single Choice Questions (SCQ)" if question_type == "SCQ" else "Multiple Choice Questions (MCQ)"
     variation_clause = """Vary correct option combinations. Use examples like "bc", "cd", "bd", "ac". Do not always include "a".""" \
         if question_type == "MCQ" else """Avoid repeating the same option (like "a") in all correct answers — aim for balanced and varied use of "a", "b", "c", and "d" throughout."""
@@ -187,7 +549,7 @@ def build_prompt(chapter_text: str, count: int, question_type: str) -> str:
         You are an expert quiz generator. Based on the following passage, generate a quiz in valid JSON format.
 
         == QUIZ STRUCTURE ==
-        - The quiz must contain exactly {count} {type_label}. Do not generate more.
+        - The quiz must contain exactly the number of {type_label} requested with the passage. Do not generate more.
         - Every question must test a unique concept and be based solely on the passage.
 
         == QUESTION FORMAT ==
@@ -234,80 +596,248 @@ def build_prompt(chapter_text: str, count: int, question_type: str) -> str:
         {mcq_option_clause}
 
         {get_example_block(question_type)}
+        """
+
+
+def build_user_prompt(chapter_text: str, count: int, question_type: str) -> str:
+    """The chapter-specific part of a generation prompt; always sent last."""
+    type_label = "Single Choice Questions (SCQ)" if question_type == "SCQ" else "Multiple Choice Questions (MCQ)"
+    return f"""
+        Generate exactly {count} {type_label} for this passage.
+
+        Here is the story:
+        \"\"\"
+        {chapter_text}
+        \"\"\"
+        """
+
+
+def build_quiz_prompt(chapter_text: str, count: int, question_type: str) -> QuizPrompt:
+    return QuizPrompt(
+        system=build_system_prompt(question_type),
+        user=build_user_prompt(chapter_text, count, question_type),
+    )
+
+
+def build_prompt(chapter_text: str, count: int, question_type: str) -> str:
+    """Single-message form of build_quiz_prompt (system prefix followed by the user part)."""
+    prompt = build_quiz_prompt(chapter_text, count, question_type)
+    return prompt.system + prompt.user
+
+
+def prompt_token_report(prompt: QuizPrompt) -> dict:
+    """Estimated input tokens per prompt section."""
+    system_tokens = estimate_tokens(prompt.system)
+    user_tokens = estimate_tokens(prompt.user)
+    return {"system": system_tokens, "user": user_tokens, "total": system_tokens + user_tokens}
+
+
+def log_prompt_tokens(label: str, prompt: QuizPrompt) -> dict:
+    report = prompt_token_report(prompt)
+    log_and_print(f"🧮 {label} prompt tokens (est.): system {report['system']}, user {report['user']}, total {report['total']}")
+    return report
+
+
+MCQ_REPAIR_SYSTEM_PROMPT = """
+        You write additional Multiple Choice Questions (MCQ) for a quiz as valid JSON:
+        {"Quiz": {"Topic": "...", "Questions": [ ... ]}}
+
+        Each question has "Question", "Question_type": "MCQ", "Options" (exactly four: "a. ...", "b. ...", "c. ...", "d. ..."),
+        "Right_Option" (2–4 unique lowercase letters matching `^[a-d]{2,4}$`, e.g. "bc" — **never** a single letter),
+        "Number_Of_Points_Earned": "15" and "Timer" (one of 10, 15, 20, 25, 30).
+        Every question must be clearly answerable from the passage. Never repeat or rephrase a listed question.
+        Output only plain JSON.
+        """
+
+
+def build_mcq_repair_prompt(chapter_text: str, count: int, used_stems: list) -> QuizPrompt:
+    """
+    Compact follow-up asking for `count` more MCQs. Leaves out the examples and the
+    long rule list of build_system_prompt, and lists the stems already in use.
+    """
+    used = "\n".join(f"        - {stem}" for stem in used_stems) or "        - (none)"
+    user = f"""
+        Write exactly {count} more MCQs. Questions already in the quiz:
+{used}
 
         Here is the story:
         \"\"\"
         {chapter_text}
         \"\"\"
         """
+    return QuizPrompt(system=MCQ_REPAIR_SYSTEM_PROMPT, user=user)
+
+
+# Hash of the prompt wording (chapter and counts left out); recorded in the batch run manifest
+# so a prompt change regenerates chapters that are otherwise unchanged
+PROMPT_VERSION = hashlib.sha256("\0".join((
+    build_system_prompt("SCQ"),
+    build_system_prompt("MCQ"),
+    build_user_prompt("", 0, "SCQ"),
+    build_user_prompt("", 0, "MCQ"),
+    MCQ_REPAIR_SYSTEM_PROMPT,
+)).encode("utf-8")).hexdigest()[:12]
+
 
 def is_valid_mcq_option(opt: str) -> bool:
     return bool(re.fullmatch(r"[a-d]{2,4}", opt))
 
 
+def is_valid_mcq(q: dict) -> bool:
+    return len(str(q.get("Right_Option", "")).replace(" ", "")) > 1
+
+
 def validate_mcqs(mcq_questions: list, min_valid: int) -> bool:
-    valid_count = sum(1 for q in mcq_questions if len(q["Right_Option"].replace(" ", "")) > 1)
+    valid_count = sum(1 for q in mcq_questions if is_valid_mcq(q))
     log_and_print(f"✅ Valid MCQs: {valid_count}/{len(mcq_questions)}")
     return valid_count >= min_valid
 
 
-def run_scq_only(chapter_text: str, num_scq: int):
-    scq_agent = build_english_quiz_agent("openai/gpt-oss-120b")
+def run_scq_only(chapter_text: str, num_scq: int, bypass_cache: bool = False):
     parser = QuizParser()
-    scq_prompt = build_prompt(chapter_text, num_scq, "SCQ")
-    log_and_print(f"🔍 Running SCQ generation with prompt:\n{scq_prompt}\n")
-    r_scq = scq_agent.run(scq_prompt)
-    log_and_print(f"🔍 SCQ Response:\n{r_scq.content}")  # print first 1000 characters for debugging
-    if r_scq.content is None:
+    scq_prompt = build_quiz_prompt(chapter_text, num_scq, "SCQ")
+    log_and_print("🔍 Running SCQ generation for %d questions.", num_scq)
+    log_artifact("SCQ prompt", scq_prompt.user)
+    log_prompt_tokens("SCQ", scq_prompt)
+    with span("scq_call", questions=num_scq):
+        scq_content = run_quiz_agent(scq_prompt.user, bypass_cache=bypass_cache, system_message=scq_prompt.system)
+    log_artifact("SCQ response", scq_content)
+    if scq_content is None:
         raise ValueError("SCQ agent returned no content.")
-    return parser.run(r_scq.content)
+    return parser.run(scq_content)
 
 
-def run_mcq_with_retries(chapter_text: str, num_mcq: int, max_retries: int = 1):
-    mcq_agent = build_english_quiz_agent("openai/gpt-oss-120b")
-    mcq_prompt = build_prompt(chapter_text, num_mcq, "MCQ")  # Over-generate
-    log_and_print(f"🔍 Running MCQ generation with prompt:\n{mcq_prompt}\n")
+def evaluate_mcq_reply(mcq_content, attempt: int, min_valid: int):
+    """
+    Parse one MCQ reply and check it against the minimum number of valid MCQs.
+    Returns (mcq_data, has_enough_valid).
+    """
+    parser = QuizParser()
+    if mcq_content is None:
+        raise ValueError("MCQ agent returned no content.")
+
+    mcq_data = parser.run(mcq_content)
+    log_debug("MCQ Data for attempt %s: %s", attempt, mcq_data)
+
+    if not mcq_data or not isinstance(mcq_data, dict):
+        log_and_print("🔎 Raw model output:")
+        log_and_print(mcq_content[:1000])  # print first 1000 characters
+        raise ValueError("MCQ parsing failed — got invalid format.")
+
+    if not mcq_data or not (isinstance(mcq_data, dict) and "Questions" in mcq_data):
+        log_and_print("❌ No questions found in MCQ response. Retrying...\n")
+        return mcq_data, False
+
+    mcq_questions = mcq_data.get("Questions", [])
+    if validate_mcqs(mcq_questions, min_valid):
+        log_and_print("✅ Enough valid MCQs found.")
+        log_and_print(f"🔍 Total MCQs generated: {len(mcq_questions)}, for min_valid: {min_valid}")
+        return mcq_data, True
+
+    log_and_print("❌ Not enough valid MCQs. Retrying...\n")
+    return mcq_data, False
+
+
+def plan_mcq_repair(mcq_data: dict, min_valid: int):
+    """Return (valid MCQs to keep, number of valid MCQs still missing)."""
+    valid = [q for q in (mcq_data or {}).get("Questions", []) if is_valid_mcq(q)]
+    return valid, max(min_valid - len(valid), 0)
+
+
+def merge_mcq_repair(valid_mcqs: list, repair_content) -> dict:
+    """Append the valid MCQs of a repair reply that do not repeat a kept question."""
+    if repair_content is None:
+        raise ValueError("MCQ repair agent returned no content.")
+    repaired = [q for q in QuizParser().run(repair_content)["Questions"] if is_valid_mcq(q)]
+    fresh = dedupe_question_pool(repaired, index=build_index(valid_mcqs))
+    log_and_print(f"🩹 Repair added {len(fresh)} new valid MCQs ({len(repaired)} valid in reply).")
+    return {"Questions": valid_mcqs + fresh}
+
+
+def repair_mcqs(chapter_text: str, mcq_data: dict, min_valid: int, bypass_cache: bool = False) -> dict:
+    """Keep the valid MCQs and ask the model for only the missing ones."""
+    valid, missing = plan_mcq_repair(mcq_data, min_valid)
+    log_and_print(f"🩹 Keeping {len(valid)} valid MCQs, requesting {missing} more.")
+    repair_prompt = build_mcq_repair_prompt(chapter_text, missing, [q["Question"] for q in valid])
+    log_prompt_tokens("MCQ repair", repair_prompt)
+    with span("mcq_repair", questions=missing):
+        record_retry("mcq_repair")
+        repair_content = run_quiz_agent(repair_prompt.user, bypass_cache=bypass_cache, system_message=repair_prompt.system)
+    log_artifact("MCQ repair response", repair_content)
+    return merge_mcq_repair(valid, repair_content)
+
+
+def run_mcq_with_retries(chapter_text: str, num_mcq: int, max_repairs: int = MCQ_REPAIR_PASSES, bypass_cache: bool = False):
+    """
+    Generate MCQs once with the full prompt; if too few are valid, run up to
+    `max_repairs` compact repair passes instead of regenerating the whole set.
+    """
+    mcq_prompt = build_quiz_prompt(chapter_text, num_mcq, "MCQ")  # Over-generate
+    log_and_print("🔍 Running MCQ generation for %d questions.", num_mcq)
+    log_artifact("MCQ prompt", mcq_prompt.user)
+    log_prompt_tokens("MCQ", mcq_prompt)
 
     min_valid = max(1, num_mcq // 2)  # At least half (rounded down), but at least 1
     log_and_print(f"🔍 Minimum valid MCQs required: {min_valid}")
 
-    for attempt in range(max_retries):
-        print(f"Running MCQ generation (Attempt {attempt + 1}/{max_retries})...")
-        r_mcq = mcq_agent.run(mcq_prompt)
-        parser = QuizParser()
-        if r_mcq.content is None:
-            raise ValueError("MCQ agent returned no content.")
-        
-        mcq_data = parser.run(r_mcq.content)
-        log_and_print(f"MCQ Data for attempt {attempt}: {mcq_data}")
-
-        if not mcq_data or not isinstance(mcq_data, dict):
-            log_and_print("🔎 Raw model output:")
-            log_and_print(r_mcq.content[:1000])  # print first 1000 characters
-            raise ValueError("MCQ parsing failed — got invalid format.")
-
-        if not mcq_data or not (isinstance(mcq_data, dict) and "Questions" in mcq_data):
-            log_and_print("❌ No questions found in MCQ response. Retrying...\n")
-            continue
+    with span("mcq_call", questions=num_mcq):
+        mcq_content = run_quiz_agent(mcq_prompt.user, bypass_cache=bypass_cache, system_message=mcq_prompt.system)
+    log_artifact("MCQ response", mcq_content)
+    mcq_data, has_enough = evaluate_mcq_reply(mcq_content, 0, min_valid)
 
-        mcq_questions = mcq_data.get("Questions", [])
-        if validate_mcqs(mcq_questions, min_valid):
-            log_and_print("✅ Enough valid MCQs found.")
-            log_and_print(f"🔍 Total MCQs generated: {len(mcq_questions)}, for min_valid: {min_valid}")
+    for attempt in range(max_repairs):
+        if has_enough:
             return mcq_data
-        else:
-            log_and_print("❌ Not enough valid MCQs. Retrying...\n")
+        print(f"Running MCQ repair (Pass {attempt + 1}/{max_repairs})...")
+        mcq_data = repair_mcqs(chapter_text, mcq_data, min_valid, bypass_cache=bypass_cache)
+        has_enough = validate_mcqs(mcq_data["Questions"], min_valid)
 
-    log_and_print("⚠️ Max retries reached. Returning last MCQ version.")
+    if not has_enough:
+        log_and_print("⚠️ Max repairs reached. Returning last MCQ version.")
+    return mcq_data
+
+
+def run_mcq_streaming(chapter_text: str, num_mcq: int, enough_valid: int, max_repairs: int = MCQ_REPAIR_PASSES):
+    """
+    Streaming counterpart of run_mcq_with_retries that stops generating once
+    `enough_valid` valid MCQs exist. Streamed replies bypass the response cache,
+    since an early-stopped reply is partial.
+    """
+    mcq_prompt = build_quiz_prompt(chapter_text, num_mcq, "MCQ")
+    log_and_print("🔍 Running streaming MCQ generation for %d questions.", num_mcq)
+    log_artifact("MCQ prompt", mcq_prompt.user)
+    log_prompt_tokens("MCQ", mcq_prompt)
+
+    min_valid = min(max(1, num_mcq // 2), enough_valid)
+    limiter = get_groq_rate_limiter()
+
+    with span("mcq_stream", questions=num_mcq):
+        questions = limiter.call(
+            lambda: collect_streamed_mcqs(mcq_prompt.user, enough_valid, mcq_prompt.system),
+            mcq_prompt.system + mcq_prompt.user,
+        )
+    mcq_data = {"Questions": questions}
+    log_debug("MCQ Data for attempt 0: %s", mcq_data)
+    has_enough = validate_mcqs(questions, min_valid)
+
+    for attempt in range(max_repairs):
+        if has_enough:
+            return mcq_data
+        print(f"Running MCQ repair (Pass {attempt + 1}/{max_repairs})...")
+        mcq_data = repair_mcqs(chapter_text, mcq_data, min_valid)
+        has_enough = validate_mcqs(mcq_data["Questions"], min_valid)
+
+    if not has_enough:
+        log_and_print("⚠️ Max repairs reached. Returning last MCQ version.")
     return mcq_data
 
 
 def get_valid_mcqs(mcq_questions, num_mcq):
-    log_and_print(f"🔍 Filtering MCQs for MCQ Questions: {mcq_questions}.")
+    log_debug("🔍 Filtering MCQs for MCQ Questions: %s.", mcq_questions)
     log_and_print(f"🔍 Total MCQs found: {len(mcq_questions)}. Required: {num_mcq}.")
 
     return [
-        q for q in mcq_questions if len(q["Right_Option"].replace(" ", "")) > 1
+        q for q in mcq_questions if is_valid_mcq(q)
     ][:num_mcq]
 
 
@@ -316,45 +846,152 @@ def is_similar(q1, q2, threshold=0.85):
     return seq.ratio() >= threshold
 
 
-def normalize_text(text):
-    text = text.lower()
-    text = re.sub(r'[^a-z0-9\s]', '', text)
-    text = ' '.join(text.split())
-    return text
-
-
-def deduplicate_questions(scq_list, mcq_list, threshold=0.85):
-    filtered_mcq = []
-    for mcq_q in mcq_list:
-        mcq_text = normalize_text(mcq_q['Question'])
-        if not any(is_similar(mcq_text, normalize_text(scq_q['Question']), threshold) for scq_q in scq_list):
-            filtered_mcq.append(mcq_q)
+def deduplicate_questions(scq_list, mcq_list, threshold=0.85, existing_questions=None):
+    """
+    Drop MCQs that near-duplicate an SCQ, an earlier MCQ, or a question in
+    `existing_questions` (question dicts or plain strings from an existing bank).
+    """
+    index = build_index(list(existing_questions or []) + list(scq_list), threshold)
+    filtered_mcq = dedupe_question_pool(mcq_list, threshold, index=index)
     
-    log_and_print(f"🔍 Filtered MCQs: {filtered_mcq}")
+    log_debug("🔍 Filtered MCQs: %s", filtered_mcq)
     log_and_print(f"🔍 Deduplicated MCQs: {len(filtered_mcq)} out of {len(mcq_list)}")
     
     return filtered_mcq
 
 
-def run_parallel_quiz_with_mcq_retry(chapter_text: str, num_questions: int):
+def streamed_mcq_target(num_questions: int) -> int:
+    """Valid MCQs to wait for before cancelling a streamed reply: the merge's MCQ share plus a surplus."""
+    return num_questions // 2 + STREAM_MCQ_SURPLUS
+
+
+def run_mcqs(chapter_text: str, num_questions: int, bypass_cache: bool = False):
+    """MCQ generation in the configured mode (streamed with early stop, or whole reply with repair)."""
+    if STREAMING_ENABLED:
+        return run_mcq_streaming(chapter_text, num_questions, streamed_mcq_target(num_questions))
+    return run_mcq_with_retries(chapter_text, num_questions, bypass_cache=bypass_cache)
+
+
+def should_chunk(chapter_text: str) -> bool:
+    """Long chapters are always chunked; with incremental regeneration on, every chapter is."""
+    if get_chunk_store().enabled:
+        return True
+    return bool(CHUNK_ABOVE_CHARS) and len(chapter_text) > CHUNK_ABOVE_CHARS
+
+
+def plan_chunks(chapter_text: str, num_questions: int):
+    """
+    Split a chapter into paragraph chunks and give each a question quota by length.
+    Returns (chunks, quotas), keeping only chunks with a non-zero quota.
+    """
+    chunks = split_into_chunks(chapter_text, CHUNK_CHARS)
+    quotas = allocate_quotas([len(c) for c in chunks], num_questions)
+    planned = [(chunk, quota) for chunk, quota in zip(chunks, quotas) if quota > 0]
+    log_and_print(f"🧩 Chunked chapter of {len(chapter_text)} chars into {len(chunks)} chunks; quotas: {quotas}")
+    return [c for c, _ in planned], [q for _, q in planned]
+
+
+def chunk_store_key(chunk: str) -> str:
+    """Content hash of a chunk plus everything else that shapes its questions (model and prompts)."""
+    prompts = {"SCQ": build_system_prompt("SCQ"), "MCQ": build_system_prompt("MCQ")}
+    return make_cache_key(QUIZ_MODEL_ID, chunk, prompts)
+
+
+def load_stored_chunks(chunks: list, quotas: list, bypass_cache: bool = False) -> list:
+    """Stored entry per chunk from an earlier run, or None where the chunk must be generated."""
+    store = get_chunk_store()
+    if bypass_cache or not store.enabled:
+        return [None] * len(chunks)
+    stored = [store.get(chunk_store_key(chunk), quota) for chunk, quota in zip(chunks, quotas)]
+    # Entries saved from a failed reply before results were checked are regenerated
+    stored = [entry if entry and has_questions(entry["scq"]) and has_questions(entry["mcq"]) else None for entry in stored]
+    reused = sum(entry is not None for entry in stored)
+    log_and_print(f"♻️ Reusing questions for {reused}/{len(chunks)} unchanged chunks.")
+    return stored
+
+
+def collect_chunk_results(chunks: list, quotas: list, stored: list, fresh_scq: dict, fresh_mcq: dict):
+    """
+    Combine stored and freshly generated per-chunk results (fresh ones keyed by chunk
+    index) into ordered SCQ and MCQ lists, saving the fresh ones for the next run.
+    A chunk is saved only when both its SCQ and MCQ sets have questions, so one
+    failed reply is regenerated next time instead of replaying an empty set.
+    """
+    store = get_chunk_store()
+    scq_results, mcq_results = [], []
+    for i, (chunk, quota) in enumerate(zip(chunks, quotas)):
+        if stored[i] is not None:
+            scq_results.append(stored[i]["scq"])
+            mcq_results.append(stored[i]["mcq"])
+            continue
+        scq_results.append(fresh_scq[i])
+        mcq_results.append(fresh_mcq[i])
+        if has_questions(fresh_scq[i]) and has_questions(fresh_mcq[i]):
+            store.put(chunk_store_key(chunk), quota, fresh_scq[i], fresh_mcq[i])
+        else:
+            log_and_print(f"⚠️ Chunk {i + 1}/{len(chunks)} came back without questions; not storing it.")
+    return scq_results, mcq_results
+
+
+def reduce_chunk_results(scq_results: list, mcq_results: list, quotas: list, num_questions: int) -> dict:
+    """Interleave per-chunk SCQ/MCQ sets by quota and run them through the usual dedupe/select merge."""
+    scq_data = {"Questions": interleave_by_quota([r.get("Questions", []) for r in scq_results], quotas)}
+    mcq_data = {"Questions": interleave_by_quota([(r or {}).get("Questions", []) for r in mcq_results], quotas)}
+    return merge_quiz_results(scq_data, mcq_data, num_questions)
+
+
+def run_chunked_quiz(chapter_text: str, num_questions: int, bypass_cache: bool = False) -> dict:
+    """
+    Map-reduce generation for long chapters: SCQ and MCQ sets for every chunk run in
+    parallel (bounded by the Groq concurrency cap), then are reduced into one quiz.
+    Chunks unchanged since an earlier run reuse their stored questions.
+    """
+    chunks, quotas = plan_chunks(chapter_text, num_questions)
+    stored = load_stored_chunks(chunks, quotas, bypass_cache=bypass_cache)
+    pending = [i for i, entry in enumerate(stored) if entry is None]
+    with ThreadPoolExecutor() as executor:
+        f_scqs = {i: submit_in_context(executor, run_scq_only, chunks[i], quotas[i], bypass_cache=bypass_cache) for i in pending}
+        f_mcqs = {i: submit_in_context(executor, run_mcqs, chunks[i], quotas[i], bypass_cache=bypass_cache) for i in pending}
+        fresh_scq = {i: f.result() for i, f in f_scqs.items()}
+        fresh_mcq = {i: f.result() for i, f in f_mcqs.items()}
+
+    scq_results, mcq_results = collect_chunk_results(chunks, quotas, stored, fresh_scq, fresh_mcq)
+    return reduce_chunk_results(scq_results, mcq_results, quotas, num_questions)
+
+
+def run_parallel_quiz_with_mcq_retry(chapter_text: str, num_questions: int, bypass_cache: bool = False):
+    if should_chunk(chapter_text):
+        return run_chunked_quiz(chapter_text, num_questions, bypass_cache=bypass_cache)
+
     with ThreadPoolExecutor() as executor:
-        f_scq = executor.submit(run_scq_only, chapter_text, num_questions)
-        f_mcq = executor.submit(run_mcq_with_retries, chapter_text, num_questions)
+        f_scq = submit_in_context(executor, run_scq_only, chapter_text, num_questions, bypass_cache=bypass_cache)
+        f_mcq = submit_in_context(executor, run_mcqs, chapter_text, num_questions, bypass_cache=bypass_cache)
 
         scq_data = f_scq.result()
         mcq_data = f_mcq.result()
 
+    return merge_quiz_results(scq_data, mcq_data, num_questions)
+
+
+def merge_quiz_results(scq_data: dict, mcq_data: dict, num_questions: int, existing_questions=None) -> dict:
+    """
+    Combine parsed SCQ and MCQ replies into the final quiz: split the count between
+    SCQs and valid, deduplicated MCQs, top up with extra SCQs, and append backups.
+    Near-duplicates of `existing_questions` (an existing bank) are never selected.
+    """
     # Logic to split SCQ and MCQ into half
     half = num_questions // 2
     num_scq_to_pick = half + (num_questions % 2)  # SCQ gets the extra if odd
     num_mcq_to_pick = half
 
-    scq_questions = scq_data.get("Questions", [])[:num_scq_to_pick]
+    # Near-duplicate SCQs (within the reply or against the bank) are dropped up front
+    scq_pool = dedupe_question_pool(scq_data.get("Questions", []), index=build_index(existing_questions or []))
+    scq_questions = scq_pool[:num_scq_to_pick]
 
     valid_mcq_questions = get_valid_mcqs(mcq_data.get("Questions", []), num_questions)
     log_and_print(f"🔍 Valid MCQs found: {len(valid_mcq_questions)} out of {len(mcq_data.get('Questions', []))}")
 
-    deduplicated_questions = deduplicate_questions(scq_questions, valid_mcq_questions)
+    deduplicated_questions = deduplicate_questions(scq_questions, valid_mcq_questions, existing_questions=existing_questions)
     log_and_print(f"🔍 Deduplicated Questions: {len(deduplicated_questions)} out of {len(valid_mcq_questions)}")
 
     mcq_questions = deduplicated_questions[:num_mcq_to_pick]
@@ -373,7 +1010,7 @@ def run_parallel_quiz_with_mcq_retry(chapter_text: str, num_questions: int):
 
         selected_q_texts = {normalize_text(q['Question']) for q in scq_questions + mcq_questions}
         extra_scqs = []
-        for q in scq_data.get("Questions", []):
+        for q in scq_pool:
             norm_q = normalize_text(q['Question'])
             if norm_q not in selected_q_texts:
                 extra_scqs.append(q)
@@ -392,7 +1029,7 @@ def run_parallel_quiz_with_mcq_retry(chapter_text: str, num_questions: int):
     # ✅ Add up to 5 non-duplicate SCQs as backup
     used_question_texts = {normalize_text(q['Question']) for q in all_questions}
     backup_scqs = []
-    for q in scq_data.get("Questions", []):
+    for q in scq_pool:
         norm_q = normalize_text(q['Question'])
         if norm_q not in used_question_texts:
             backup_scqs.append(q)
@@ -0,0 +1,150 @@
+# backend/job_worker.py
+# -*- coding: utf-8 -*-
+"""
+Background workers for the durable job queue (quiz/backend/utils/job_queue.py).
+
+    python -m quiz.backend.job_worker --workers 2
+
+Each worker process claims queued jobs, runs them and records progress lines and the
+result in the queue, renewing its lease while the job runs. The app starts a pool of
+these when `jobs.enabled` is set; they can also run on their own, e.g. next to the CLI.
+"""
+
+import os
+import time
+import socket
+import argparse
+import threading
+import multiprocessing
+from typing import List, Optional
+from quiz.backend.config import app_config, WORKER_INDEX_ENV
+from quiz.backend.gurukula_quizgen import run_gdoc_to_spreadsheet_workflow
+from quiz.backend.utils.job_queue import GDOC_TO_SPREADSHEET, get_job_queue
+from quiz.backend.utils.metrics import job_context
+from quiz.backend.utils.logging_utils import log_and_print
+
+JOBS_CONFIG = app_config.get("jobs", {})
+JOB_WORKERS = JOBS_CONFIG.get("workers", 2)
+JOB_POLL_SECONDS = JOBS_CONFIG.get("poll_seconds", 1.0)
+
+
+def run_gdoc_job(payload: dict, on_stage):
+    return run_gdoc_to_spreadsheet_workflow(
+        input_doc_link=payload["input_doc_link"],
+        output_spreadsheet_link=payload["output_spreadsheet_link"],
+        num_questions=payload.get("num_questions", 15),
+        on_stage=on_stage,
+    )
+
+
+# Job kind -> handler(payload, on_stage(stage, message)) returning a JSON-serialisable result
+JOB_HANDLERS = {
+    GDOC_TO_SPREADSHEET: run_gdoc_job,
+}
+
+
+def run_job(job: dict, worker_id: str):
+    """Run one claimed job, keeping its lease alive until it finishes."""
+    queue = get_job_queue()
+    job_id = job["id"]
+    done = threading.Event()
+
+    def keep_lease():
+        while not done.wait(queue.lease_seconds / 3):
+            if not queue.renew(job_id, worker_id):
+                log_and_print(f"⚠️ Lost the lease on job {job_id}; its result will not be recorded.")
+                return
+
+    threading.Thread(target=keep_lease, daemon=True).start()
+    try:
+        handler = JOB_HANDLERS.get(job["kind"])
+        if handler is None:
+            queue.fail(job_id, worker_id, f"Unknown job kind '{job['kind']}'.", retryable=False)
+            return
+        log_and_print(f"🛠️ Worker {worker_id} running job {job_id} (attempt {job['attempts']}/{job['max_attempts']})", to_console=True)
+        with job_context(job_id=job_id):
+            try:
+                result = handler(job["payload"], lambda stage, message: queue.add_progress(job_id, worker_id, message.strip()))
+            except ValueError as e:
+                # Validation and access errors (bad links, unshared sheets) fail the same way every time
+                queue.fail(job_id, worker_id, str(e), retryable=False)
+                log_and_print(f"❌ Job {job_id} failed: {e}", to_console=True)
+                return
+            except Exception as e:
+                queue.fail(job_id, worker_id, f"{type(e).__name__}: {e}")
+                log_and_print(f"⚠️ Job {job_id} attempt {job['attempts']} failed: {e}", to_console=True)
+                return
+        queue.complete(job_id, worker_id, result)
+        log_and_print(f"✅ Job {job_id} succeeded", to_console=True)
+    finally:
+        done.set()
+
+
+def run_worker(index: int = 0, stop: Optional[threading.Event] = None, poll_seconds: float = JOB_POLL_SECONDS):
+    """Claim and run jobs one at a time until `stop` is set."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    queue = get_job_queue()
+    stop = stop or threading.Event()
+    log_and_print(f"🛠️ Job worker {worker_id} started", to_console=True)
+    try:
+        while not stop.is_set():
+            job = queue.claim(worker_id)
+            if job is None:
+                stop.wait(poll_seconds)
+                continue
+            run_job(job, worker_id)
+    except KeyboardInterrupt:
+        # A job cut short here is retried once its lease expires
+        pass
+
+
+# Guards the environment while a worker is being spawned
+_spawn_lock = threading.Lock()
+
+
+def start_worker(index: int) -> multiprocessing.Process:
+    """
+    Start one daemon worker process. It writes its own log and metrics files
+    (logs/pipeline.worker-<index>-<pid>.log, ...), see process_file_path.
+    """
+    # spawn: the parent may already be running threads (log listener, web server)
+    process = multiprocessing.get_context("spawn").Process(
+        target=run_worker, args=(index,), name=f"quiz-job-worker-{index}", daemon=True
+    )
+    # The log paths are fixed when the child imports the logging modules, before
+    # run_worker is called, so the index is handed over in its environment
+    with _spawn_lock:
+        os.environ[WORKER_INDEX_ENV] = str(index)
+        try:
+            process.start()
+        finally:
+            del os.environ[WORKER_INDEX_ENV]
+    return process
+
+
+def start_worker_pool(workers: int = JOB_WORKERS) -> List[multiprocessing.Process]:
+    """Start `workers` daemon worker processes and return them."""
+    return [start_worker(index) for index in range(workers)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background workers for queued quiz jobs")
+    parser.add_argument('--workers', type=int, default=JOB_WORKERS, help=f'Worker processes to run (default: {JOB_WORKERS})')
+    args = parser.parse_args()
+
+    processes = start_worker_pool(args.workers)
+    print(f"🛠️ {len(processes)} job worker(s) running; Ctrl+C to stop.")
+    try:
+        while True:
+            # Replace workers that died; their jobs are picked up again once the lease expires
+            for i, process in enumerate(processes):
+                if not process.is_alive():
+                    print(f"⚠️ Worker {i} exited with code {process.exitcode}; restarting it.")
+                    processes[i] = start_worker(i)
+            time.sleep(5)
+    except KeyboardInterrupt:
+        print("🛑 Stopping job workers.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# utils/chunk_store.py
+
+import os
+import json
+import time
+import threading
+from typing import Optional
+from quiz.backend.config import app_config, CACHE_DIR
+
+CHUNK_STORE_ENABLED = app_config.get("generation", {}).get("incremental", False)
+CHUNK_STORE_DIR = os.path.join(CACHE_DIR, "chunks")
+
+
+class ChunkQuestionStore:
+    """
+    Questions generated per chapter chunk, stored as one JSON file per chunk key.
+
+    The key is a content hash over the chunk text, the model and the prompts, so an
+    edited paragraph only invalidates the chunk it lives in; every untouched chunk
+    is served from here on the next regeneration.
+    """
+
+    def __init__(self, directory: str = CHUNK_STORE_DIR, enabled: bool = False):
+        self.directory = directory
+        self.enabled = enabled
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str, min_quota: int) -> Optional[dict]:
+        """Stored {"quota", "scq", "mcq"} for a chunk if it was generated for at least `min_quota` questions."""
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if entry.get("quota", 0) < min_quota:
+            return None
+        return entry
+
+    def put(self, key: str, quota: int, scq_data: dict, mcq_data: dict):
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entry = {
+            "quota": quota,
+            "scq": scq_data,
+            "mcq": mcq_data,
+            "created_at": time.time(),
+        }
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+_chunk_store = ChunkQuestionStore(enabled=CHUNK_STORE_ENABLED)
+
+
+def get_chunk_store() -> ChunkQuestionStore:
+    """Return the process-wide chunk question store."""
+    return _chunk_store
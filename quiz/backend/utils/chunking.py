@@ -0,0 +1,75 @@
+# utils/chunking.py
+
+import re
+import zlib
+from typing import List
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# Roughly one paragraph in ANCHOR_MODULUS may end a chunk early
+ANCHOR_MODULUS = 3
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Non-empty paragraphs of text (separated by blank lines, or by single newlines if there are none)."""
+    paragraphs = [p.strip() for p in _PARAGRAPH_BREAK.split(text) if p.strip()]
+    if len(paragraphs) <= 1:
+        paragraphs = [p.strip() for p in text.splitlines() if p.strip()]
+    return paragraphs
+
+
+def _is_anchor(paragraph: str) -> bool:
+    # Depends only on the paragraph itself, so boundaries resynchronise after an edit
+    return zlib.crc32(paragraph.encode("utf-8")) % ANCHOR_MODULUS == 0
+
+
+def split_into_chunks(text: str, max_chars: int) -> List[str]:
+    """
+    Group consecutive paragraphs into chunks of at most `max_chars` characters.
+    A paragraph is never split, so a single oversize paragraph becomes its own chunk.
+
+    Once a chunk is half full it also ends after any "anchor" paragraph (chosen by a
+    hash of the paragraph's text). Editing one paragraph then shifts chunk boundaries
+    only until the next anchor, so the remaining chunks keep their exact content.
+    """
+    chunks, current, size = [], [], 0
+    for paragraph in split_paragraphs(text):
+        if current and size + len(paragraph) > max_chars:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += len(paragraph) + 2
+        if size >= max_chars / 2 and _is_anchor(paragraph):
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def allocate_quotas(weights: List[int], total: int) -> List[int]:
+    """
+    Split `total` into integer quotas proportional to `weights` (largest remainder method).
+    Ties on the remainder favour earlier entries.
+    """
+    weight_sum = sum(weights)
+    if weight_sum <= 0 or total <= 0:
+        return [0] * len(weights)
+    exact = [total * w / weight_sum for w in weights]
+    quotas = [int(x) for x in exact]
+    by_remainder = sorted(range(len(weights)), key=lambda i: exact[i] - quotas[i], reverse=True)
+    for i in by_remainder[:total - sum(quotas)]:
+        quotas[i] += 1
+    return quotas
+
+
+def interleave_by_quota(per_chunk: List[list], quotas: List[int]) -> list:
+    """
+    Merge per-chunk lists so that any prefix of the result draws from each chunk in
+    proportion to its quota. Items keep their order within a chunk.
+    """
+    keyed = []
+    for chunk_idx, (items, quota) in enumerate(zip(per_chunk, quotas)):
+        for pos, item in enumerate(items):
+            keyed.append(((pos + 0.5) / max(quota, 1), chunk_idx, item))
+    keyed.sort(key=lambda entry: (entry[0], entry[1]))
+    return [item for _, _, item in keyed]
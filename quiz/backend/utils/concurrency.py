@@ -0,0 +1,106 @@
+# utils/concurrency.py
+
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List
+from quiz.backend.config import app_config
+
+CONCURRENCY_CONFIG = app_config.get("concurrency", {})
+
+# How often a coroutine re-checks for a free slot while the API is saturated
+ASYNC_SLOT_POLL_SECONDS = 0.05
+
+
+class ApiSlots:
+    """
+    Process-wide cap on concurrent calls to one external API.
+
+    Usable from plain threads (`slot()`) and from coroutines on any event loop (`aslot()`),
+    so thread-pool batch workers and asyncio generation share the same budget.
+    The limit can be changed at runtime; in-flight calls are not interrupted.
+    """
+
+    def __init__(self, name: str, limit: int):
+        if limit < 1:
+            raise ValueError(f"Concurrency limit for {name} must be at least 1.")
+        self.name = name
+        self.limit = limit
+        self.in_use = 0
+        self._cond = threading.Condition()
+
+    def set_limit(self, limit: int):
+        if limit < 1:
+            raise ValueError(f"Concurrency limit for {self.name} must be at least 1.")
+        with self._cond:
+            self.limit = limit
+            self._cond.notify_all()
+
+    def _try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_use < self.limit:
+                self.in_use += 1
+                return True
+            return False
+
+    def _release(self):
+        with self._cond:
+            self.in_use -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            while self.in_use >= self.limit:
+                self._cond.wait()
+            self.in_use += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        # Poll instead of parking a thread per waiter, so the event loop stays free
+        while not self._try_acquire():
+            await asyncio.sleep(ASYNC_SLOT_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            self._release()
+
+
+groq_slots = ApiSlots("groq", CONCURRENCY_CONFIG.get("groq", 8))
+google_slots = ApiSlots("google", CONCURRENCY_CONFIG.get("google", 4))
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """executor.submit that carries the caller's context variables (job ID, open span) into the worker."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def run_bounded(fn: Callable, items: Iterable, jobs: int = 1) -> List[dict]:
+    """
+    Run fn(item) for every item on a pool of `jobs` worker threads.
+    Failures are isolated per item.
+
+    Returns:
+        List in input order of dicts with "result", "error" (exception or None)
+        and "elapsed_seconds"
+    """
+    def timed(item):
+        started = time.perf_counter()
+        try:
+            return {"result": fn(item), "error": None, "elapsed_seconds": time.perf_counter() - started}
+        except Exception as e:
+            return {"result": None, "error": e, "elapsed_seconds": time.perf_counter() - started}
+
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        return [timed(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=min(jobs, len(items)), thread_name_prefix="quiz-batch") as executor:
+        return list(executor.map(timed, items))
@@ -0,0 +1,128 @@
+# utils/dedupe.py
+
+import re
+import difflib
+from collections import Counter
+from typing import Iterable, List, Optional, Union
+
+# Character n-gram size used to index questions
+SHINGLE_SIZE = 3
+# Minimum shingle Jaccard for a pair to be checked with SequenceMatcher. Kept well below
+# the similarity threshold because scattered edits break up to SHINGLE_SIZE shingles each.
+CANDIDATE_JACCARD = 0.3
+
+_NON_ALNUM = re.compile(r'[^a-z0-9\s]')
+
+
+def normalize_text(text):
+    text = text.lower()
+    text = _NON_ALNUM.sub('', text)
+    text = ' '.join(text.split())
+    return text
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> frozenset:
+    """Character n-grams of already-normalized text."""
+    if len(text) <= size:
+        return frozenset((text,))
+    return frozenset(text[i:i + size] for i in range(len(text) - size + 1))
+
+
+class QuestionIndex:
+    """
+    Near-duplicate index over question texts.
+
+    Each text is normalized and shingled once. A lookup only runs the (expensive)
+    SequenceMatcher ratio on entries whose shingle Jaccard passes CANDIDATE_JACCARD
+    and whose cheap ratio upper bounds can still reach the threshold.
+    """
+
+    def __init__(self, threshold: float = 0.85, candidate_jaccard: float = CANDIDATE_JACCARD):
+        self.threshold = threshold
+        self.candidate_jaccard = candidate_jaccard
+        self._texts: List[str] = []
+        self._shingles: List[frozenset] = []
+        self._postings = {}
+        self._exact = {}
+
+    def __len__(self):
+        return len(self._texts)
+
+    def _is_similar(self, a: str, b: str) -> bool:
+        # 2 * min / (la + lb) bounds the ratio from above; skip hopeless length pairs
+        la, lb = len(a), len(b)
+        if la + lb == 0:
+            return True
+        if 2.0 * min(la, lb) / (la + lb) < self.threshold:
+            return False
+        matcher = difflib.SequenceMatcher(None, a, b)
+        return (
+            matcher.real_quick_ratio() >= self.threshold
+            and matcher.quick_ratio() >= self.threshold
+            and matcher.ratio() >= self.threshold
+        )
+
+    def find_normalized(self, norm: str, grams: Optional[frozenset] = None) -> Optional[int]:
+        """Return the id of an indexed near-duplicate of normalized text, or None."""
+        if norm in self._exact:
+            return self._exact[norm]
+        grams = grams if grams is not None else shingles(norm)
+        overlaps = Counter()
+        for gram in grams:
+            for doc_id in self._postings.get(gram, ()):
+                overlaps[doc_id] += 1
+        for doc_id, inter in overlaps.items():
+            union = len(grams) + len(self._shingles[doc_id]) - inter
+            if inter / union < self.candidate_jaccard:
+                continue
+            if self._is_similar(norm, self._texts[doc_id]):
+                return doc_id
+        return None
+
+    def add_normalized(self, norm: str, grams: Optional[frozenset] = None) -> int:
+        grams = grams if grams is not None else shingles(norm)
+        doc_id = len(self._texts)
+        self._texts.append(norm)
+        self._shingles.append(grams)
+        self._exact.setdefault(norm, doc_id)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(doc_id)
+        return doc_id
+
+    def add(self, text: str) -> int:
+        return self.add_normalized(normalize_text(text))
+
+    def add_if_unique(self, text: str) -> bool:
+        """Index text unless a near-duplicate is already present; return True if added."""
+        norm = normalize_text(text)
+        grams = shingles(norm)
+        if self.find_normalized(norm, grams) is not None:
+            return False
+        self.add_normalized(norm, grams)
+        return True
+
+
+def _question_text(q: Union[dict, str]) -> str:
+    return q["Question"] if isinstance(q, dict) else q
+
+
+def build_index(questions: Iterable[Union[dict, str]], threshold: float = 0.85) -> QuestionIndex:
+    """Index a question bank (question dicts or plain question strings) as-is."""
+    index = QuestionIndex(threshold)
+    for q in questions:
+        index.add(_question_text(q))
+    return index
+
+
+def dedupe_question_pool(
+    questions: List[dict],
+    threshold: float = 0.85,
+    index: Optional[QuestionIndex] = None,
+) -> List[dict]:
+    """
+    Keep the first occurrence of each question, dropping near-duplicates within the list
+    and of anything already in `index` (e.g. an existing question bank). Accepted
+    questions are added to `index`.
+    """
+    index = index if index is not None else QuestionIndex(threshold)
+    return [q for q in questions if index.add_if_unique(q["Question"])]
@@ -1,29 +1,43 @@
 # utils/gsheets.py
 
 import os
+import copy
 import json
 import base64
 import binascii
 import re
+import time
+from typing import Optional
+import datetime
+import threading
+import gspread
+import requests
+from google.auth.credentials import AnonymousCredentials
 from google.oauth2.service_account import Credentials
 from google.auth.transport.requests import Request
-from quiz.backend.config import env_config
+from googleapiclient.discovery import build
+from quiz.backend.config import env_config, app_config, CACHE_DIR, FAKE_BACKEND_URL
 from quiz.backend.utils.logging_utils import log_and_print
 
 # Load environment variables and app config
 SERVICE_ACCOUNT_FILE = env_config["SERVICE_ACCOUNT_FILE"]
 GOOGLE_SCOPES = env_config["GOOGLE_SCOPES"]
+GDOC_CACHE_ENABLED = app_config.get("cache", {}).get("gdoc_content", True)
+GDOC_CACHE_DIR = os.path.join(CACHE_DIR, "gdocs")
 
-def get_google_credentials():
+# Refresh the shared access token this many seconds before it expires
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+# Back-off used by the background refresher after a failed refresh
+TOKEN_REFRESH_RETRY_SECONDS = 30
+# API hosts gspread calls directly; rewritten to the fake server when one is configured
+GOOGLE_API_HOSTS = ("https://sheets.googleapis.com", "https://www.googleapis.com")
+
+
+def _load_service_account_info() -> dict:
     """
-    Load Google service account credentials. Prioritizes Base64 encoded string from environment
+    Load the service account key as a dict. Prioritizes Base64 encoded string from environment
     for deployment, falls back to local file path for development.
-    Returns a Credentials object.
     """
-    print("Loading Google service account credentials...")
-    service_account_info = None
-    log_message = "" 
-
     # 1. Try to load from Base64 encoded environment variable (Hugging Face / Deployment)
     google_key_base64 = os.getenv("GOOGLE_SERVICE_ACCOUNT_KEY_BASE64")
     if google_key_base64 and not google_key_base64.startswith("placeholder_for_base64_encoded_key"):
@@ -36,87 +50,236 @@ def get_google_credentials():
             raise ValueError("Invalid Base64 encoded service account key.") from e
 
         log_and_print("Base64 decoded successfully, loading JSON...")
-    else:
-        # 2. Fallback to local file path (VS Code / Local Development)
-        absolute_service_account_path = os.path.abspath(SERVICE_ACCOUNT_FILE)
-        log_and_print(f"DEBUG: Attempting to load credentials from absolute path: {absolute_service_account_path}")
+        return service_account_info
+
+    # 2. Fallback to local file path (VS Code / Local Development)
+    absolute_service_account_path = os.path.abspath(SERVICE_ACCOUNT_FILE)
+    log_and_print(f"Attempting to load credentials from local file: {absolute_service_account_path}")
+
+    if not os.path.exists(absolute_service_account_path):
+        log_and_print(f"ERROR: Local credentials file DOES NOT EXIST at: {absolute_service_account_path}", to_console=True)
+        raise FileNotFoundError(f"Credentials file not found at: {absolute_service_account_path}")
+
+    try:
+        with open(absolute_service_account_path, 'r') as f:
+            service_account_info = json.load(f)
+        log_and_print("Local service account JSON file loaded successfully.")
+    except json.JSONDecodeError as e:
+        log_and_print(f"ERROR: Failed to parse JSON from local credentials file '{absolute_service_account_path}': {e}", to_console=True)
+        raise ValueError("Malformed local service account JSON file.") from e
+
+    return service_account_info
+
+
+def _refresh_credentials(creds):
+    """Fetch a fresh access token for creds, raising ValueError on failure."""
+    try:
+        creds.refresh(Request())
+        log_and_print("DEBUG: Credentials refreshed successfully.")
+    except Exception as refresh_error:
+        log_and_print(f"ERROR: Failed to refresh credentials: {refresh_error}", to_console=True)
+        raise ValueError(f"Failed to refresh Google service account credentials: {refresh_error}") from refresh_error
+
 
-        if not os.path.exists(absolute_service_account_path):
-            log_and_print(f"ERROR: Credentials file DOES NOT EXIST at: {absolute_service_account_path}")
-            raise FileNotFoundError(f"Credentials file not found at: {absolute_service_account_path}")
-        
-        log_and_print(f"Attempting to load credentials from local file: {absolute_service_account_path}")
+class _FakeEndpointSession(requests.Session):
+    """requests session for gspread that sends Google API calls to the fake backend server."""
 
-        if not os.path.exists(absolute_service_account_path):
-            log_and_print(f"ERROR: Local credentials file DOES NOT EXIST at: {absolute_service_account_path}", to_console=True)
-            raise FileNotFoundError(f"Credentials file not found at: {absolute_service_account_path}")
+    def __init__(self, endpoint: str):
+        super().__init__()
+        self.endpoint = endpoint
 
+    def request(self, method, url, *args, **kwargs):
+        for host in GOOGLE_API_HOSTS:
+            if url.startswith(host):
+                url = self.endpoint + url[len(host):]
+                break
+        return super().request(method, url, *args, **kwargs)
+
+
+class GoogleClientPool:
+    """
+    Process-wide registry of the service account credentials and the Google API clients
+    built from them.
+
+    The key is loaded and the token fetched once; a daemon thread then refreshes the token
+    shortly before it expires, so callers never pay for an OAuth round trip. All clients
+    share the same Credentials object and therefore always see the current token. A
+    refresh runs on a copy outside the pool lock and only the new token is swapped in,
+    so other threads are not held up by the OAuth round trip.
+    The gspread client is shared across threads, while googleapiclient services are cached
+    per thread because their httplib2 transport is not thread-safe.
+    """
+
+    def __init__(self, scopes, endpoint: Optional[str] = None):
+        self._scopes = scopes
+        self._endpoint = endpoint
+        self._lock = threading.RLock()
+        # Held for the duration of a token refresh, so only one runs at a time
+        self._refresh_lock = threading.Lock()
+        self._creds = None
+        self._gspread_client = None
+        self._local = threading.local()
+        self._refresher = None
+
+    def _expires_soon(self) -> bool:
+        expiry = self._creds.expiry
+        if expiry is None:
+            return False
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (expiry - now).total_seconds() < TOKEN_REFRESH_MARGIN_SECONDS
+
+    def _seconds_until_refresh(self) -> float:
+        expiry = self._creds.expiry
+        if expiry is None:
+            return TOKEN_REFRESH_RETRY_SECONDS
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return max((expiry - now).total_seconds() - TOKEN_REFRESH_MARGIN_SECONDS, 1.0)
+
+    def _refresh_shared(self, wait: bool = True):
+        """
+        Refresh the shared token without holding the pool lock during the OAuth call.
+        With wait=False, returns at once if another thread is already refreshing.
+        """
+        if not self._refresh_lock.acquire(blocking=wait):
+            return
         try:
-            with open(absolute_service_account_path, 'r') as f:
-                service_account_info = json.load(f)
-            log_and_print("Local service account JSON file loaded successfully.")
-        except json.JSONDecodeError as e:
-            log_and_print(f"ERROR: Failed to parse JSON from local credentials file '{absolute_service_account_path}': {e}", to_console=True)
-            raise ValueError("Malformed local service account JSON file.") from e
-
-# Now that service_account_info is populated (or an error was raised), create Credentials object
-    if service_account_info:
-        log_and_print(log_message, to_console=True) # Log which method was used
-        creds = Credentials.from_service_account_info(service_account_info, scopes=GOOGLE_SCOPES)
-        log_and_print("Service Account Credentials Loaded Successfully (Initial object created)", to_console=True)
-
-        # Force a refresh to get the token, as before
-        if not creds.token or creds.expired:
-            log_and_print("DEBUG: Token is None or expired, attempting to refresh credentials...", to_console=True)
+            with self._lock:
+                if self._creds.valid and not self._expires_soon() and wait:
+                    return  # refreshed by another thread while we waited
+                fresh = copy.copy(self._creds)
+            _refresh_credentials(fresh)
+            with self._lock:
+                self._creds.token = fresh.token
+                self._creds.expiry = fresh.expiry
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh_loop(self):
+        delay = self._seconds_until_refresh()
+        while True:
+            time.sleep(delay)
             try:
-                creds.refresh(Request())
-                log_and_print("DEBUG: Credentials refreshed successfully.", to_console=True)
-            except Exception as refresh_error:
-                log_and_print(f"ERROR: Failed to refresh credentials: {refresh_error}", to_console=True)
-                import traceback
-                traceback.print_exc() # Print full traceback for deeper insights
-                raise ValueError(f"Failed to refresh Google service account credentials: {refresh_error}") from refresh_error
-
-        # Final validity check
-        if not creds or not creds.valid: # This check should now pass if everything is correct
-            log_and_print("ERROR: Credentials object is invalid or not properly initialized AFTER REFRESH.", to_console=True)
-            raise ValueError("Invalid Google service account credentials.")
-
-        # Final debug prints
-        log_and_print(f"DEBUG: Final creds object type: {type(creds)}", to_console=True)
-        log_and_print(f"DEBUG: Final creds.valid: {creds.valid}", to_console=True)
-        log_and_print(f"DEBUG: Final creds.expired: {creds.expired}", to_console=True)
-        if creds.token:
-            log_and_print(f"DEBUG: Final creds.token: {creds.token[:10]}... (first 10 chars)", to_console=True)
-        else:
-            log_and_print("DEBUG: Final creds.token: None (This should ideally not happen after refresh)", to_console=True)
-
-        return creds
-    else:
-        # This branch should ideally not be reached if previous checks are robust
-        log_and_print("ERROR: Service account information could not be determined.", to_console=True)
-        raise ValueError("Service account information missing.")
-
-
-def clear_all_sheet_formatting_only(sheets_api, spreadsheet_id, sheet_id):
-    """
-    Clears all formatting (but not data) from the specified sheet.
-    """
-    request_body = {
-        "requests": [
-            {
-                "updateCells": {
-                    "range": {"sheetId": sheet_id},
-                    "fields": "userEnteredFormat"  # Only formatting
-                }
-            }
-        ]
-    }
+                self._refresh_shared(wait=False)
+                with self._lock:
+                    delay = self._seconds_until_refresh()
+            except ValueError:
+                delay = TOKEN_REFRESH_RETRY_SECONDS
+
+    def credentials(self):
+        """Return the shared, valid Credentials object, loading it on first use."""
+        with self._lock:
+            creds = self._creds
+            usable = creds is not None and creds.valid
+            stale = creds is not None and (not creds.valid or self._expires_soon())
+        if stale:
+            # The background refresher fell behind (e.g. after a failed refresh). Only
+            # wait for the refresh when the current token can no longer be used.
+            try:
+                self._refresh_shared(wait=not usable)
+            except ValueError:
+                if not usable:
+                    raise
+            return creds
+        with self._lock:
+            if self._creds is None and self._endpoint:
+                log_and_print(f"🧪 Using fake Google backends at {self._endpoint}", to_console=True)
+                self._creds = AnonymousCredentials()
+            elif self._creds is None:
+                print("Loading Google service account credentials...")
+                service_account_info = _load_service_account_info()
+                creds = Credentials.from_service_account_info(service_account_info, scopes=self._scopes)
+                log_and_print("Service Account Credentials Loaded Successfully (Initial object created)", to_console=True)
+                _refresh_credentials(creds)
+                if not creds.valid:
+                    log_and_print("ERROR: Credentials object is invalid or not properly initialized AFTER REFRESH.", to_console=True)
+                    raise ValueError("Invalid Google service account credentials.")
+                self._creds = creds
+                self._refresher = threading.Thread(target=self._refresh_loop, name="google-token-refresh", daemon=True)
+                self._refresher.start()
+            return self._creds
+
+    def gspread_client(self) -> gspread.Client:
+        """Return the shared gspread client."""
+        creds = self.credentials()
+        with self._lock:
+            if self._gspread_client is None:
+                try:
+                    session = _FakeEndpointSession(self._endpoint) if self._endpoint else None
+                    self._gspread_client = gspread.authorize(creds, session=session)
+                except Exception as e:
+                    raise ValueError(f"Failed to authorize with Google Sheets API: {str(e)}")
+            return self._gspread_client
+
+    def service(self, api: str, version: str):
+        """Return this thread's cached googleapiclient service for (api, version)."""
+        creds = self.credentials()
+        services = getattr(self._local, "services", None)
+        if services is None:
+            services = self._local.services = {}
+        key = (api, version)
+        if key not in services:
+            client_options = None
+            if self._endpoint:
+                # api_endpoint replaces the service path too; Drive keeps its version there
+                endpoint = f"{self._endpoint}/drive/v3/" if api == "drive" else self._endpoint
+                client_options = {"api_endpoint": endpoint}
+            services[key] = build(api, version, credentials=creds, cache_discovery=False, client_options=client_options)
+        return services[key]
+
+
+_client_pool = GoogleClientPool(GOOGLE_SCOPES, FAKE_BACKEND_URL)
+
+
+def get_google_credentials():
+    """
+    Return the process-wide Google service account credentials.
+    The key is loaded and the token fetched on the first call only; afterwards the
+    token is kept fresh in the background.
+    """
+    return _client_pool.credentials()
+
+
+def get_gspread_client() -> gspread.Client:
+    """Return the shared, authorized gspread client."""
+    return _client_pool.gspread_client()
+
+
+def get_docs_service():
+    """Return a cached Google Docs v1 service for the calling thread."""
+    return _client_pool.service('docs', 'v1')
+
+
+def get_sheets_service():
+    """Return a cached Google Sheets v4 service for the calling thread."""
+    return _client_pool.service('sheets', 'v4')
+
+
+def get_drive_service():
+    """Return a cached Google Drive v3 service for the calling thread."""
+    return _client_pool.service('drive', 'v3')
+
 
-    sheets_api.spreadsheets().batchUpdate(
-        spreadsheetId=spreadsheet_id,
-        body=request_body
+def find_spreadsheet_id(spreadsheet_name: str) -> str:
+    """
+    ID of the spreadsheet with this name, from one Drive files.list. Unlike
+    gspread's open(), no spreadsheet metadata is downloaded.
+    """
+    quoted = spreadsheet_name.replace("\\", "\\\\").replace("'", "\\'")
+    results = get_drive_service().files().list(
+        q=f"name='{quoted}' and mimeType='application/vnd.google-apps.spreadsheet' and trashed=false",
+        pageSize=1,
+        fields="files(id)",
+        supportsAllDrives=True,
+        includeItemsFromAllDrives=True,
     ).execute()
+    files = results.get("files", [])
+    if not files:
+        raise ValueError(
+            f"❌ Spreadsheet '{spreadsheet_name}' not found in Google Drive.\n"
+            f"   Please ensure it exists and is shared with the service account."
+        )
+    return files[0]["id"]
+
 
 def extract_gdoc_file_id(doc_link: str) -> str:
     """
@@ -127,30 +290,101 @@ def extract_gdoc_file_id(doc_link: str) -> str:
         return match.group(1)
     raise ValueError(f"Invalid Google Doc link: {doc_link}")
 
-def get_gdoc_title(doc_link: str, creds) -> str:
+def _extract_gdoc_text(doc: dict) -> str:
+    """Concatenate the paragraph text runs of a Docs API document resource."""
+    content = []
+    for element in doc.get("body", {}).get("content", []):
+        if "paragraph" in element:
+            for run in element["paragraph"].get("elements", []):
+                text = run.get("textRun", {}).get("content", "")
+                content.append(text)
+    return "".join(content).strip()
+
+def _read_gdoc_cache(file_id: str) -> Optional[dict]:
+    cache_path = os.path.join(GDOC_CACHE_DIR, f"{file_id}.json")
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def _write_gdoc_cache(file_id: str, entry: dict):
+    os.makedirs(GDOC_CACHE_DIR, exist_ok=True)
+    cache_path = os.path.join(GDOC_CACHE_DIR, f"{file_id}.json")
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+def fetch_gdoc(doc_link: str, prefetched: Optional[dict] = None) -> dict:
     """
-    Given a Google Doc link, fetches and returns the title of the document.
+    Fetch a Google Doc's title, revision ID and full text in a single download.
+
+    When the local content cache holds a copy with a revisionId, a metadata-only
+    request (title and revisionId) is made first; if the revisionId still matches,
+    the copy is served from disk and the full document is not downloaded at all.
+    Without a usable copy the document is downloaded directly in one call.
+
+    Args:
+        doc_link: Google Doc URL
+        prefetched: What the caller already fetched for this doc, used instead of
+                    requesting it again: fetch_gdoc_metadata's result, or a full
+                    fetch_gdoc result (returned as is)
+
+    Returns:
+        dict with "document_id", "title", "revision_id" and "text"
     """
+    if prefetched is not None and "text" in prefetched:
+        return prefetched
     file_id = extract_gdoc_file_id(doc_link)
-    from googleapiclient.discovery import build
-    docs_service = build('docs', 'v1', credentials=creds)
+    docs_service = get_docs_service()
+
+    cached = _read_gdoc_cache(file_id) if GDOC_CACHE_ENABLED else None
+    # Copies are only written with a revisionId, but an old or hand-edited file may lack one
+    if cached and cached.get("revision_id"):
+        meta = prefetched or fetch_gdoc_metadata(doc_link)
+        revision_id = meta["revision_id"]
+        if revision_id and cached["revision_id"] == revision_id:
+            log_and_print(f"📦 Serving Google Doc {file_id} from local cache (revision {revision_id}).")
+            # The title can change without a new content revision
+            cached["title"] = meta["title"] or cached.get("title", "Untitled")
+            return cached
+
     doc = docs_service.documents().get(documentId=file_id).execute()
-    return doc.get("title", "Untitled")
+    entry = {
+        "document_id": file_id,
+        "title": doc.get("title", "Untitled"),
+        "revision_id": doc.get("revisionId"),
+        "text": _extract_gdoc_text(doc),
+    }
 
-def read_chapter_text_from_gdoc(doc_link: str) -> str:
+    # Docs only reports revisionId to editors; without it we cannot validate a cached copy
+    if GDOC_CACHE_ENABLED and entry["revision_id"]:
+        try:
+            _write_gdoc_cache(file_id, entry)
+        except OSError as e:
+            log_and_print(f"⚠️ Could not write Google Doc cache for {file_id}: {e}")
+
+    return entry
+
+def fetch_gdoc_metadata(doc_link: str) -> dict:
     """
-    Given a Google Doc link, fetches and returns the full text content of the document.
+    A Google Doc's title and current revisionId from a metadata-only request. The
+    "revision_id" is None when Docs does not report it (only editors see it).
     """
-    from googleapiclient.discovery import build
     file_id = extract_gdoc_file_id(doc_link)
-    creds = get_google_credentials()
-    docs_service = build('docs', 'v1', credentials=creds)
-    doc = docs_service.documents().get(documentId=file_id).execute()
-    content = []
-    for element in doc.get("body", {}).get("content", []):
-        if "paragraph" in element:
-            for run in element["paragraph"].get("elements", []):
-                text = run.get("textRun", {}).get("content", "")
-                content.append(text)
-    return "".join(content).strip()
+    meta = get_docs_service().documents().get(documentId=file_id, fields="title,revisionId").execute()
+    return {"document_id": file_id, "title": meta.get("title"), "revision_id": meta.get("revisionId")}
+
+def get_gdoc_title(doc_link: str, creds=None) -> str:
+    """
+    Given a Google Doc link, fetches and returns the title of the document.
+    `creds` is accepted for backward compatibility; the pooled Docs client is used.
+    """
+    return fetch_gdoc(doc_link)["title"]
 
+def read_chapter_text_from_gdoc(doc_link: str) -> str:
+    """
+    Given a Google Doc link, fetches and returns the full text content of the document.
+    """
+    return fetch_gdoc(doc_link)["text"]
@@ -0,0 +1,264 @@
+# utils/job_queue.py
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import List, Optional
+from quiz.backend.config import app_config, CACHE_DIR
+
+JOBS_CONFIG = app_config.get("jobs", {})
+JOB_QUEUE_PATH = os.path.join(CACHE_DIR, "jobs.sqlite3")
+# Job kind executed by quiz/backend/job_worker.py
+GDOC_TO_SPREADSHEET = "gdoc_to_spreadsheet"
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+class JobQueue:
+    """
+    Durable queue of pipeline jobs stored in SQLite, shared by the app, the CLI and
+    any number of worker processes.
+
+    A worker claims a job by taking a lease on it and keeps the lease alive while it
+    runs. If the worker dies, the lease expires and another worker picks the job up.
+    Failed attempts are retried with exponential backoff until max_attempts is used up.
+    A worker whose lease has lapsed can no longer record progress or a result.
+    """
+
+    def __init__(
+        self,
+        path: str = JOB_QUEUE_PATH,
+        lease_seconds: float = 600,
+        max_attempts: int = 3,
+        retry_backoff_seconds: float = 30,
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Autocommit; claims take the write lock explicitly with BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    run_after REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    progress TEXT NOT NULL DEFAULT '[]',
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs(status, run_after)")
+            self._initialized = True
+        return conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        """Run one write statement; returns the number of rows it changed."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                return conn.execute(sql, params).rowcount
+            finally:
+                conn.close()
+
+    def enqueue(self, kind: str, payload: dict, max_attempts: Optional[int] = None) -> str:
+        """Queue a job and return its ID."""
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, kind, payload, status, max_attempts, run_after, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload, ensure_ascii=False), max_attempts or self.max_attempts, now, now, now),
+        )
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[dict]:
+        """
+        Lease the oldest runnable job (queued and due, or running with an expired lease)
+        to `worker_id`. Returns the job, or None if there is nothing to do.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = conn.execute(
+                        "SELECT * FROM jobs WHERE (status = 'queued' AND run_after <= ?) "
+                        "OR (status = 'running' AND lease_expires < ?) ORDER BY created_at LIMIT 1",
+                        (now, now),
+                    ).fetchone()
+                    if row is not None and row["status"] == "running" and row["attempts"] >= row["max_attempts"]:
+                        # The last attempt's worker died; nothing left to retry
+                        conn.execute(
+                            "UPDATE jobs SET status = 'failed', error = ?, lease_owner = NULL, updated_at = ? WHERE id = ?",
+                            (f"Worker {row['lease_owner']} stopped renewing its lease.", now, row["id"]),
+                        )
+                        row = None
+                    elif row is not None:
+                        conn.execute(
+                            "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+                            "lease_expires = ?, updated_at = ? WHERE id = ?",
+                            (worker_id, now + self.lease_seconds, now, row["id"]),
+                        )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                conn.close()
+        if row is None:
+            return None
+        job = self._row_to_job(row)
+        job.update(status="running", attempts=row["attempts"] + 1, lease_owner=worker_id)
+        return job
+
+    def renew(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease; False if the worker no longer holds it."""
+        now = time.time()
+        return self._execute(
+            "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND status = 'running' AND lease_owner = ?",
+            (now + self.lease_seconds, now, job_id, worker_id),
+        ) == 1
+
+    def add_progress(self, job_id: str, worker_id: str, message: str) -> bool:
+        """Append a progress line shown to whoever polls the job; also renews the lease."""
+        now = time.time()
+        return self._execute(
+            "UPDATE jobs SET progress = json_insert(progress, '$[#]', ?), lease_expires = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'running' AND lease_owner = ?",
+            (message, now + self.lease_seconds, now, job_id, worker_id),
+        ) == 1
+
+    def complete(self, job_id: str, worker_id: str, result) -> bool:
+        """Record the result of a successful run."""
+        return self._execute(
+            "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, lease_owner = NULL, updated_at = ? "
+            "WHERE id = ? AND status = 'running' AND lease_owner = ?",
+            (json.dumps(result, ensure_ascii=False), time.time(), job_id, worker_id),
+        ) == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str, retryable: bool = True) -> bool:
+        """
+        Record a failed attempt. The job is queued again after a backoff unless it is
+        not retryable or has used all its attempts.
+        """
+        now = time.time()
+        return self._execute(
+            "UPDATE jobs SET "
+            "status = CASE WHEN ? AND attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+            "run_after = ? + ? * (1 << (attempts - 1)), error = ?, lease_owner = NULL, updated_at = ? "
+            "WHERE id = ? AND status = 'running' AND lease_owner = ?",
+            (int(retryable), now, self.retry_backoff_seconds, error, now, job_id, worker_id),
+        ) == 1
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """The job's status, attempts, progress lines, result and last error; None if unknown."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            finally:
+                conn.close()
+        return self._row_to_job(row) if row is not None else None
+
+    def counts(self) -> dict:
+        """Number of jobs per status."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+            finally:
+                conn.close()
+        return {status: count for status, count in rows}
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["progress"] = json.loads(job["progress"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def follow(self, job_ids: List[str], poll_seconds: float = 1.0, timeout: Optional[float] = None):
+        """
+        Poll the jobs and yield them (in `job_ids` order; None for unknown IDs) whenever a
+        status or progress line changed, until every job has finished or `timeout` passed.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        seen = None
+        while True:
+            jobs = [self.get(job_id) for job_id in job_ids]
+            states = [(job["status"], len(job["progress"])) if job else None for job in jobs]
+            if states != seen:
+                seen = states
+                yield jobs
+            if all(job is None or job["status"] in FINISHED_STATUSES for job in jobs):
+                return
+            if deadline is not None and time.time() >= deadline:
+                return
+            time.sleep(poll_seconds)
+
+    def wait(self, job_ids: List[str], poll_seconds: float = 1.0, timeout: Optional[float] = None) -> List[dict]:
+        """Block until every job has finished (or `timeout` passed) and return the jobs."""
+        jobs = []
+        for jobs in self.follow(job_ids, poll_seconds, timeout):
+            pass
+        return jobs
+
+
+def submit_gdoc_job(input_doc_link: str, output_spreadsheet_link: str, num_questions: int = 15) -> str:
+    """Queue a Google Doc → quiz → spreadsheet run for the job workers; returns the job ID."""
+    return _job_queue.enqueue(GDOC_TO_SPREADSHEET, {
+        "input_doc_link": input_doc_link,
+        "output_spreadsheet_link": output_spreadsheet_link,
+        "num_questions": num_questions,
+    })
+
+
+def describe_job(job_id: str, job: Optional[dict]) -> str:
+    """One status line for a job, as shown by the app and the CLI."""
+    if job is None:
+        return f"❓ Job {job_id} not found."
+    if job["status"] == "succeeded":
+        return f"✅ Job {job_id} completed: Sheet ID: {job['result']}"
+    if job["status"] == "failed":
+        return f"❌ Job {job_id} failed after {job['attempts']} attempt(s): {job['error']}"
+    if job["status"] == "running":
+        return f"⏳ Job {job_id} running (attempt {job['attempts']}/{job['max_attempts']})"
+    if job["attempts"]:
+        return f"🔁 Job {job_id} queued for retry {job['attempts'] + 1}/{job['max_attempts']} after: {job['error']}"
+    return f"⏳ Job {job_id} queued"
+
+
+_job_queue = JobQueue(
+    lease_seconds=JOBS_CONFIG.get("lease_seconds", 600),
+    max_attempts=JOBS_CONFIG.get("max_attempts", 3),
+    retry_backoff_seconds=JOBS_CONFIG.get("retry_backoff_seconds", 30),
+)
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue."""
+    return _job_queue
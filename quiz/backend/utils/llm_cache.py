@@ -0,0 +1,160 @@
+# utils/llm_cache.py
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+from quiz.backend.config import app_config, CACHE_DIR
+from quiz.backend.utils.logging_utils import log_and_print
+
+LLM_CACHE_CONFIG = app_config.get("cache", {}).get("llm_responses", {})
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm_responses.sqlite3")
+
+
+def make_cache_key(model_id: str, prompt: str, params: Optional[dict] = None) -> str:
+    """Content-addressed key over the model, the exact prompt and the request parameters."""
+    payload = json.dumps(
+        {"model": model_id, "prompt": prompt, "params": params or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Persistent, opt-in cache of raw LLM completions stored in SQLite.
+
+    Entries older than max_age_days are dropped, and once the stored responses exceed
+    max_size_mb the least recently used entries are evicted. Setting `bypass` skips
+    lookups (fresh responses are still stored), which is what a forced regeneration wants.
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        enabled: bool = False,
+        max_size_mb: float = 50,
+        max_age_days: float = 30,
+        bypass: bool = False,
+    ):
+        self.path = path
+        self.enabled = enabled
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+            self._initialized = True
+        return conn
+
+    def get(self, model_id: str, prompt: str, params: Optional[dict] = None) -> Optional[str]:
+        """Return the cached completion, or None on a miss (or when disabled/bypassed)."""
+        if not self.enabled or self.bypass:
+            return None
+
+        key = make_cache_key(model_id, prompt, params)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or now - row[1] > self.max_age_seconds:
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+                self.hits += 1
+            finally:
+                conn.close()
+
+        log_and_print(f"📦 LLM cache hit for {model_id} (key {key[:12]}).")
+        return row[0]
+
+    def put(self, model_id: str, prompt: str, response: str, params: Optional[dict] = None):
+        """Store a completion and apply age- and size-based eviction."""
+        if not self.enabled:
+            return
+
+        key = make_cache_key(model_id, prompt, params)
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model_id, response, size, now, now),
+                )
+                self._evict(conn, now)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.max_age_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_size_bytes:
+            return
+        # Drop least recently used entries until we are back under the size budget
+        to_free = total - self.max_size_bytes
+        freed = 0
+        stale_keys = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            stale_keys.append((key,))
+            freed += size
+            if freed >= to_free:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+_llm_cache = LLMResponseCache(
+    enabled=bool(LLM_CACHE_CONFIG.get("enabled", False)),
+    max_size_mb=LLM_CACHE_CONFIG.get("max_size_mb", 50),
+    max_age_days=LLM_CACHE_CONFIG.get("max_age_days", 30),
+    bypass=os.getenv("QUIZ_LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes"),
+)
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Return the process-wide LLM response cache."""
+    return _llm_cache
@@ -1,5 +1,11 @@
+import atexit
 import logging
 import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from quiz.backend.config import app_config, process_file_path
+from quiz.backend.utils.metrics import current_job
 
 # Resolve to project root
 # ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -8,27 +14,97 @@ LOG_DIR = os.path.join(ROOT_DIR, "logs")
 
 # Ensure logs directory exists (optional)
 os.makedirs(LOG_DIR, exist_ok=True)
-LOG_FILE = os.path.join(LOG_DIR, "pipeline.log")
+LOG_FILE = process_file_path(os.path.join(LOG_DIR, "pipeline.log"))
+# Full prompts and model replies; sampled and size-capped
+ARTIFACT_LOG_FILE = process_file_path(os.path.join(LOG_DIR, "artifacts.log"))
 
-# ... (your existing code) ...
-LOG_FILE = os.path.join(LOG_DIR, "pipeline.log")
 print(f"DEBUG_LOGGING: Log file path resolved to: {LOG_FILE}") # <--- ADD THIS LINE
 
-logger = logging.getLogger("quiz_logger")  # use a unique name
-logger.setLevel(logging.DEBUG)
+LOGGING_CONFIG = app_config.get("logging", {})
+LOG_LEVEL = LOGGING_CONFIG.get("level", "INFO")
+LOG_MAX_BYTES = LOGGING_CONFIG.get("max_bytes", 10 * 1024 * 1024)
+LOG_BACKUP_COUNT = LOGGING_CONFIG.get("backup_count", 5)
+ARTIFACT_CONFIG = LOGGING_CONFIG.get("artifacts", {})
+ARTIFACT_SAMPLE_RATE = ARTIFACT_CONFIG.get("sample_rate", 1.0)
+ARTIFACT_MAX_CHARS = ARTIFACT_CONFIG.get("max_chars", 20000)
 
-# Set up logging
-file_handler = logging.FileHandler(LOG_FILE, mode="w")  # overwrite every run
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-file_handler.setFormatter(formatter)
 
-if logger.hasHandlers():
-    logger.handlers.clear()  # prevent duplicate logs
+class JobContextFilter(logging.Filter):
+    """Stamps each record with the job ID and chapter of the job that logged it."""
 
-logger.addHandler(file_handler)
+    def filter(self, record):
+        job = current_job()
+        record.job_id = job.get("job_id", "-")
+        record.chapter = job.get("chapter", "-")
+        return True
 
-def log_and_print(message, to_console=False):
-    """Logs the message to file and optionally prints to console."""
-    logger.info(message)  # ✅ use your custom logger, not the root one
+
+def _rotating_handler(path: str, max_bytes: int, backup_count: int) -> RotatingFileHandler:
+    # Append and rotate: a new process no longer truncates the previous run's log
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - [%(job_id)s %(chapter)s] - %(message)s"))
+    return handler
+
+
+def _queued_logger(name: str, level, file_handler: RotatingFileHandler) -> logging.Logger:
+    """
+    A logger whose records are handed to a background thread through a queue, so
+    callers never wait on file I/O.
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(JobContextFilter())
+
+    named_logger = logging.getLogger(name)  # use a unique name
+    named_logger.setLevel(level)
+    named_logger.propagate = False
+    if named_logger.hasHandlers():
+        named_logger.handlers.clear()  # prevent duplicate logs
+    named_logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return named_logger
+
+
+logger = _queued_logger("quiz_logger", LOG_LEVEL, _rotating_handler(LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT))
+artifact_logger = _queued_logger(
+    "quiz_artifacts",
+    logging.INFO,
+    _rotating_handler(
+        ARTIFACT_LOG_FILE,
+        ARTIFACT_CONFIG.get("max_bytes", 50 * 1024 * 1024),
+        ARTIFACT_CONFIG.get("backup_count", 2),
+    ),
+)
+
+
+def log_and_print(message, *args, to_console=False):
+    """
+    Logs the message to file and optionally prints to console.
+    Extra args are %-formatted into the message only if the record passes the
+    configured level, so callers should pass large values as args, not f-strings.
+    """
+    logger.info(message, *args)  # ✅ use your custom logger, not the root one
     if to_console:
-        print(message)
\ No newline at end of file
+        print(message % args if args else message)
+
+
+def log_debug(message, *args):
+    """Verbose diagnostics (whole question lists, parsed quiz dicts); skipped unless level is DEBUG."""
+    logger.debug(message, *args)
+
+
+def log_artifact(kind: str, text):
+    """
+    Record a full prompt or model reply in the artifact log. Only a sample
+    (logging.artifacts.sample_rate) is kept, each truncated to max_chars.
+    """
+    if text is None or random.random() >= ARTIFACT_SAMPLE_RATE:
+        return
+    text = str(text)
+    size = len(text)
+    if size > ARTIFACT_MAX_CHARS:
+        text = f"{text[:ARTIFACT_MAX_CHARS]}\n... [truncated {size - ARTIFACT_MAX_CHARS} chars]"
+    artifact_logger.info("%s (%d chars):\n%s", kind, size, text)
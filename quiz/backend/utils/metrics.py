@@ -0,0 +1,224 @@
+# utils/metrics.py
+
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from logging.handlers import RotatingFileHandler
+from contextlib import contextmanager
+from typing import Optional
+from quiz.backend.config import app_config, process_file_path, ROOT_DIR
+
+METRICS_CONFIG = app_config.get("metrics", {})
+METRICS_ENABLED = METRICS_CONFIG.get("enabled", True)
+# Per-process files in job workers: each process only knows its own counters
+METRICS_JSONL_PATH = process_file_path(os.path.join(ROOT_DIR, METRICS_CONFIG.get("jsonl_path", "logs/metrics.jsonl")))
+METRICS_PROMETHEUS_PATH = process_file_path(os.path.join(ROOT_DIR, METRICS_CONFIG.get("prometheus_path", "logs/metrics.prom")))
+# metrics.jsonl rotates like pipeline.log
+LOGGING_CONFIG = app_config.get("logging", {})
+METRICS_MAX_BYTES = LOGGING_CONFIG.get("max_bytes", 10 * 1024 * 1024)
+METRICS_BACKUP_COUNT = LOGGING_CONFIG.get("backup_count", 5)
+
+# {"job_id": ..., "chapter": ...} for the job running in this thread / task
+_job = contextvars.ContextVar("quiz_job", default={})
+# Innermost open span, so token and retry counts can be attributed to a stage
+_stage = contextvars.ContextVar("quiz_stage", default=None)
+
+
+class MetricsRecorder:
+    """
+    In-process stage timings and counters.
+
+    Every span and counter update is appended to a rotating JSON-lines file (tagged
+    with the current job ID and chapter) by a background thread, as pipeline.log is;
+    aggregates are kept in memory for a Prometheus-style text snapshot.
+    """
+
+    def __init__(
+        self,
+        jsonl_path: str = METRICS_JSONL_PATH,
+        enabled: bool = True,
+        max_bytes: int = METRICS_MAX_BYTES,
+        backup_count: int = METRICS_BACKUP_COUNT,
+    ):
+        self.jsonl_path = jsonl_path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._events = None
+        self._spans = {}      # stage -> [count, total_seconds, errors]
+        self._counters = {}   # (name, sorted label items) -> value
+
+    def _writer_queue(self) -> queue.SimpleQueue:
+        """Queue of events drained by the writer thread; started on first use."""
+        if self._events is not None:
+            return self._events
+        with self._lock:
+            if self._events is None:
+                os.makedirs(os.path.dirname(self.jsonl_path), exist_ok=True)
+                file_handler = RotatingFileHandler(
+                    self.jsonl_path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8"
+                )
+                file_handler.setFormatter(logging.Formatter("%(message)s"))
+                events = queue.SimpleQueue()
+                writer = threading.Thread(
+                    target=self._write_events, args=(events, file_handler), name="quiz-metrics-writer", daemon=True
+                )
+                writer.start()
+
+                def stop_writer():
+                    events.put(None)
+                    writer.join(timeout=5)
+
+                atexit.register(stop_writer)
+                self._events = events
+            return self._events
+
+    @staticmethod
+    def _write_events(events: queue.SimpleQueue, file_handler: RotatingFileHandler):
+        # JSON encoding and file I/O happen here, off the caller's thread
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            file_handler.handle(logging.makeLogRecord({"msg": json.dumps(event, ensure_ascii=False, default=str)}))
+        file_handler.close()
+
+    def _emit(self, event: dict):
+        if not self.enabled or not self.jsonl_path:
+            return
+        self._writer_queue().put(event)
+
+    def record_span(self, stage: str, started_at: float, seconds: float, ok: bool, attrs: Optional[dict] = None):
+        with self._lock:
+            entry = self._spans.setdefault(stage, [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += 0 if ok else 1
+        self._emit({
+            "type": "span",
+            "stage": stage,
+            "started_at": round(started_at, 3),
+            "duration_seconds": round(seconds, 4),
+            "status": "ok" if ok else "error",
+            **_job.get(),
+            **(attrs or {}),
+        })
+
+    def add(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._emit({"type": "counter", "name": name, "value": value, "labels": labels, "at": round(time.time(), 3), **_job.get()})
+
+    def prometheus_text(self) -> str:
+        """Current aggregates in the Prometheus text exposition format."""
+        with self._lock:
+            spans = {stage: list(values) for stage, values in self._spans.items()}
+            counters = dict(self._counters)
+
+        lines = [
+            "# HELP quiz_stage_duration_seconds Time spent per pipeline stage.",
+            "# TYPE quiz_stage_duration_seconds summary",
+        ]
+        for stage, (count, total, _) in sorted(spans.items()):
+            lines.append(f'quiz_stage_duration_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'quiz_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+        lines += [
+            "# HELP quiz_stage_errors_total Pipeline stages that raised.",
+            "# TYPE quiz_stage_errors_total counter",
+        ]
+        for stage, (_, _, errors) in sorted(spans.items()):
+            lines.append(f'quiz_stage_errors_total{{stage="{stage}"}} {errors}')
+
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            lines.append(f"# TYPE {name} counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name != name:
+                    continue
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_snapshot(self, path: str = METRICS_PROMETHEUS_PATH):
+        if not self.enabled or not path:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+_metrics = MetricsRecorder(enabled=METRICS_ENABLED)
+
+
+def get_metrics() -> MetricsRecorder:
+    """Return the process-wide metrics recorder."""
+    return _metrics
+
+
+def current_job() -> dict:
+    return _job.get()
+
+
+@contextmanager
+def job_context(chapter: Optional[str] = None, job_id: Optional[str] = None):
+    """
+    Tag everything recorded inside the block with a job ID and chapter.
+
+    Nested calls keep the outer job ID unless one is given. The outermost job
+    writes a fresh Prometheus snapshot when it ends.
+    """
+    outer = _job.get()
+    job = dict(outer)
+    job["job_id"] = job_id or outer.get("job_id") or uuid.uuid4().hex[:12]
+    if chapter is not None:
+        job["chapter"] = chapter
+    token = _job.set(job)
+    try:
+        yield job
+    finally:
+        _job.reset(token)
+        if not outer:
+            _metrics.write_prometheus_snapshot()
+
+
+def bind_chapter(chapter: str):
+    """Set the chapter of the current job once it is known (e.g. after reading the doc)."""
+    _job.set({**_job.get(), "chapter": chapter})
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Time a pipeline stage. Usable as a context manager or a decorator."""
+    token = _stage.set(stage)
+    started_at = time.time()
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        _stage.reset(token)
+        _metrics.record_span(stage, started_at, time.perf_counter() - started, ok, attrs)
+
+
+def record_tokens(prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    """Count provider-reported tokens against the innermost open span's stage."""
+    stage = _stage.get() or "unknown"
+    if prompt_tokens:
+        _metrics.add("quiz_llm_tokens_total", prompt_tokens, stage=stage, kind="prompt")
+    if completion_tokens:
+        _metrics.add("quiz_llm_tokens_total", completion_tokens, stage=stage, kind="completion")
+
+
+def record_retry(kind: str):
+    _metrics.add("quiz_retries_total", 1, kind=kind, stage=_stage.get() or "unknown")
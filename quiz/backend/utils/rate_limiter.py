@@ -0,0 +1,213 @@
+# utils/rate_limiter.py
+
+import time
+import random
+import asyncio
+import threading
+from typing import Optional
+from quiz.backend.config import app_config
+from quiz.backend.utils.logging_utils import log_and_print
+from quiz.backend.utils.metrics import record_retry
+
+GROQ_LIMITS_CONFIG = app_config.get("rate_limits", {}).get("groq", {})
+
+# HTTP statuses worth retrying: throttling and transient server-side failures
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token for English prose)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket using reservations: callers take tokens immediately
+    (the balance may go negative) and are told how long to wait, which keeps
+    admission first-come, first-served under contention.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` tokens and return the seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            # An oversize request must still be admissible once the bucket is full
+            self.tokens -= min(amount, self.capacity)
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.refill_per_second
+
+    def refund(self, amount: float):
+        """Return (or, if negative, take) tokens after the real cost is known."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class GroqRateLimiter:
+    """
+    Process-wide pacing for Groq calls with separate request and token buckets.
+
+    A 429 with a retry-after header pauses every caller until that time, not just
+    the one that was throttled. Time spent waiting is recorded in `stats()`.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        completion_tokens_estimate: int = 2000,
+        max_retries: int = 4,
+        base_backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 60.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self.completion_tokens_estimate = completion_tokens_estimate
+        self.max_retries = max_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._stats = {
+            "calls": 0,
+            "throttled": 0,
+            "retries": 0,
+            "wait_seconds": 0.0,
+            "backoff_seconds": 0.0,
+        }
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        with self._lock:
+            wait = max(wait, self._paused_until - time.monotonic())
+            self._stats["calls"] += 1
+            if wait > 0:
+                self._stats["wait_seconds"] += wait
+        return max(wait, 0.0)
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = retry_after
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        else:
+            # Full jitter keeps concurrent callers from retrying in lockstep
+            delay = random.uniform(0, min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** attempt))
+        record_retry(f"groq_{status_code_of(error)}")
+        with self._lock:
+            self._stats["retries"] += 1
+            self._stats["backoff_seconds"] += delay
+            if status_code_of(error) == 429:
+                self._stats["throttled"] += 1
+        return delay
+
+    def _should_retry(self, attempt: int, error: Exception) -> bool:
+        return attempt < self.max_retries and status_code_of(error) in RETRYABLE_STATUS_CODES
+
+    def estimate(self, prompt: str) -> int:
+        return estimate_tokens(prompt) + self.completion_tokens_estimate
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Correct the token bucket once the provider reports real usage."""
+        if actual_tokens:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+
+    def call(self, fn, prompt: str):
+        """Run fn() once the budget allows, retrying throttled/transient failures."""
+        estimated = self.estimate(prompt)
+        attempt = 0
+        while True:
+            wait = self._reserve(estimated)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                return fn()
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                log_and_print(f"⏳ Groq call failed with status {status_code_of(e)}; retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries}).")
+                time.sleep(delay)
+                attempt += 1
+
+    async def acall(self, coro_fn, prompt: str):
+        """Async counterpart of call(); coro_fn() must return a fresh awaitable."""
+        estimated = self.estimate(prompt)
+        attempt = 0
+        while True:
+            wait = self._reserve(estimated)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                return await coro_fn()
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                log_and_print(f"⏳ Groq call failed with status {status_code_of(e)}; retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries}).")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+def status_code_of(error: Exception) -> Optional[int]:
+    """HTTP status of a provider error (agno's ModelProviderError or the underlying SDK error)."""
+    for candidate in (error, getattr(error, "__cause__", None)):
+        if candidate is None:
+            continue
+        status = getattr(candidate, "status_code", None)
+        if isinstance(status, int):
+            return status
+        response = getattr(candidate, "response", None)
+        if response is not None and isinstance(getattr(response, "status_code", None), int):
+            return response.status_code
+    return None
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Seconds from a retry-after header on the SDK error behind `error`, if any."""
+    for candidate in (error, getattr(error, "__cause__", None)):
+        response = getattr(candidate, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            continue
+        value = headers.get("retry-after")
+        if value is None:
+            continue
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            return None
+    return None
+
+
+_groq_rate_limiter = GroqRateLimiter(
+    requests_per_minute=GROQ_LIMITS_CONFIG.get("requests_per_minute", 30),
+    tokens_per_minute=GROQ_LIMITS_CONFIG.get("tokens_per_minute", 60000),
+    completion_tokens_estimate=GROQ_LIMITS_CONFIG.get("completion_tokens_estimate", 2000),
+    max_retries=GROQ_LIMITS_CONFIG.get("max_retries", 4),
+    base_backoff_seconds=GROQ_LIMITS_CONFIG.get("base_backoff_seconds", 1.0),
+    max_backoff_seconds=GROQ_LIMITS_CONFIG.get("max_backoff_seconds", 60.0),
+)
+
+
+def get_groq_rate_limiter() -> GroqRateLimiter:
+    """Return the process-wide Groq rate limiter."""
+    return _groq_rate_limiter
@@ -0,0 +1,67 @@
+# utils/run_manifest.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Optional
+from quiz.backend.config import CACHE_DIR
+
+RUN_MANIFEST_PATH = os.path.join(CACHE_DIR, "run_manifest.json")
+
+
+def text_version(text: str) -> str:
+    """Content hash used as the source version when there is no revision ID."""
+    return "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class RunManifest:
+    """
+    What each batch item was last generated from, stored as one JSON file.
+
+    Entries are keyed by source and output location and record the source version
+    (content hash or Google Doc revisionId), num_questions, the model ID and the prompt
+    version. A batch run skips items whose entry matches, unless forced. The file is
+    rewritten through a temporary file and os.replace, so readers never see a partial
+    write and an interrupted run keeps the entries of the items it finished.
+    """
+
+    def __init__(self, path: str = RUN_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            return self._load().get(key)
+
+    def is_current(self, key: str, settings: dict) -> bool:
+        """True if the item was last generated with exactly these settings."""
+        entry = self.get(key)
+        return entry is not None and all(entry.get(name) == value for name, value in settings.items())
+
+    def record(self, key: str, settings: dict, spreadsheet_id: str):
+        """Store the settings an item was just generated with."""
+        with self._lock:
+            entries = self._load()
+            entries[key] = {**settings, "spreadsheet_id": spreadsheet_id, "generated_at": time.time()}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+_run_manifest = RunManifest()
+
+
+def get_run_manifest() -> RunManifest:
+    """Return the process-wide batch run manifest."""
+    return _run_manifest
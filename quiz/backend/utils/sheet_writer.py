@@ -0,0 +1,497 @@
+# utils/sheet_writer.py
+
+import zlib
+import threading
+import contextvars
+from concurrent.futures import Future
+from numbers import Number
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from googleapiclient.errors import HttpError
+from quiz.backend.config import app_config
+from quiz.backend.utils.concurrency import google_slots
+from quiz.backend.utils.gsheets import find_spreadsheet_id, get_sheets_service
+from quiz.backend.utils.logging_utils import log_and_print
+from quiz.backend.utils.metrics import current_job
+
+# Chapters finishing within this window that target the same spreadsheet share one batchUpdate
+WRITE_COALESCE_SECONDS = app_config.get("spreadsheets", {}).get("write_coalesce_seconds", 0.5)
+# Tabs are created at least this large, as gspread's add_worksheet used to do
+MIN_SHEET_ROWS = 100
+MIN_SHEET_COLS = 20
+# "cells" colours the correct options on every write; "rules" installs conditional-format
+# rules once per tab, after which rewrites carry no formatting requests. Switching to
+# "cells" removes rules installed earlier.
+HIGHLIGHT_MODE = app_config.get("spreadsheets", {}).get("highlight_mode", "cells")
+if HIGHLIGHT_MODE not in ("cells", "rules"):
+    raise ValueError(f"❌ spreadsheets.highlight_mode must be 'cells' or 'rules', not '{HIGHLIGHT_MODE}'")
+# Only the fields needed to map tab titles to sheet IDs and grid sizes, plus each tab's
+# rule formulas to see which of our highlight rules are there
+SHEET_METADATA_FIELDS = (
+    "sheets(properties(sheetId,title,gridProperties(rowCount,columnCount)),"
+    "conditionalFormats(booleanRule(condition(values))))"
+)
+
+# Mapping: Option A–D -> Columns F–I (5–8)
+OPTION_COLUMNS = {'a': 5, 'b': 6, 'c': 7, 'd': 8}
+HIGHLIGHT_COLOR = {"red": 0.78, "green": 0.90, "blue": 0.79}
+BACKUP_NOTE_COLOR = {"red": 1.0, "green": 0.8, "blue": 0.8}
+# "Right Answer" column (J), read by the conditional-format rules
+ANSWER_COLUMN_INDEX = 9
+# Custom formulas for rows 2+: one per option column, then the backup note row (A–F)
+HIGHLIGHT_RULE_FORMULAS = [
+    (f'=ISNUMBER(SEARCH("{letter}",${chr(ord("A") + ANSWER_COLUMN_INDEX)}2))', col_idx, col_idx + 1, HIGHLIGHT_COLOR)
+    for letter, col_idx in OPTION_COLUMNS.items()
+] + [('=REGEXMATCH(TO_TEXT($A2),"^\\s*The following")', 0, 6, BACKUP_NOTE_COLOR)]
+
+
+class SheetMetadataCache:
+    """
+    title -> {"sheetId", "rowCount", "columnCount", "ruleFormulas"} per spreadsheet, fetched
+    once with a fields mask and kept up to date from our own batchUpdates.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tabs: Dict[str, Dict[str, dict]] = {}
+        self._ids_by_name: Dict[str, str] = {}
+        # (cache, key) -> Future of a fetch in progress
+        self._pending: Dict[Tuple[int, str], Future] = {}
+
+    def _get_or_fetch(self, cache: dict, key: str, fetch):
+        """
+        cache[key], fetched with fetch() on a miss. Concurrent misses for the same key
+        (chapters of one batch starting together) wait for the first caller's fetch.
+        """
+        pending_key = (id(cache), key)
+        with self._lock:
+            if key in cache:
+                return cache[key]
+            future = self._pending.get(pending_key)
+            fetching = future is None
+            if fetching:
+                future = self._pending[pending_key] = Future()
+        if not fetching:
+            return future.result()
+        try:
+            value = fetch()
+        except BaseException as e:
+            # Not cached: the next caller tries again
+            with self._lock:
+                del self._pending[pending_key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            cache[key] = value
+            del self._pending[pending_key]
+        future.set_result(value)
+        return value
+
+    def tabs(self, spreadsheet_id: str) -> Dict[str, dict]:
+        return self._get_or_fetch(self._tabs, spreadsheet_id, lambda: _fetch_tabs(spreadsheet_id))
+
+    def update(self, spreadsheet_id: str, title: str, properties: dict):
+        with self._lock:
+            self._tabs.setdefault(spreadsheet_id, {})[title] = properties
+
+    def invalidate(self, spreadsheet_id: str):
+        with self._lock:
+            self._tabs.pop(spreadsheet_id, None)
+
+    def id_for_name(self, spreadsheet_name: str) -> str:
+        """Legacy name-based lookup (a Drive search), resolved once per name."""
+        return self._get_or_fetch(self._ids_by_name, spreadsheet_name, lambda: find_spreadsheet_id(spreadsheet_name))
+
+
+_metadata_cache = SheetMetadataCache()
+
+
+def get_sheet_metadata_cache() -> SheetMetadataCache:
+    """Return the process-wide sheet metadata cache."""
+    return _metadata_cache
+
+
+def inaccessible_spreadsheet_error(spreadsheet_id: str) -> ValueError:
+    """The error for a spreadsheet that is gone or not shared with the service account (403/404)."""
+    return ValueError(
+        f"❌ Spreadsheet with ID '{spreadsheet_id}' not found or is NOT accessible.\n"
+        f"   Reason: The spreadsheet is either:\n"
+        f"   1. Not shared with the service account\n"
+        f"   2. Does not exist\n"
+        f"   Solution: Please ensure the spreadsheet exists and is shared with the service account."
+    )
+
+
+def _fetch_tabs(spreadsheet_id: str) -> Dict[str, dict]:
+    """
+    One fields-masked spreadsheets.get; doubles as the access check for the spreadsheet.
+    """
+    try:
+        meta = get_sheets_service().spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields=SHEET_METADATA_FIELDS,
+        ).execute()
+    except HttpError as e:
+        if e.resp.status in (403, 404):
+            raise inaccessible_spreadsheet_error(spreadsheet_id)
+        raise ValueError(
+            f"❌ API Error accessing spreadsheet (ID: {spreadsheet_id}):\n"
+            f"   {str(e)}\n"
+            f"   Please verify the spreadsheet is shared with the service account."
+        )
+
+    tabs = {}
+    for sheet in meta.get("sheets", []):
+        props = sheet["properties"]
+        grid = props.get("gridProperties", {})
+        tabs[props["title"]] = {
+            "sheetId": props["sheetId"],
+            "rowCount": grid.get("rowCount", 0),
+            "columnCount": grid.get("columnCount", 0),
+            "ruleFormulas": [_rule_formula(rule) for rule in sheet.get("conditionalFormats", [])],
+        }
+    return tabs
+
+
+def _rule_formula(rule: dict) -> Optional[str]:
+    """The custom formula of a conditional-format rule, or None for any other kind of rule."""
+    values = rule.get("booleanRule", {}).get("condition", {}).get("values", [])
+    return values[0].get("userEnteredValue") if values else None
+
+
+def _highlight_rule_indexes(rule_formulas: List[Optional[str]]) -> List[int]:
+    """Positions of our highlight rules among a tab's conditional-format rules."""
+    ours = {formula for formula, _, _, _ in HIGHLIGHT_RULE_FORMULAS}
+    return [index for index, formula in enumerate(rule_formulas) if formula in ours]
+
+
+def _has_highlight_rules(rule_formulas: List[Optional[str]]) -> bool:
+    """True when each of our highlight rules is on the tab exactly once."""
+    installed = sorted(rule_formulas[index] for index in _highlight_rule_indexes(rule_formulas))
+    return installed == sorted(formula for formula, _, _, _ in HIGHLIGHT_RULE_FORMULAS)
+
+
+def _new_sheet_id(title: str, taken: set) -> int:
+    # Chosen client-side so the new tab can be written in the same batchUpdate that creates it
+    sheet_id = zlib.crc32(title.encode("utf-8")) & 0x7FFFFFFF
+    while sheet_id in taken or sheet_id == 0:
+        sheet_id = (sheet_id + 1) & 0x7FFFFFFF
+    return sheet_id
+
+
+def _cell(value) -> dict:
+    if value is None or (isinstance(value, float) and pd.isna(value)) or value == "":
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, Number):
+        return {"userEnteredValue": {"numberValue": float(value) if isinstance(value, float) else int(value)}}
+    # Written as-is, like gspread's default RAW value input
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def build_value_rows(df: pd.DataFrame) -> List[dict]:
+    """Header plus data rows of `df` as updateCells RowData."""
+    rows = [{"values": [_cell(str(col)) for col in df.columns]}]
+    for row in df.itertuples(index=False):
+        rows.append({"values": [_cell(value) for value in row]})
+    return rows
+
+
+def _true_runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """(start, end) of each run of consecutive True values, end exclusive."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def plan_highlights(df: pd.DataFrame) -> List[Tuple[int, int, int, int, dict]]:
+    """
+    Cells to colour as (startRow, endRow, startColumn, endColumn, color) grid ranges,
+    end exclusive, with row 0 being the header.
+
+    Correct-option cells come from one boolean mask per option column; consecutive
+    rows in a column form one range, and neighbouring columns with the same rows are
+    merged into one rectangle. The backup note row is coloured across columns A–F.
+    """
+    if df.empty:
+        return []
+    # SCQ: 'c', MCQ: 'bd', etc.
+    correct_options = df.iloc[:, -1].astype(str).str.strip().str.lower()
+    columns_by_rows = {}
+    for letter, col_idx in OPTION_COLUMNS.items():
+        for start, end in _true_runs(correct_options.str.contains(letter, regex=False).to_numpy()):
+            columns_by_rows.setdefault((start + 1, end + 1), []).append(col_idx)
+
+    ranges = []
+    for (start_row, end_row), col_indices in columns_by_rows.items():
+        first = col_indices[0]
+        for previous, col_idx in zip(col_indices, col_indices[1:] + [None]):
+            if col_idx != previous + 1:
+                ranges.append((start_row, end_row, first, previous + 1, HIGHLIGHT_COLOR))
+                first = col_idx
+
+    notes = df.iloc[:, 0].map(lambda value: isinstance(value, str) and value.strip().startswith("The following"))
+    for start, end in _true_runs(notes.to_numpy(dtype=bool)):
+        ranges.append((start + 1, end + 1, 0, 6, BACKUP_NOTE_COLOR))  # Columns A–F
+    return ranges
+
+
+def build_highlight_requests(sheet_id: int, df: pd.DataFrame) -> List[dict]:
+    """
+    Green background on the correct option cells of each question, and a red
+    background on the backup note row (columns A–F), one repeatCell per planned range.
+    """
+    return [
+        {
+            "repeatCell": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "startRowIndex": start_row,
+                    "endRowIndex": end_row,
+                    "startColumnIndex": start_col,
+                    "endColumnIndex": end_col
+                },
+                "cell": {"userEnteredFormat": {"backgroundColor": color}},
+                "fields": "userEnteredFormat.backgroundColor"
+            }
+        }
+        for start_row, end_row, start_col, end_col, color in plan_highlights(df)
+    ]
+
+
+def build_highlight_rule_requests(sheet_id: int) -> List[dict]:
+    """
+    Conditional-format rules that colour a correct option when the Right Answer cell of
+    its row contains the option's letter, and the backup note row. Installed once per tab.
+    """
+    return [
+        {
+            "addConditionalFormatRule": {
+                "rule": {
+                    # No end row, so the rules cover however many questions the tab holds
+                    "ranges": [{"sheetId": sheet_id, "startRowIndex": 1, "startColumnIndex": start_col, "endColumnIndex": end_col}],
+                    "booleanRule": {
+                        "condition": {"type": "CUSTOM_FORMULA", "values": [{"userEnteredValue": formula}]},
+                        "format": {"backgroundColor": color},
+                    },
+                },
+                "index": index,
+            }
+        }
+        for index, (formula, start_col, end_col, color) in enumerate(HIGHLIGHT_RULE_FORMULAS)
+    ]
+
+
+def build_highlight_rule_delete_requests(sheet_id: int, rule_formulas: List[Optional[str]]) -> List[dict]:
+    """Delete our highlight rules from a tab, last first so the remaining indexes stay valid."""
+    return [
+        {"deleteConditionalFormatRule": {"sheetId": sheet_id, "index": index}}
+        for index in reversed(_highlight_rule_indexes(rule_formulas))
+    ]
+
+
+def build_sheet_write_requests(title: str, df: pd.DataFrame, tabs: Dict[str, dict]) -> Tuple[List[dict], dict]:
+    """
+    Requests that (re)create the tab `title`, write `df` with a header row and apply
+    the answer highlights (or, in rules mode, install the highlight rules if the tab
+    doesn't have exactly one of each yet). A partial or duplicated set of our rules is
+    deleted and reinstalled; in cells mode any of our rules left on the tab are deleted.
+
+    Returns:
+        (requests, properties) where properties is the tab's metadata once they are applied
+    """
+    n_rows, n_cols = len(df) + 1, len(df.columns)
+    existing = tabs.get(title)
+    requests = []
+
+    if existing is None:
+        sheet_id = _new_sheet_id(title, {t["sheetId"] for t in tabs.values()})
+        properties = {
+            "sheetId": sheet_id,
+            "rowCount": max(MIN_SHEET_ROWS, n_rows),
+            "columnCount": max(MIN_SHEET_COLS, n_cols),
+            "ruleFormulas": [],
+        }
+        requests.append({
+            "addSheet": {
+                "properties": {
+                    "sheetId": sheet_id,
+                    "title": title,
+                    "gridProperties": {"rowCount": properties["rowCount"], "columnCount": properties["columnCount"]},
+                }
+            }
+        })
+    else:
+        sheet_id = existing["sheetId"]
+        properties = dict(existing)
+        if existing["rowCount"] < n_rows or existing["columnCount"] < n_cols:
+            properties["rowCount"] = max(existing["rowCount"], n_rows)
+            properties["columnCount"] = max(existing["columnCount"], n_cols)
+            requests.append({
+                "updateSheetProperties": {
+                    "properties": {
+                        "sheetId": sheet_id,
+                        "gridProperties": {"rowCount": properties["rowCount"], "columnCount": properties["columnCount"]},
+                    },
+                    "fields": "gridProperties(rowCount,columnCount)",
+                }
+            })
+        # Clear previous values and formatting in one go; once the rules colour the
+        # tab there is no formatting of ours to clear
+        requests.append({
+            "updateCells": {
+                "range": {"sheetId": sheet_id},
+                "fields": "userEnteredValue" if _has_highlight_rules(existing.get("ruleFormulas", [])) else "userEnteredValue,userEnteredFormat",
+            }
+        })
+
+    requests.append({
+        "updateCells": {
+            "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+            "rows": build_value_rows(df),
+            "fields": "userEnteredValue",
+        }
+    })
+    rule_formulas = properties.get("ruleFormulas", [])
+    ours = set(_highlight_rule_indexes(rule_formulas))
+    others = [formula for index, formula in enumerate(rule_formulas) if index not in ours]
+    if HIGHLIGHT_MODE == "cells":
+        requests.extend(build_highlight_rule_delete_requests(sheet_id, rule_formulas))
+        requests.extend(build_highlight_requests(sheet_id, df))
+        properties["ruleFormulas"] = others
+    elif not _has_highlight_rules(rule_formulas):
+        requests.extend(build_highlight_rule_delete_requests(sheet_id, rule_formulas))
+        requests.extend(build_highlight_rule_requests(sheet_id))
+        properties["ruleFormulas"] = [formula for formula, _, _, _ in HIGHLIGHT_RULE_FORMULAS] + others
+    return requests, properties
+
+
+def write_quiz_sheets(spreadsheet_id: str, sheets: List[Tuple[str, pd.DataFrame]]):
+    """
+    Write one or more quiz tabs to a spreadsheet with a single batchUpdate.
+
+    Tab metadata comes from the shared cache (at most one fields-masked fetch per
+    spreadsheet). If the batch is rejected, e.g. because a tab was created or deleted
+    by someone else since the fetch, the metadata is refetched and the batch retried once.
+
+    Args:
+        spreadsheet_id: The Google Sheets spreadsheet ID
+        sheets: (tab title, quiz DataFrame) pairs; later pairs win if a title repeats
+    """
+    sheets = list(dict(sheets).items())
+    sheets_api = get_sheets_service()
+
+    for attempt in range(2):
+        tabs = dict(_metadata_cache.tabs(spreadsheet_id))
+        requests, written = [], {}
+        for title, df in sheets:
+            sheet_requests, properties = build_sheet_write_requests(title, df, tabs)
+            requests.extend(sheet_requests)
+            tabs[title] = written[title] = properties
+        try:
+            sheets_api.spreadsheets().batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={"requests": requests}
+            ).execute()
+            break
+        except HttpError as e:
+            _metadata_cache.invalidate(spreadsheet_id)
+            if e.resp.status in (403, 404):
+                # Unshared or deleted since the tab metadata was cached; retrying won't help
+                raise inaccessible_spreadsheet_error(spreadsheet_id) from e
+            if attempt or e.resp.status != 400:
+                raise
+            log_and_print(f"⚠️ Sheet write rejected for {spreadsheet_id}; refreshing tab metadata and retrying: {e}")
+
+    for title, properties in written.items():
+        _metadata_cache.update(spreadsheet_id, title, properties)
+
+
+
+class SheetWriteCoordinator:
+    """
+    Coalesces quiz tab writes bound for the same spreadsheet.
+
+    The first write for a spreadsheet opens a short window; every chapter submitted
+    for that spreadsheet before it closes goes out in one combined batchUpdate. Each
+    caller still gets its own result: if the combined request is rejected, the tabs
+    are retried one by one so a single bad chapter does not fail the others.
+
+    Each write runs in a copy of its submitter's context, so logs and metrics keep
+    the job ID: the combined write under the first submitter's, per-tab retries
+    under their own.
+    """
+
+    def __init__(self, window_seconds: float = WRITE_COALESCE_SECONDS):
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Tuple[str, pd.DataFrame, Future, contextvars.Context]]] = {}
+
+    def submit(self, spreadsheet_id: str, title: str, df: pd.DataFrame) -> Future:
+        """Queue a tab write; the returned future resolves to the spreadsheet ID once it is flushed."""
+        future = Future()
+        with self._lock:
+            batch = self._pending.setdefault(spreadsheet_id, [])
+            batch.append((title, df, future, contextvars.copy_context()))
+            opens_window = len(batch) == 1
+        if opens_window:
+            timer = threading.Timer(self.window_seconds, self._flush, args=(spreadsheet_id,))
+            timer.daemon = True
+            timer.start()
+        return future
+
+    def write(self, spreadsheet_id: str, title: str, df: pd.DataFrame) -> str:
+        """Write a tab, waiting for the coalesced flush it ends up in."""
+        if self.window_seconds <= 0:
+            with google_slots.slot():
+                write_quiz_sheets(spreadsheet_id, [(title, df)])
+            return spreadsheet_id
+        return self.submit(spreadsheet_id, title, df).result()
+
+    def _flush(self, spreadsheet_id: str):
+        with self._lock:
+            batch = self._pending.pop(spreadsheet_id, [])
+        if batch:
+            batch[0][3].copy().run(self._write_batch, spreadsheet_id, batch)
+
+    def _write_batch(self, spreadsheet_id: str, batch: List[Tuple[str, pd.DataFrame, Future, contextvars.Context]]):
+        job_ids = ", ".join(dict.fromkeys(str(context.run(current_job).get("job_id")) for _, _, _, context in batch))
+        try:
+            with google_slots.slot():
+                write_quiz_sheets(spreadsheet_id, [(title, df) for title, df, _, _ in batch])
+        except HttpError as e:
+            if len(batch) == 1:
+                batch[0][2].set_exception(e)
+                return
+            log_and_print(f"⚠️ Combined write of {len(batch)} tabs to {spreadsheet_id} (jobs {job_ids}) failed; retrying per tab: {e}")
+            for title, df, future, context in batch:
+                context.copy().run(self._write_tab, spreadsheet_id, title, df, future)
+            return
+        except Exception as e:
+            # Not specific to one tab (e.g. the spreadsheet is not accessible)
+            for _, _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        if len(batch) > 1:
+            log_and_print(f"📤 Wrote {len(batch)} tabs to {spreadsheet_id} in one batchUpdate (jobs {job_ids}).")
+        for _, _, future, _ in batch:
+            future.set_result(spreadsheet_id)
+
+    @staticmethod
+    def _write_tab(spreadsheet_id: str, title: str, df: pd.DataFrame, future: Future):
+        try:
+            with google_slots.slot():
+                write_quiz_sheets(spreadsheet_id, [(title, df)])
+            future.set_result(spreadsheet_id)
+        except Exception as tab_error:
+            future.set_exception(tab_error)
+
+
+_write_coordinator = SheetWriteCoordinator()
+
+
+def get_sheet_write_coordinator() -> SheetWriteCoordinator:
+    """Return the process-wide sheet write coordinator."""
+    return _write_coordinator
@@ -0,0 +1 @@
+# This file makes 'quiz/benchmarks' a package
\ No newline at end of file
@@ -0,0 +1,340 @@
+# benchmarks/bench_pipeline.py
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the per-request CPU path: QuizParser.run, get_valid_mcqs,
+deduplicate_questions and merge_quiz_results.
+
+    python -m quiz.benchmarks.bench_pipeline                    # compare against baseline.json
+    python -m quiz.benchmarks.bench_pipeline --update-baseline  # after an intended change
+
+Every corpus reply is parsed first and its output compared to the fingerprint stored in
+baseline.json, so a change in what the parser returns for any well-formed or malformed
+reply fails the run. Timings are divided by a fixed calibration workload measured in the
+same process, which keeps the stored baseline usable across machines. They are compared
+per group (one reply kind, or one selection step across all sizes) to even out timer
+noise: a group more than --tolerance and NOISE_FLOOR_UNITS above its baseline fails the
+run (exit code 1), as does a parse whose peak traced memory grew by more than
+ALLOCATION_TOLERANCE. A failing run is measured again up to CONFIRM_RUNS times, keeping
+the best timing per benchmark, so a regression has to persist across runs to be reported.
+"""
+
+import gc
+import os
+import re
+import sys
+import json
+import math
+import logging
+import time
+import random
+import hashlib
+import argparse
+import tracemalloc
+from quiz.backend.indic_quiz_generator_pipeline import (
+    QuizParser,
+    deduplicate_questions,
+    get_valid_mcqs,
+    merge_quiz_results,
+)
+from quiz.backend.utils.metrics import get_metrics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCH_DIR, "corpus")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+DEDUPE_SIZES = (25, 50, 100, 200)
+# Each timing is the best of up to REPEATS runs of at least MIN_RUN_SECONDS,
+# stopping early once MAX_SECONDS_PER_TIMING has been spent
+REPEATS = 5
+MIN_RUN_SECONDS = 0.05
+MAX_SECONDS_PER_TIMING = 3.0
+# The unit is the best calibration run, taken before, between and after the benchmarks
+CALIBRATION_REPEATS = 20
+DEFAULT_TOLERANCE = 0.50
+# A group must also be this many calibration units slower to fail: the small parse groups
+# (one or two units in total) swing by up to 40% between runs on an idle machine
+NOISE_FLOOR_UNITS = 1.0
+# A busy machine can still push a larger group past both limits in one run, so failures
+# are re-measured this many more times before they are reported
+CONFIRM_RUNS = 2
+# Story vocabulary for the synthetic selection questions. Real stems share few character
+# trigrams unless they are near-duplicates, so the dedupe index must see distinct words
+# to prune like it does in production (pseudo-words from a handful of syllables do not).
+VOCABULARY = """
+river forest cradle butter flute village festival demon chariot palace sage cow storm
+mountain lotus peacock garland temple friend promise courage wisdom harvest journey
+monsoon banyan serpent arrow drum lamp elephant parrot moonlight kingdom mother father
+brother sister uncle grandmother teacher student hermit king queen prince princess
+minister soldier farmer weaver potter merchant boatman cowherd milkmaid guard messenger
+hunter fisherman priest dancer musician poet stranger giant dwarf tiger lion deer monkey
+crow swan tortoise rabbit jackal horse buffalo calf snake eagle sparrow owl fox bear
+bee honey mango banana coconut rice wheat sugarcane jasmine marigold tulsi neem peepal
+bamboo creek pond lake ocean island desert valley cave hill meadow orchard field garden
+courtyard kitchen doorway window rooftop staircase well bridge road market fortress
+gate tower boat raft net rope basket pot pitcher bowl spoon ladle blanket shawl crown
+necklace anklet bangle earring mirror comb feather conch bell flag bow sword shield
+spear wheel cart lantern candle torch fire smoke rain thunder lightning wind cloud
+rainbow sunrise sunset evening midnight dawn winter summer spring autumn season
+birthday wedding feast prayer blessing curse riddle secret treasure gift reward
+punishment lesson mistake apology argument battle victory defeat escape rescue visit
+search wish dream story song dance game race contest voyage return departure
+arrival hiding laughter tears anger fear kindness jealousy pride patience honesty
+loyalty greed generosity devotion mischief cleverness stubbornness gratitude sorrow
+joy surprise hunger thirst sleep climbed carried stole shared broke fixed planted
+watered sold bought counted painted sang played fought chased guarded promised
+forgot remembered warned tricked helped thanked scolded forgave followed crossed
+""".split()
+QUESTION_STARTS = ["What", "Who", "Why", "How", "Where", "When", "Which"]
+# Peak traced memory barely varies (the log writer thread is traced too), so the margin is small
+ALLOCATION_TOLERANCE = 0.25
+
+
+def best_time(fn, repeats: int = REPEATS) -> float:
+    """Best per-call seconds of fn over `repeats` runs, each looping long enough to time reliably."""
+    # Like timeit: collector pauses depend on what ran before, not on fn
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _best_time(fn, repeats)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _best_time(fn, repeats: int) -> float:
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_RUN_SECONDS:
+            break
+        loops *= 2
+    best, spent = elapsed / loops, elapsed
+    for _ in range(repeats - 1):
+        if spent >= MAX_SECONDS_PER_TIMING:
+            break
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        best, spent = min(best, elapsed / loops), spent + elapsed
+    return best
+
+
+def calibration_seconds() -> float:
+    """A fixed mix of JSON, string and dict work, used as the unit for stored timings."""
+    doc = json.dumps({"items": [{"k": i, "v": f"value {i} " * 8} for i in range(300)]})
+
+    def workload():
+        data = json.loads(doc)
+        seen = {}
+        for item in data["items"]:
+            seen[item["v"].strip().lower()] = item["k"]
+        json.dumps(seen)
+
+    return best_time(workload, repeats=CALIBRATION_REPEATS)
+
+
+def fingerprint(result) -> str:
+    return hashlib.sha256(json.dumps(result, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def load_corpus() -> dict:
+    corpus = {}
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        if name.endswith(".txt"):
+            with open(os.path.join(CORPUS_DIR, name), "r", encoding="utf-8") as f:
+                corpus[name[:-4]] = f.read()
+    return corpus
+
+
+def allocations(fn) -> dict:
+    """Peak traced memory and blocks still allocated after one call of fn."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        fn()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return {"peak_kib": round(peak / 1024, 1), "net_blocks": blocks}
+
+
+def bench_parser(corpus: dict) -> dict:
+    parser = QuizParser()
+    timings, outputs, peaks = {}, {}, {}
+    total_bytes, total_seconds = 0, 0.0
+    print(f"\n{'reply':34} {'KiB':>7} {'qs':>4} {'µs/parse':>10} {'MB/s':>7} {'peak KiB':>9}")
+    for name, reply in corpus.items():
+        result = parser.run(reply)
+        outputs[name] = fingerprint(result)
+        seconds = best_time(lambda: parser.run(reply))
+        alloc = allocations(lambda: parser.run(reply))
+        size = len(reply.encode("utf-8"))
+        total_bytes += size
+        total_seconds += seconds
+        timings[f"parse/{name}"] = seconds
+        peaks[name] = alloc["peak_kib"]
+        print(f"{name:34} {size / 1024:7.1f} {len(result['Questions']):4d} {seconds * 1e6:10.1f} {size / seconds / 1e6:7.1f} {alloc['peak_kib']:9.1f}")
+    print(f"📊 Parse throughput over the corpus: {len(corpus) / total_seconds:,.0f} replies/s, {total_bytes / total_seconds / 1e6:.1f} MB/s")
+    return {"timings": timings, "outputs": outputs, "peak_kib": peaks}
+
+
+def synthetic_questions(count: int, question_type: str, rng: random.Random) -> list:
+    """
+    Questions over VOCABULARY, so unrelated stems rarely reach the dedupe index's full
+    similarity check; roughly one in five is a near-duplicate of an earlier question.
+    """
+    words = VOCABULARY
+    questions = []
+    for i in range(count):
+        if questions and rng.random() < 0.2:
+            # Near-duplicate of an earlier question: the same stem with one word added
+            text = rng.choice(questions)["Question"].replace(" ", " the ", 1)
+        else:
+            text = f"{rng.choice(QUESTION_STARTS)} {' '.join(rng.sample(words, rng.randint(7, 11)))}?"
+        right = rng.choice("abcd") if question_type == "SCQ" or rng.random() < 0.15 else "".join(sorted(rng.sample("abcd", 2)))
+        questions.append({
+            "Question": text,
+            "Question_type": question_type,
+            "Options": [f"{label}. {' '.join(rng.sample(words, 2))}" for label in "abcd"],
+            "Right_Option": right,
+        })
+    return questions
+
+
+def bench_selection() -> dict:
+    timings = {}
+    print(f"\n{'questions':>9} {'valid_mcqs µs':>14} {'dedupe µs':>10} {'merge µs':>10}")
+    for size in DEDUPE_SIZES:
+        rng = random.Random(size)
+        scq = synthetic_questions(size, "SCQ", rng)
+        mcq = synthetic_questions(size * 2, "MCQ", rng)
+        num_questions = size
+        valid = get_valid_mcqs(mcq, num_questions)
+
+        t_valid = best_time(lambda: get_valid_mcqs(mcq, num_questions))
+        t_dedupe = best_time(lambda: deduplicate_questions(scq[:size // 2 + 1], valid))
+        t_merge = best_time(lambda: merge_quiz_results({"Questions": scq}, {"Questions": mcq}, num_questions))
+        timings[f"valid_mcqs/{size}"] = t_valid
+        timings[f"dedupe/{size}"] = t_dedupe
+        timings[f"merge/{size}"] = t_merge
+        print(f"{size:9d} {t_valid * 1e6:14.1f} {t_dedupe * 1e6:10.1f} {t_merge * 1e6:10.1f}")
+
+    first, last = DEDUPE_SIZES[0], DEDUPE_SIZES[-1]
+    growth = math.log(timings[f"dedupe/{last}"] / timings[f"dedupe/{first}"]) / math.log(last / first)
+    print(f"📈 Dedupe time grows as n^{growth:.2f} between {first} and {last} questions")
+    return timings
+
+
+def timing_group(name: str) -> str:
+    """parse/clean_mcq_15 -> parse/clean, dedupe/200 -> dedupe"""
+    m = re.fullmatch(r"(parse/[a-z_]+?)_(?:scq|mcq|\d+)(?:_\d+)?", name)
+    return m.group(1) if m else name.split("/")[0]
+
+
+def grouped(timings: dict) -> dict:
+    groups = {}
+    for name, value in timings.items():
+        groups[timing_group(name)] = groups.get(timing_group(name), 0.0) + value
+    return groups
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Failure messages for changed parse outputs, slower timing groups and grown peak memory."""
+    failures = []
+    for name, expected in baseline.get("outputs", {}).items():
+        actual = results["outputs"].get(name)
+        if actual is None:
+            failures.append(f"corpus reply '{name}' is missing")
+        elif actual != expected:
+            failures.append(f"QuizParser output changed for '{name}' ({expected} -> {actual})")
+
+    shared = set(baseline.get("timings", {})) & set(results["timings"])
+    base_groups = grouped({name: baseline["timings"][name] for name in shared})
+    current_groups = grouped({name: results["timings"][name] for name in shared})
+    for group, base in sorted(base_groups.items()):
+        ratio = current_groups[group] / base if base > 0 else 1.0
+        if ratio > 1 + tolerance and current_groups[group] - base > NOISE_FLOOR_UNITS:
+            failures.append(f"{group} is {ratio:.2f}x its baseline (tolerance {1 + tolerance:.2f}x)")
+
+    for name, base in baseline.get("peak_kib", {}).items():
+        current = results["peak_kib"].get(name)
+        if current is not None and base > 0 and current > base * (1 + ALLOCATION_TOLERANCE):
+            failures.append(f"peak memory parsing '{name}' grew from {base} KiB to {current} KiB")
+    return failures
+
+
+def run_benchmarks() -> dict:
+    """One full pass: parse outputs, peak memory and timings in calibration units."""
+    unit = calibration_seconds()
+    parse_results = bench_parser(load_corpus())
+    unit = min(unit, calibration_seconds())
+    seconds = {**parse_results["timings"], **bench_selection()}
+    unit = min(unit, calibration_seconds())
+    print(f"\n⏱️ Calibration unit: {unit * 1e6:.1f} µs")
+    timings = {name: value / unit for name, value in seconds.items()}
+    return {"unit_seconds": unit, "timings": timings, "outputs": parse_results["outputs"], "peak_kib": parse_results["peak_kib"]}
+
+
+def best_of(first: dict, second: dict) -> dict:
+    """Merge two passes, keeping the lower timing and peak memory for each benchmark."""
+    return {
+        "unit_seconds": min(first["unit_seconds"], second["unit_seconds"]),
+        "timings": {name: min(value, second["timings"].get(name, value)) for name, value in first["timings"].items()},
+        "outputs": second["outputs"],
+        "peak_kib": {name: min(value, second["peak_kib"].get(name, value)) for name, value in first["peak_kib"].items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QuizParser and selection/dedupe benchmarks")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to baseline.json")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown over baseline (0.5 = 50%%)")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    # Benchmarks measure the code, not metrics events or pipeline log lines
+    get_metrics().enabled = False
+    logging.disable(logging.INFO)
+
+    results = run_benchmarks()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({key: results[key] for key in ("timings", "outputs", "peak_kib")}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"✅ Baseline written to {BASELINE_PATH}")
+        return
+
+    if not os.path.exists(BASELINE_PATH):
+        print("⚠️ No baseline.json yet; run with --update-baseline to create one.")
+        return
+    with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    failures = compare(results, baseline, args.tolerance)
+    for attempt in range(CONFIRM_RUNS):
+        if not failures:
+            break
+        print(f"\n🔁 {len(failures)} regression(s); measuring again to confirm ({attempt + 1}/{CONFIRM_RUNS})...")
+        results = best_of(results, run_benchmarks())
+        failures = compare(results, baseline, args.tolerance)
+    if failures:
+        print("\n❌ Benchmark regressions:")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+    print("\n✅ No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
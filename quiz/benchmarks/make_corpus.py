@@ -0,0 +1,157 @@
+# benchmarks/make_corpus.py
+# -*- coding: utf-8 -*-
+"""
+Builds the reply corpus used by bench_pipeline.py.
+
+Replies are written in the shapes the model actually produces, well-formed and
+malformed, at several question counts. Real replies can be added from the
+artifact log (logs/artifacts.log) with --from-artifacts; they are stored as
+captured_*.txt and kept when the corpus is regenerated.
+
+    python -m quiz.benchmarks.make_corpus
+    python -m quiz.benchmarks.make_corpus --from-artifacts logs/artifacts.log
+"""
+
+import os
+import re
+import json
+import random
+import argparse
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+SIZES = (5, 15)
+# Long MCQ replies (the MCQ call over-asks) for the kinds that hit different parse paths
+LARGE_SIZE = 40
+LARGE_KINDS = ("clean", "fenced", "needs_repair", "truncated")
+SEED = 20240601
+
+_NAMES = ["Kṛiṣhṇa", "Yaśhodā", "Nanda", "Kaṃsa", "Pūtanā", "Balarāma", "Gopīs", "Vasudeva", "Devakī", "Akrūra"]
+_WORDS = (
+    "river forest cradle butter flute village festival demon chariot palace sage cow "
+    "storm mountain lotus peacock garland temple friend promise courage wisdom harvest "
+    "journey monsoon banyan serpent arrow drum lamp elephant parrot moonlight kingdom"
+).split()
+_STARTS = ["What", "Who", "Why", "How", "Where", "When"]
+
+# kind -> how a parsed quiz dict is rendered as a reply
+KINDS = (
+    "clean",            # {"Quiz": {...}} and nothing else
+    "fenced",           # prose preamble plus a ```json fence
+    "double_encoded",   # the JSON document encoded again as a JSON string
+    "dict_options",     # Options as {"a": ..., "b": ...}
+    "no_wrapper",       # {"Topic": ..., "Questions": [...]} without "Quiz"
+    "lowercase_keys",   # "questions" / "options"
+    "flat_options",     # no Options; each option is its own key
+    "needs_repair",     # trailing commas and single-quoted strings
+    "truncated",        # reply cut off part-way through
+    "bare_list",        # a top-level array of questions
+)
+
+
+def _question(rng: random.Random, question_type: str) -> dict:
+    subject = rng.choice(_NAMES)
+    words = rng.sample(_WORDS, 5)
+    options = [f"{rng.choice(_NAMES)} {' '.join(rng.sample(_WORDS, 2))}" for _ in range(4)]
+    right = rng.choice("abcd") if question_type == "SCQ" else "".join(sorted(rng.sample("abcd", rng.choice((2, 2, 3)))))
+    if question_type == "MCQ" and rng.random() < 0.15:
+        right = rng.choice("abcd")  # the classic invalid single-letter MCQ
+    return {
+        "Question": f"{rng.choice(_STARTS)} did {subject} {' '.join(words)} in the story?",
+        "Question_type": question_type,
+        "Options": [f"{label}. {text}" for label, text in zip("abcd", options)],
+        "Right_Option": right,
+        "Number_Of_Points_Earned": "15" if question_type == "MCQ" else "10",
+        "Timer": rng.choice((10, 15, 20, 25, 30)),
+    }
+
+
+def _quiz(rng: random.Random, count: int, question_type: str) -> dict:
+    questions = [_question(rng, question_type) for _ in range(count)]
+    # A few near-duplicates, as the model tends to produce
+    for i in range(0, count - 1, 7):
+        dup = json.loads(json.dumps(questions[i]))
+        dup["Question"] = dup["Question"].replace(" in the story?", " in this story?")
+        questions[i + 1] = dup
+    return {"Quiz": {"Topic": f"{rng.choice(_NAMES)} and the {rng.choice(_WORDS)}", "Questions": questions}}
+
+
+def render(kind: str, quiz: dict) -> str:
+    """Render a quiz dict as a model reply of the given kind."""
+    if kind == "clean":
+        return json.dumps(quiz, ensure_ascii=False, indent=2)
+    if kind == "fenced":
+        return "Here is the quiz based on the passage:\n\n```json\n" + json.dumps(quiz, ensure_ascii=False, indent=4) + "\n```\n\nLet me know if you need changes."
+    if kind == "double_encoded":
+        return json.dumps(json.dumps(quiz, ensure_ascii=False), ensure_ascii=False)
+    if kind == "dict_options":
+        q = json.loads(json.dumps(quiz))
+        for question in q["Quiz"]["Questions"]:
+            question["Options"] = {label: opt.split(". ", 1)[1] for label, opt in zip("abcd", question["Options"])}
+        return json.dumps(q, ensure_ascii=False, indent=2)
+    if kind == "no_wrapper":
+        return json.dumps(quiz["Quiz"], ensure_ascii=False, indent=2)
+    if kind == "lowercase_keys":
+        inner = quiz["Quiz"]
+        questions = [{("options" if k == "Options" else k): v for k, v in question.items()} for question in inner["Questions"]]
+        return json.dumps({"Quiz": {"Topic": inner["Topic"], "questions": questions}}, ensure_ascii=False, indent=2)
+    if kind == "flat_options":
+        q = json.loads(json.dumps(quiz))
+        for question in q["Quiz"]["Questions"]:
+            for label, opt in zip("abcd", question.pop("Options")):
+                question[label] = opt.split(". ", 1)[1]
+        return json.dumps(q, ensure_ascii=False, indent=2)
+    if kind == "needs_repair":
+        text = json.dumps(quiz, ensure_ascii=False, indent=2)
+        text = re.sub(r'("Timer": \d+)\n', r"\1,\n", text)
+        return text.replace('"Topic"', "'Topic'")
+    if kind == "truncated":
+        text = json.dumps(quiz, ensure_ascii=False, indent=2)
+        return text[:int(len(text) * 0.85)]
+    if kind == "bare_list":
+        return json.dumps(quiz["Quiz"]["Questions"], ensure_ascii=False, indent=2)
+    raise ValueError(f"Unknown reply kind: {kind}")
+
+
+def import_artifacts(path: str) -> int:
+    """Copy untruncated model replies out of the artifact log into the corpus."""
+    with open(path, "r", encoding="utf-8") as f:
+        log = f.read()
+    header = re.compile(r"^.* - INFO - \[.*?\] - ((?:SCQ|MCQ|MCQ repair) response) \((\d+) chars\):\n", re.MULTILINE)
+    added = 0
+    for m in header.finditer(log):
+        size = int(m.group(2))
+        text = log[m.end():m.end() + size]
+        if len(text) < size or text.endswith("chars]"):
+            continue  # truncated in the log
+        name = f"captured_{m.group(1).split()[0].lower()}_{added:03d}.txt"
+        with open(os.path.join(CORPUS_DIR, name), "w", encoding="utf-8") as out:
+            out.write(text)
+        added += 1
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the QuizParser benchmark corpus")
+    parser.add_argument("--from-artifacts", default=None, help="Also import captured replies from an artifact log")
+    args = parser.parse_args()
+
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    rng = random.Random(SEED)
+    written = 0
+    for kind in KINDS:
+        variants = [(size, question_type) for size in SIZES for question_type in ("SCQ", "MCQ")]
+        if kind in LARGE_KINDS:
+            variants.append((LARGE_SIZE, "MCQ"))
+        for size, question_type in variants:
+            reply = render(kind, _quiz(rng, size, question_type))
+            with open(os.path.join(CORPUS_DIR, f"{kind}_{question_type.lower()}_{size}.txt"), "w", encoding="utf-8") as f:
+                f.write(reply)
+            written += 1
+    print(f"✅ Wrote {written} generated replies to {CORPUS_DIR}")
+
+    if args.from_artifacts:
+        print(f"✅ Imported {import_artifacts(args.from_artifacts)} captured replies from {args.from_artifacts}")
+
+
+if __name__ == "__main__":
+    main()
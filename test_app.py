@@ -1,17 +1,26 @@
 import sys
 import os
 import re
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), ".")))
 
 import gradio as gr
 from quiz.backend.gurukula_quizgen import (
+    WORKFLOW_STAGES,
     run_gdoc_to_spreadsheet_workflow,
 )
 import gspread
+from quiz.backend.config import app_config
 from quiz.backend.utils.gsheets import get_google_credentials
+from quiz.backend.utils.job_queue import FINISHED_STATUSES, describe_job, get_job_queue, submit_gdoc_job
 import datetime
 
+# Queue documents for background workers instead of running them in the request
+JOBS_CONFIG = app_config.get("jobs", {})
+JOBS_ENABLED = JOBS_CONFIG.get("enabled", False)
+
 def is_valid_gsheet_url(url: str) -> bool:
     """Validate Google Sheets URL format"""
     return (
@@ -58,21 +67,28 @@ def generate_quiz(
 ):
     """
     Generate quiz from Google Docs and write to spreadsheet.
+    Documents are processed concurrently; status and log lines are streamed
+    as each document finishes a stage.
     
     Args:
         gdoc_link_1, gdoc_link_2, gdoc_link_3: Google Doc URLs
         num_questions_1, num_questions_2, num_questions_3: Number of questions for each doc
         output_spreadsheet: Output Google Sheets URL
         progress: Gradio progress tracker
+
+    With `jobs.enabled`, the documents are queued for the background workers
+    instead and the IDs of their jobs are returned as well.
     """
     logs = []
 
     # Validate output spreadsheet
     if not output_spreadsheet or not output_spreadsheet.strip():
-        return "❌ Output Spreadsheet URL is required.", logs
+        yield "❌ Output Spreadsheet URL is required.", "", ""
+        return
     
     if not is_valid_gsheet_url(output_spreadsheet):
-        return "❌ Invalid Output Spreadsheet URL format. Please provide a valid Google Sheets link (e.g., https://docs.google.com/spreadsheets/d/YOUR_SHEET_ID/edit).", logs
+        yield "❌ Invalid Output Spreadsheet URL format. Please provide a valid Google Sheets link (e.g., https://docs.google.com/spreadsheets/d/YOUR_SHEET_ID/edit).", "", ""
+        return
     
     # Collect valid doc pairs
     valid_pairs = []
@@ -92,43 +108,134 @@ def generate_quiz(
         
         # Validate that both link and num_questions are provided together
         if link and not num_str:
-            return f"❌ Chapter Link {idx} is provided but 'Num Questions' is missing.", logs
+            yield f"❌ Chapter Link {idx} is provided but 'Num Questions' is missing.", "", ""
+            return
         
         if not link and num_str:
-            return f"❌ 'Num Questions' is provided for Chapter Link {idx} but no link was provided.", logs
+            yield f"❌ 'Num Questions' is provided for Chapter Link {idx} but no link was provided.", "", ""
+            return
         
         # Validate Google Doc URL format
         if not is_valid_gdoc_url(link):
-            return f"❌ Invalid Google Doc link format for Chapter Link {idx}. Please provide a valid Google Docs link (e.g., https://docs.google.com/document/d/YOUR_DOC_ID/edit).", logs
+            yield f"❌ Invalid Google Doc link format for Chapter Link {idx}. Please provide a valid Google Docs link (e.g., https://docs.google.com/document/d/YOUR_DOC_ID/edit).", "", ""
+            return
         
         # Validate number of questions
         is_valid, n = is_valid_num_questions(num_str)
         if not is_valid:
-            return f"❌ 'Num Questions' for Chapter Link {idx} must be a number between 1 and 30.", logs
+            yield f"❌ 'Num Questions' for Chapter Link {idx} must be a number between 1 and 30.", "", ""
+            return
         
         valid_pairs.append((link, n))
     
     # Check that at least one doc is provided
     if not valid_pairs:
-        return "❌ Please provide at least one Google Doc link with a valid number of questions (1-30).", logs
+        yield "❌ Please provide at least one Google Doc link with a valid number of questions (1-30).", "", ""
+        return
     
-    # Process all valid pairs
+    if JOBS_ENABLED:
+        yield from follow_quiz_jobs(valid_pairs, output_spreadsheet, progress)
+        return
+
+    # Process all valid pairs concurrently, streaming per-stage updates
     count_to_process = len(valid_pairs)
-    progress(0)
-    for i, (link, n) in enumerate(valid_pairs):
+    total_steps = count_to_process * len(WORKFLOW_STAGES)
+    events = queue.Queue()
+
+    def process_doc(doc_idx, link, n):
+        def on_stage(stage, message):
+            events.put((doc_idx, stage, message.strip()))
         try:
-            logs.append(f"📘 Processing GDoc: {link[:60]}... with {n} questions...")
             spreadsheet_id = run_gdoc_to_spreadsheet_workflow(
                 input_doc_link=link,
                 output_spreadsheet_link=output_spreadsheet,
-                num_questions=n
+                num_questions=n,
+                on_stage=on_stage
             )
-            logs.append(f"✅ Completed: Sheet ID: {spreadsheet_id}")
+            events.put((doc_idx, "completed", f"✅ Completed: Sheet ID: {spreadsheet_id}"))
         except Exception as e:
-            logs.append(f"❌ Error processing document: {str(e)}")
-        progress((i + 1) / count_to_process)
-    
-    return f"✅ {len(valid_pairs)} Google Doc(s) processed successfully.", logs
+            events.put((doc_idx, "failed", f"❌ Error processing document: {str(e)}"))
+
+    for doc_idx, (link, n) in enumerate(valid_pairs, 1):
+        logs.append(f"📘 [Doc {doc_idx}] Processing GDoc: {link[:60]}... with {n} questions...")
+    progress(0, desc="Starting...")
+    yield f"⏳ Processing {count_to_process} Google Doc(s)...", "\n".join(logs), ""
+
+    stages_done = [0] * count_to_process
+    finished = succeeded = 0
+    with ThreadPoolExecutor(max_workers=count_to_process) as executor:
+        for doc_idx, (link, n) in enumerate(valid_pairs, 1):
+            executor.submit(process_doc, doc_idx, link, n)
+
+        while finished < count_to_process:
+            doc_idx, stage, message = events.get()
+            logs.append(f"[Doc {doc_idx}] {message}")
+            if stage in WORKFLOW_STAGES:
+                stages_done[doc_idx - 1] += 1
+            else:
+                finished += 1
+                succeeded += stage == "completed"
+                # A failed document will not report its remaining stages
+                stages_done[doc_idx - 1] = len(WORKFLOW_STAGES)
+            progress(sum(stages_done) / total_steps, desc=f"{finished}/{count_to_process} document(s) finished")
+            yield f"⏳ {finished}/{count_to_process} Google Doc(s) finished...", "\n".join(logs), ""
+
+    if succeeded == count_to_process:
+        yield f"✅ {count_to_process} Google Doc(s) processed successfully.", "\n".join(logs), ""
+    else:
+        yield f"⚠️ {succeeded}/{count_to_process} Google Doc(s) processed successfully.", "\n".join(logs), ""
+
+def follow_quiz_jobs(valid_pairs, output_spreadsheet, progress):
+    """
+    Queue one job per document for the background workers and stream their progress.
+    The jobs keep running if the page is closed; their IDs can be checked again later.
+    """
+    job_queue = get_job_queue()
+    job_ids = [submit_gdoc_job(link, output_spreadsheet, n) for link, n in valid_pairs]
+    ids_text = ", ".join(job_ids)
+    logs = [
+        f"📥 [Doc {doc_idx}] Queued job {job_id} for GDoc: {link[:60]}... with {n} questions"
+        for doc_idx, (job_id, (link, n)) in enumerate(zip(job_ids, valid_pairs), 1)
+    ]
+    progress(0, desc="Queued...")
+    yield f"⏳ Queued {len(job_ids)} job(s); they keep running if this page is closed.", "\n".join(logs), ids_text
+
+    printed = [0] * len(job_ids)
+    total_steps = len(job_ids) * len(WORKFLOW_STAGES)
+    for jobs in job_queue.follow(job_ids, poll_seconds=JOBS_CONFIG.get("poll_seconds", 1.0)):
+        for doc_idx, (job_id, job) in enumerate(zip(job_ids, jobs), 1):
+            logs.extend(f"[Doc {doc_idx}] {line}" for line in job["progress"][printed[doc_idx - 1]:])
+            printed[doc_idx - 1] = len(job["progress"])
+        finished = [job for job in jobs if job["status"] in FINISHED_STATUSES]
+        # Retried jobs report their stages again, so progress is capped per job
+        stages_done = sum(
+            len(WORKFLOW_STAGES) if job["status"] in FINISHED_STATUSES else min(len(job["progress"]), len(WORKFLOW_STAGES))
+            for job in jobs
+        )
+        progress(stages_done / total_steps, desc=f"{len(finished)}/{len(job_ids)} job(s) finished")
+        yield f"⏳ {len(finished)}/{len(job_ids)} job(s) finished...", "\n".join(logs), ids_text
+
+    logs.extend(describe_job(job_id, job) for job_id, job in zip(job_ids, jobs))
+    succeeded = sum(job["status"] == "succeeded" for job in jobs)
+    if succeeded == len(job_ids):
+        yield f"✅ {len(job_ids)} Google Doc(s) processed successfully.", "\n".join(logs), ids_text
+    else:
+        yield f"⚠️ {succeeded}/{len(job_ids)} Google Doc(s) processed successfully.", "\n".join(logs), ids_text
+
+def check_jobs(job_ids_text):
+    """Status and progress lines of earlier queued jobs (comma or space separated IDs)."""
+    job_ids = [job_id for job_id in re.split(r"[\s,]+", job_ids_text or "") if job_id]
+    if not job_ids:
+        return "❌ Enter one or more job IDs.", ""
+    job_queue = get_job_queue()
+    jobs = [job_queue.get(job_id) for job_id in job_ids]
+    logs = []
+    for job_id, job in zip(job_ids, jobs):
+        logs.append(describe_job(job_id, job))
+        if job:
+            logs.extend(f"   {line}" for line in job["progress"])
+    finished = sum(job is not None and job["status"] in FINISHED_STATUSES for job in jobs)
+    return f"📋 {finished}/{len(job_ids)} job(s) finished.", "\n".join(logs)
 
 # ======================
 # Gradio UI
@@ -169,6 +276,10 @@ with gr.Blocks(title="Gurukula Admin Portal") as demo:
             output_text = gr.Textbox(label="Status", lines=1, interactive=False)
             output_logs = gr.Textbox(label="Logs", lines=10, interactive=False)
 
+            with gr.Row(visible=JOBS_ENABLED):
+                job_ids = gr.Textbox(label="Job IDs", placeholder="Filled in when documents are queued; paste earlier IDs to check them")
+                check_button = gr.Button("Check Status")
+
             run_button.click(
                 fn=generate_quiz,
                 inputs=[
@@ -177,8 +288,9 @@ with gr.Blocks(title="Gurukula Admin Portal") as demo:
                     gdoc_link_3, num_questions_3,
                     output_spreadsheet
                 ],
-                outputs=[output_text, output_logs]
+                outputs=[output_text, output_logs, job_ids]
             )
+            check_button.click(fn=check_jobs, inputs=[job_ids], outputs=[output_text, output_logs])
 
         with gr.Tab("Storyboard Image"):
             gr.Markdown("📸 *Storyboard module coming soon...*")
@@ -187,4 +299,7 @@ with gr.Blocks(title="Gurukula Admin Portal") as demo:
             gr.Markdown("🎬 *Animation module coming soon...*")
 
 if __name__ == "__main__":
+    if JOBS_ENABLED:
+        from quiz.backend.job_worker import start_worker_pool
+        start_worker_pool(JOBS_CONFIG.get("workers", 2))
     demo.launch(share=True,)
\ No newline at end of file